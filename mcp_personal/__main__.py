@@ -1,27 +1,154 @@
 """
 Main entry point for the MCP Personal Client. It allows the user to start
-different services such as the web API or frontend.
+different services such as the web API or frontend, and to inspect and
+maintain the chat history database.
 
 Example usage:
     python -m mcp_personal web_api
+    python -m mcp_personal web_api --record conversation.cassette
+    python -m mcp_personal web_api --replay conversation.cassette --realtime
+    python -m mcp_personal web_api --profile-startup
+    python -m mcp_personal web_api --history-storage binary
+    python -m mcp_personal web_api --ttl-days 30
+    python -m mcp_personal history
+    python -m mcp_personal history --maintain --ttl-days 30 \
+        --archive-dir chat_archive
 """
 
 from argparse import ArgumentParser
+from pathlib import Path
 
 
 parser = ArgumentParser(description="Start the MCP Personal Client")
 parser.add_argument(
     "service",
     type=str,
-    help="The service to run (options: 'web_api', 'frontend')",
-    choices=["web_api", "frontend"],
+    help="The service to run (options: 'web_api', 'frontend', 'history')",
+    choices=["web_api", "frontend", "history"],
+)
+cassette_group = parser.add_mutually_exclusive_group()
+cassette_group.add_argument(
+    "--record",
+    type=Path,
+    help="Record model and tool traffic to this cassette file",
+)
+cassette_group.add_argument(
+    "--replay",
+    type=Path,
+    help="Replay model and tool traffic from this cassette file",
+)
+parser.add_argument(
+    "--realtime",
+    action="store_true",
+    help="Replay with the recorded timings instead of no latency, which "
+    "requires --replay",
+)
+parser.add_argument(
+    "--history-storage",
+    type=str,
+    default="json",
+    choices=["json", "binary"],
+    help="The storage format of the chat history",
+)
+parser.add_argument(
+    "--ttl-days",
+    type=float,
+    help="Days a session can be idle before maintenance expires it. Sessions "
+    "are kept forever if not given",
+)
+parser.add_argument(
+    "--profile-startup",
+    action="store_true",
+    help="Report the import time of the web API instead of starting it",
+)
+history_group = parser.add_argument_group("history")
+history_group.add_argument(
+    "--db-url",
+    type=str,
+    default="sqlite:///chat_history.db",
+    help="The database URL of the chat history",
+)
+history_group.add_argument(
+    "--limit",
+    type=int,
+    default=20,
+    help="The number of sessions to report, largest first",
+)
+history_group.add_argument(
+    "--maintain",
+    action="store_true",
+    help="Prepare the database and run a maintenance pass before reporting",
+)
+history_group.add_argument(
+    "--archive-dir",
+    type=Path,
+    help="Directory to archive expired sessions to",
 )
 args = parser.parse_args()
+if args.realtime and not args.replay:
+    parser.error("--realtime requires --replay")
+if args.profile_startup and args.service != "web_api":
+    parser.error("--profile-startup is only supported for web_api")
+
+if args.profile_startup:
+    from mcp_personal.utils.startup_profile import startup_report
 
-if args.service == "web_api":
+    print(startup_report("mcp_personal.web_api.main"))
+elif args.service == "web_api":
+    from mcp_personal.clients.cassette import Cassette, CassetteMode
+    from mcp_personal.clients.chat_history import ChatHistory
+    from mcp_personal.clients.history_maintenance import DAY
     from mcp_personal.web_api.main import start_async_api
 
-    start_async_api()
+    session_ttl = None if args.ttl_days is None else args.ttl_days * DAY
+    chat_history = ChatHistory(storage=args.history_storage)
+    if args.record:
+        start_async_api(
+            Cassette(args.record, CassetteMode.RECORD),
+            chat_history,
+            session_ttl=session_ttl,
+        )
+    elif args.replay:
+        from tempfile import TemporaryDirectory
+
+        # Replayed turns are not real conversations, so they are kept out of
+        # the chat history.
+        with TemporaryDirectory() as tmp_dir:
+            start_async_api(
+                Cassette(
+                    args.replay, CassetteMode.REPLAY, realtime=args.realtime
+                ),
+                ChatHistory(
+                    url=f"sqlite:///{Path(tmp_dir) / 'replay.db'}",
+                    storage=args.history_storage,
+                ),
+            )
+    else:
+        start_async_api(chat_history=chat_history, session_ttl=session_ttl)
+elif args.service == "history":
+    from dataclasses import asdict
+    import json
+
+    from mcp_personal.clients.chat_history import ChatHistory
+    from mcp_personal.clients.history_maintenance import (
+        DAY,
+        HistoryMaintenance,
+        MaintenanceConfig,
+    )
+
+    maintenance = HistoryMaintenance(
+        ChatHistory(url=args.db_url, storage=args.history_storage),
+        MaintenanceConfig(
+            session_ttl=(
+                None if args.ttl_days is None else args.ttl_days * DAY
+            ),
+            archive_dir=args.archive_dir,
+        ),
+    )
+    if args.maintain:
+        maintenance.prepare()
+        print(json.dumps(asdict(maintenance.run_once()), indent=2))
+    print(json.dumps(asdict(maintenance.stats(limit=args.limit)), indent=2))
 elif args.service == "frontend":
     print("Frontend service is not implemented yet.")
 else:
@@ -0,0 +1,517 @@
+"""
+Module for the asynchronous client of the MCP Personal web API. The client
+keeps a pool of keep-alive connections to the API, so many queries can be
+submitted concurrently without opening a new connection for each. Requests
+which are rejected because the API is overloaded are retried with backoff.
+
+A persistent session can instead be opened over a WebSocket, so the API keeps
+the history of the conversation in memory between queries. This needs the
+optional ``websockets`` dependency, which is installed with the ``websocket``
+extra.
+
+Example usage:
+    async with AsyncAPIClient() as client:
+        response = await client.invoke("What is 2 + 2?", session_id)
+        async for message in client.stream("And times 3?", session_id):
+            print(message)
+        async with client.session() as session:
+            async for message in session.stream("What is 2 + 2?"):
+                print(message)
+"""
+
+import asyncio
+from dataclasses import dataclass
+from random import uniform
+from types import TracebackType
+from typing import Any, AsyncIterator, Iterable
+
+import httpx
+import orjson
+from typing_extensions import Self
+
+try:
+    from websockets.asyncio.client import ClientConnection, connect
+    from websockets.exceptions import ConnectionClosed, WebSocketException
+    from websockets.typing import Origin
+except ImportError:  # pragma: no cover - websockets is an optional dependency
+    connect = None  # type: ignore[assignment,misc]
+
+
+def sessions_available() -> bool:
+    """
+    Check whether persistent sessions can be opened, which needs the
+    optional ``websockets`` dependency.
+
+    :return: Whether sessions are available.
+    :rtype: bool
+    """
+    return connect is not None
+
+
+class APIError(Exception):
+    """
+    Raised when the API returns an error response.
+
+    :param status_code: The HTTP status code of the response.
+    :type status_code: int
+    :param body: The body of the response.
+    :type body: str
+    """
+
+    def __init__(self, status_code: int, body: str) -> None:
+        super().__init__(f"API returned status code {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Policy for retrying requests which the API rejected as overloaded, or
+    which could not connect.
+
+    :param max_attempts: Maximum number of attempts for each request.
+    :type max_attempts: int
+    :param base_delay: Delay in seconds before the first retry. Later retries
+        wait exponentially longer, with full jitter.
+    :type base_delay: float
+    :param max_delay: Maximum delay in seconds between attempts.
+    :type max_delay: float
+    :param retry_statuses: The HTTP status codes which are retried.
+    :type retry_statuses: tuple[int, ...]
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 0.25
+    max_delay: float = 8.0
+    retry_statuses: tuple[int, ...] = (429, 503)
+
+    def delay(self, attempt: int, retry_after: str | None = None) -> float:
+        """
+        Get how long to wait before the next attempt. A ``Retry-After``
+        header given in seconds takes precedence over the backoff.
+
+        :param attempt: The number of attempts made so far.
+        :type attempt: int
+        :param retry_after: The ``Retry-After`` header of the response, if
+            any.
+        :type retry_after: str | None
+        :return: The delay in seconds.
+        :rtype: float
+        """
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        return uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+
+class AsyncAPIClient:
+    """
+    Asynchronous client for the MCP Personal web API.
+
+    :param base_url: The base URL of the API.
+    :type base_url: str
+    :param max_connections: Maximum number of connections in the pool, which
+        is also the number of requests that can be in flight at once.
+    :type max_connections: int
+    :param timeout: Timeout in seconds for each request.
+    :type timeout: float
+    :param retry: The policy for retrying rejected requests.
+    :type retry: RetryPolicy | None
+    :param transport: The transport to send requests with, defaults to
+        connecting over the network.
+    :type transport: httpx.AsyncBaseTransport | None
+    """
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        base_url: str = "http://localhost:12345",
+        max_connections: int = 20,
+        timeout: float = 60.0,
+        retry: RetryPolicy | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self._retry = retry or RetryPolicy()
+
+    async def __aenter__(self) -> Self:
+        """
+        Asynchronous context manager entry method.
+
+        :return: The client.
+        :rtype: Self
+        """
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """
+        Asynchronous context manager exit method, which closes the connection
+        pool.
+
+        :param exc_type: The type of exception raised, if any.
+        :type exc_type: type[BaseException] | None
+        :param exc_value: The exception instance, if any.
+        :type exc_value: BaseException | None
+        :param traceback: The traceback of the exception, if any.
+        :type traceback: TracebackType | None
+        """
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the connection pool.
+        """
+        await self._client.aclose()
+
+    async def invoke(
+        self, query: str, session_id: str, response_format: str = "compact"
+    ) -> dict[str, Any]:
+        """
+        Send a query to the API and wait for the full response.
+
+        :param query: The query.
+        :type query: str
+        :param session_id: The session ID of the conversation.
+        :type session_id: str
+        :param response_format: The response format, either ``compact`` or
+            ``legacy``.
+        :type response_format: str
+        :return: The decoded response.
+        :rtype: dict[str, Any]
+        """
+        payload = {
+            "query": query,
+            "session_id": session_id,
+            "format": response_format,
+        }
+        request = self._client.build_request(
+            "POST", "/invoke", content=orjson.dumps(payload)
+        )
+        response = await self._send(request, stream=False)
+        result: dict[str, Any] = orjson.loads(response.content)
+        return result
+
+    async def invoke_many(
+        self, queries: Iterable[tuple[str, str]], concurrency: int = 8
+    ) -> list[dict[str, Any] | BaseException]:
+        """
+        Send many queries concurrently. Queries in the same session are sent
+        in order, one at a time, so that each sees the history of the last.
+
+        :param queries: Pairs of the query and its session ID.
+        :type queries: Iterable[tuple[str, str]]
+        :param concurrency: Maximum number of sessions with a query in flight
+            at once.
+        :type concurrency: int
+        :return: The response to each query in the order given, or the error
+            raised for it.
+        :rtype: list[dict[str, Any] | BaseException]
+        """
+        by_session: dict[str, list[tuple[int, str]]] = {}
+        count = 0
+        for index, (query, session_id) in enumerate(queries):
+            by_session.setdefault(session_id, []).append((index, query))
+            count += 1
+
+        results: list[dict[str, Any] | BaseException] = [
+            APIError(0, "Not sent")
+        ] * count
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _run_session(
+            session_id: str, session_queries: list[tuple[int, str]]
+        ) -> None:
+            async with semaphore:
+                for index, query in session_queries:
+                    try:
+                        results[index] = await self.invoke(query, session_id)
+                    except (APIError, httpx.HTTPError) as e:
+                        results[index] = e
+
+        await asyncio.gather(
+            *(
+                _run_session(session_id, session_queries)
+                for session_id, session_queries in by_session.items()
+            )
+        )
+        return results
+
+    async def stream(
+        self, query: str, session_id: str
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Send a query to the API and yield each message of the response in the
+        compact schema as soon as the API produces it.
+
+        :param query: The query.
+        :type query: str
+        :param session_id: The session ID of the conversation.
+        :type session_id: str
+        :yield: Each response message.
+        :ytype: dict[str, Any]
+        """
+        payload = {"query": query, "session_id": session_id}
+        request = self._client.build_request(
+            "POST", "/invoke/stream", content=orjson.dumps(payload)
+        )
+        response = await self._send(request, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = orjson.loads(line)
+                if event["type"] == "message":
+                    yield event["message"]
+        finally:
+            await response.aclose()
+
+    def session(self, session_id: str | None = None) -> "APISession":
+        """
+        Create a persistent session with the API over a WebSocket, which is
+        opened when its context is entered.
+
+        :param session_id: The session ID of the conversation to carry on,
+            defaults to starting a new conversation.
+        :type session_id: str | None
+        :return: The session.
+        :rtype: APISession
+        """
+        base_url = self._client.base_url
+        url = base_url.copy_with(
+            scheme="wss" if base_url.scheme == "https" else "ws"
+        ).join("/session")
+        if session_id is not None:
+            url = url.copy_merge_params({"session_id": session_id})
+        origin = f"{base_url.scheme}://{base_url.netloc.decode()}"
+        return APISession(str(url), origin)
+
+    async def _send(
+        self, request: httpx.Request, stream: bool
+    ) -> httpx.Response:
+        """
+        Send a request, retrying it while the API rejects it as overloaded or
+        the connection cannot be made.
+
+        :param request: The request to send.
+        :type request: httpx.Request
+        :param stream: Whether to return before reading the response body.
+        :type stream: bool
+        :raises httpx.ConnectError: If the connection cannot be made on any
+            attempt.
+        :raises APIError: If the API returns an error response.
+        :return: The successful response.
+        :rtype: httpx.Response
+        """
+        request.headers["Content-Type"] = "application/json"
+        attempt = 1
+        while True:
+            try:
+                response = await self._client.send(request, stream=stream)
+            except httpx.ConnectError:
+                if attempt >= self._retry.max_attempts:
+                    raise
+                await asyncio.sleep(self._retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code == 200:
+                return response
+
+            await response.aread()
+            await response.aclose()
+            if (
+                response.status_code not in self._retry.retry_statuses
+                or attempt >= self._retry.max_attempts
+            ):
+                raise APIError(response.status_code, response.text)
+            await asyncio.sleep(
+                self._retry.delay(attempt, response.headers.get("Retry-After"))
+            )
+            attempt += 1
+
+
+class APISession:
+    """
+    Persistent chat session with the API over a WebSocket. The API keeps the
+    history of the session in memory while it is open, so queries do not wait
+    for it to be loaded. One query can be answered at a time.
+
+    :param url: The WebSocket URL of the session endpoint.
+    :type url: str
+    :param origin: The origin the session is opened from, which the API
+        checks against its CORS policy.
+    :type origin: str
+    """
+
+    def __init__(self, url: str, origin: str) -> None:
+        self._url = url
+        self._origin = origin
+        self._connection: "ClientConnection | None" = None
+        self._unfinished = False
+        self.session_id: str | None = None
+        self.stop_reason: str | None = None
+
+    async def __aenter__(self) -> Self:
+        """
+        Asynchronous context manager entry method, which opens the session.
+
+        :raises ImportError: If websockets is not installed.
+        :raises ConnectionError: If the session cannot be opened.
+        :raises APIError: If the API refuses the session.
+        :return: The session.
+        :rtype: Self
+        """
+        if connect is None:
+            raise ImportError(
+                "Sessions need websockets, which is installed with the "
+                "websocket extra"
+            )
+        try:
+            self._connection = await connect(
+                self._url, origin=Origin(self._origin)
+            )
+        except WebSocketException as e:
+            raise ConnectionError(f"Could not open session: {e}") from e
+
+        event = await self._receive()
+        if event["type"] == "error":
+            await self.close()
+            raise APIError(400, event["error"])
+        self.session_id = event["session_id"]
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """
+        Asynchronous context manager exit method, which closes the session.
+
+        :param exc_type: The type of exception raised, if any.
+        :type exc_type: type[BaseException] | None
+        :param exc_value: The exception instance, if any.
+        :type exc_value: BaseException | None
+        :param traceback: The traceback of the exception, if any.
+        :type traceback: TracebackType | None
+        """
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the session.
+        """
+        if self._connection is not None:
+            await self._connection.close()
+
+    async def stream(self, query: str) -> AsyncIterator[dict[str, Any]]:
+        """
+        Send a query and yield each message of the response in the compact
+        schema as soon as the API produces it. If the response to the last
+        query was not read to the end, that query is cancelled first. The
+        reason processing stopped is kept in ``stop_reason``.
+
+        :param query: The query.
+        :type query: str
+        :raises APIError: If the API rejects the query, with status 400 as
+            for ``/invoke``, or fails to answer it, with status 500.
+        :yield: Each response message.
+        :ytype: dict[str, Any]
+        """
+        await self._finish()
+        await self._send({"type": "query", "query": query})
+        self._unfinished = True
+        while self._unfinished:
+            event = await self._receive()
+            if event["type"] == "error":
+                status = int(event.get("status", 400))
+                if status >= 500:
+                    # A query which failed is still ended by a done event.
+                    await self._skip_response()
+                self._unfinished = False
+                raise APIError(status, event["error"])
+            if event["type"] == "done":
+                self._unfinished = False
+                self.stop_reason = event["stop_reason"]
+            elif event["type"] == "message":
+                yield event["message"]
+
+    async def _finish(self) -> None:
+        """
+        Cancel the last query if its response was not read to the end, and
+        skip the rest of its response.
+        """
+        if not self._unfinished:
+            return
+        await self._send({"type": "cancel"})
+        await self._skip_response()
+        self._unfinished = False
+
+    async def _skip_response(self) -> None:
+        """
+        Skip the rest of the response to a query, up to its done event or an
+        error which rejected the query.
+        """
+        while True:
+            event = await self._receive()
+            if event["type"] == "done":
+                self.stop_reason = event["stop_reason"]
+                return
+            if event["type"] == "error" and event.get("status", 400) < 500:
+                return
+
+    @property
+    def _open_connection(self) -> "ClientConnection":
+        """
+        Property to get the connection of the session.
+
+        :raises ConnectionError: If the session is not open.
+        :return: The connection.
+        :rtype: ClientConnection
+        """
+        if self._connection is None:
+            raise ConnectionError("Session is not open")
+        return self._connection
+
+    async def _send(self, event: dict[str, Any]) -> None:
+        """
+        Send an event to the API.
+
+        :param event: The event.
+        :type event: dict[str, Any]
+        """
+        await self._open_connection.send(orjson.dumps(event).decode())
+
+    async def _receive(self) -> dict[str, Any]:
+        """
+        Receive the next event from the API.
+
+        :raises ConnectionError: If the API closed the session.
+        :return: The event.
+        :rtype: dict[str, Any]
+        """
+        try:
+            data = await self._open_connection.recv()
+        except ConnectionClosed as e:
+            raise ConnectionError("Session was closed by the API") from e
+        event: dict[str, Any] = orjson.loads(data)
+        return event
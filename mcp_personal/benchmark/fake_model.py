@@ -0,0 +1,230 @@
+"""
+Module for a deterministic fake model, which can be used in place of a real
+language model to benchmark the client and web API without network access or
+API credits.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from random import Random
+from time import sleep
+from typing import Any, Collection
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from mcp_personal.clients.model.base import BaseModel
+
+
+@dataclass
+class FakeModelConfig:  # pylint: disable=too-many-instance-attributes
+    """
+    Configuration for the fake model. This controls the simulated latency of
+    each model call and the pattern of tool calls the model makes.
+
+    :param latency: Mean latency of a model call in seconds.
+    :type latency: float
+    :param jitter: Maximum random deviation from the mean latency in seconds.
+    :type jitter: float
+    :param tool_rounds: Number of rounds of tool calls made for each query
+        before the model gives a final answer.
+    :type tool_rounds: int
+    :param tool_calls_per_round: Number of tool calls made in each round.
+    :type tool_calls_per_round: int
+    :param tool_name: Name of the tool the model calls.
+    :type tool_name: str
+    :param tool_args: Arguments passed to the tool.
+    :type tool_args: dict[str, Any]
+    :param response_chars: Length of the final answer in characters.
+    :type response_chars: int
+    :param seed: Seed for the random number generator used for jitter.
+    :type seed: int
+    """
+
+    latency: float = 0.05
+    jitter: float = 0.0
+    tool_rounds: int = 1
+    tool_calls_per_round: int = 1
+    tool_name: str = "add"
+    tool_args: dict[str, Any] = field(
+        default_factory=lambda: {"a": 1.0, "b": 2.0}
+    )
+    response_chars: int = 200
+    seed: int = 0
+
+
+class FakeModel(BaseModel):
+    """
+    Fake model which answers every query with a fixed pattern of tool calls
+    followed by a final answer. The latency is simulated by blocking the
+    calling thread for synchronous calls and by sleeping for asynchronous
+    calls, mirroring real models.
+
+    :param config: The configuration for the fake model.
+    :type config: FakeModelConfig
+    """
+
+    def __init__(self, config: FakeModelConfig) -> None:
+        super().__init__()
+        self._config = config
+        self._random = Random(config.seed)
+        self._calls = 0
+        self._tools: list[dict[str, Any]] = []
+
+    def chat(self, messages: list[BaseMessage]) -> AIMessage:
+        """
+        Method to generate the next response for the conversation. The model
+        requests tool calls until the configured number of rounds has been
+        made since the latest human message, then returns a final answer.
+
+        :param messages: List of messages to send to the model.
+        :type messages: list[BaseMessage]
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        sleep(self._latency())
+        return self._respond(messages)
+
+    async def achat(
+        self,
+        messages: list[BaseMessage],
+        max_tokens: int | None = None,
+        tools: Collection[str] | None = None,
+    ) -> AIMessage:
+        """
+        Method to asynchronously generate the next response for the
+        conversation, in the same way as ``chat``.
+
+        :param messages: List of messages to send to the model.
+        :type messages: list[BaseMessage]
+        :param max_tokens: Maximum number of tokens to generate, which
+            truncates the final answer.
+        :type max_tokens: int | None
+        :param tools: Names of the tools the model may use, which has no
+            effect since the tool calls are fixed by the configuration.
+        :type tools: Collection[str] | None
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        _ = tools
+        await asyncio.sleep(self._latency())
+        return self._respond(messages, max_tokens)
+
+    def _respond(
+        self, messages: list[BaseMessage], max_tokens: int | None = None
+    ) -> AIMessage:
+        """
+        Build the response to the conversation.
+
+        :param messages: List of messages sent to the model.
+        :type messages: list[BaseMessage]
+        :param max_tokens: Maximum number of tokens to generate.
+        :type max_tokens: int | None
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        self._calls += 1
+        rounds = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                rounds += 1
+
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        if rounds < self._config.tool_rounds:
+            tool_calls = [
+                {
+                    "name": self._config.tool_name,
+                    "args": dict(self._config.tool_args),
+                    "id": f"call_{self._calls}_{index}",
+                    "type": "tool_call",
+                }
+                for index in range(self._config.tool_calls_per_round)
+            ]
+            return AIMessage(
+                content="",
+                tool_calls=tool_calls,
+                usage_metadata=self._usage(input_tokens, 20),
+            )
+
+        content = self._answer()
+        if max_tokens is not None:
+            content = content[: max_tokens * 4]
+        return AIMessage(
+            content=content,
+            usage_metadata=self._usage(input_tokens, len(content) // 4),
+        )
+
+    def invoke(self, prompt: str) -> str:
+        """
+        Method to send a prompt to the model and get the response. Prompts
+        never result in tool calls.
+
+        :param prompt: The prompt to send to the model.
+        :type prompt: str
+        :return: The model's response.
+        :rtype: str
+        """
+        _ = prompt
+        sleep(self._latency())
+        self._calls += 1
+        return self._answer()
+
+    def bind_tools(self, tools: list[dict[str, Any]]) -> None:
+        """
+        Method to bind tools to the model. The fake model only records the
+        tools, since its tool calls are fixed by its configuration.
+
+        :param tools: List of tool names to bind to the model.
+        :type tools: list[dict[str, Any]]
+        """
+        self._tools = tools
+        self._tools_bound = True
+
+    def warm_up(self) -> None:
+        """
+        Method to prepare the model for use, which the fake model does not
+        need.
+        """
+
+    def _latency(self) -> float:
+        """
+        Get the latency of a call, which is the configured latency plus a
+        random jitter.
+
+        :return: The latency in seconds.
+        :rtype: float
+        """
+        jitter = self._random.uniform(
+            -self._config.jitter, self._config.jitter
+        )
+        return max(0.0, self._config.latency + jitter)
+
+    def _answer(self) -> str:
+        """
+        Build the final answer text of the configured length.
+
+        :return: The answer text.
+        :rtype: str
+        """
+        return ("fake " * self._config.response_chars)[
+            : self._config.response_chars
+        ]
+
+    @staticmethod
+    def _usage(input_tokens: int, output_tokens: int) -> dict[str, int]:
+        """
+        Build the usage metadata for a fake response.
+
+        :param input_tokens: The approximate number of input tokens.
+        :type input_tokens: int
+        :param output_tokens: The approximate number of output tokens.
+        :type output_tokens: int
+        :return: The usage metadata.
+        :rtype: dict[str, int]
+        """
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
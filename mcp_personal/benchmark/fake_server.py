@@ -0,0 +1,86 @@
+"""
+Module for a fake MCP server, which runs in-process and can be used in place of
+real MCP servers to benchmark the client and web API.
+"""
+
+import asyncio
+from contextlib import AbstractAsyncContextManager
+
+from mcp import ClientSession
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_connected_server_and_client_session
+
+
+class InMemoryServer:  # pylint: disable=too-few-public-methods
+    """
+    FastMCP server which the client connects to through the in-memory
+    transport, so it is never bound to a port.
+
+    :param server: The server.
+    :type server: FastMCP
+    """
+
+    def __init__(self, server: FastMCP) -> None:
+        self.server = server
+        self.name = server.name
+
+    def connect(self) -> AbstractAsyncContextManager[ClientSession]:
+        """
+        Open an initialised client session with the server.
+
+        :return: A context manager which yields the session and closes it on
+            exit.
+        :rtype: AbstractAsyncContextManager[ClientSession]
+        """
+        # pylint: disable-next=protected-access
+        server = self.server._mcp_server
+        return create_connected_server_and_client_session(server)
+
+
+def create_fake_server(
+    latency: float = 0.01, payload_chars: int = 100
+) -> InMemoryServer:
+    """
+    Create a fake MCP server with tools that sleep for a fixed latency before
+    answering. The server runs in-process and is connected to through the
+    in-memory transport.
+
+    :param latency: Time in seconds each tool call takes.
+    :type latency: float
+    :param payload_chars: Length in characters of the payload returned by the
+        ``lookup`` tool.
+    :type payload_chars: int
+    :return: The fake server.
+    :rtype: InMemoryServer
+    """
+    mcp = FastMCP(name="Fake", log_level="WARNING")
+
+    @mcp.tool()
+    async def add(a: float, b: float) -> float:
+        """
+        Adds two numbers together.
+
+        :param a: The first number.
+        :type a: float
+        :param b: The second number.
+        :type b: float
+        :return: The sum of the two numbers.
+        :rtype: float
+        """
+        await asyncio.sleep(latency)
+        return a + b
+
+    @mcp.tool()
+    async def lookup(key: str) -> str:
+        """
+        Looks up a document by key and returns its contents.
+
+        :param key: The key of the document.
+        :type key: str
+        :return: The contents of the document.
+        :rtype: str
+        """
+        await asyncio.sleep(latency)
+        return (f"{key} " * payload_chars)[:payload_chars]
+
+    return InMemoryServer(mcp)
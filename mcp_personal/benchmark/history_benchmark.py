@@ -0,0 +1,257 @@
+"""
+Module for comparing the chat history storage formats. The same conversations
+are written to and read back from a fresh database in each format, and the
+size of the stored messages and the time taken are reported. The
+conversations are either generated to resemble tool-using conversations, or
+copied from an existing chat history database.
+
+Example usage:
+    python -m mcp_personal.benchmark.history_benchmark --sessions 200
+    python -m mcp_personal.benchmark.history_benchmark \
+        --db-url sqlite:///chat_history.db
+"""
+
+from argparse import ArgumentParser
+import json
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+import time
+from typing import Any
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from sqlalchemy import text
+
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.message_codec import (
+    save_dictionary,
+    train_dictionary,
+)
+
+WORDS = (
+    "page database notion project task meeting notes status update owner "
+    "deadline review summary draft budget roadmap sprint issue release"
+).split()
+
+
+def generate_conversations(
+    sessions: int, turns: int, seed: int = 0
+) -> dict[str, list[BaseMessage]]:
+    """
+    Generate conversations which resemble those of the MCP client, where each
+    turn calls a tool before answering.
+
+    :param sessions: The number of conversations.
+    :type sessions: int
+    :param turns: The number of turns in each conversation.
+    :type turns: int
+    :param seed: The seed of the random generator.
+    :type seed: int
+    :return: The messages of each conversation, keyed by session ID.
+    :rtype: dict[str, list[BaseMessage]]
+    """
+    random = Random(seed)
+
+    def _words(count: int) -> str:
+        return " ".join(random.choice(WORDS) for _ in range(count))
+
+    conversations: dict[str, list[BaseMessage]] = {}
+    for session in range(sessions):
+        messages: list[BaseMessage] = []
+        for turn in range(turns):
+            tool_call = {
+                "name": "search_pages",
+                "args": {"query": _words(3), "page_size": 10},
+                "id": f"toolu_{session:04d}{turn:04d}",
+                "type": "tool_call",
+            }
+            result = json.dumps(
+                [
+                    {
+                        "id": f"{random.getrandbits(64):016x}",
+                        "title": _words(5),
+                    }
+                    for _ in range(random.randint(1, 8))
+                ]
+            )
+            usage = {
+                "input_tokens": random.randint(500, 5000),
+                "output_tokens": random.randint(20, 400),
+                "total_tokens": 0,
+            }
+            usage["total_tokens"] = (
+                usage["input_tokens"] + usage["output_tokens"]
+            )
+            messages += [
+                HumanMessage(content=_words(12)),
+                AIMessage(
+                    content="",
+                    tool_calls=[tool_call],
+                    usage_metadata=usage,
+                    response_metadata={
+                        "model": "claude-3-5-sonnet-latest",
+                        "stop_reason": "tool_use",
+                    },
+                ),
+                ToolMessage(
+                    content=[f"type='text' text='{result}' annotations=None"],
+                    artifact={"call": tool_call, "result": result},
+                    name=tool_call["name"],
+                    tool_call_id=tool_call["id"],
+                ),
+                AIMessage(
+                    content=_words(random.randint(20, 80)),
+                    usage_metadata=usage,
+                    response_metadata={
+                        "model": "claude-3-5-sonnet-latest",
+                        "stop_reason": "end_turn",
+                    },
+                ),
+            ]
+        conversations[f"session-{session}"] = messages
+    return conversations
+
+
+def load_conversations(url: str) -> dict[str, list[BaseMessage]]:
+    """
+    Load every conversation from a chat history database.
+
+    :param url: The database URL of the chat history.
+    :type url: str
+    :return: The messages of each conversation, keyed by session ID.
+    :rtype: dict[str, list[BaseMessage]]
+    """
+    chat_history = ChatHistory(url=url)
+    with chat_history.engine.connect() as connection:
+        session_ids = connection.execute(
+            text(
+                "SELECT DISTINCT session_id "
+                f"FROM {chat_history.message_table}"
+            )
+        ).scalars()
+        return {
+            session_id: chat_history.get_messages(session_id)
+            for session_id in session_ids
+        }
+
+
+def measure(
+    chat_history: ChatHistory, conversations: dict[str, list[BaseMessage]]
+) -> dict[str, Any]:
+    """
+    Write the conversations to a chat history, then read them back.
+
+    :param chat_history: The chat history, with an empty database.
+    :type chat_history: ChatHistory
+    :param conversations: The messages of each conversation.
+    :type conversations: dict[str, list[BaseMessage]]
+    :return: The size of the stored messages and the time taken to write and
+        read them.
+    :rtype: dict[str, Any]
+    """
+    start = time.perf_counter()
+    for session_id, messages in conversations.items():
+        chat_history.add_messages(session_id=session_id, messages=messages)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for session_id in conversations:
+        chat_history.get_messages(session_id)
+    read_time = time.perf_counter() - start
+
+    with chat_history.engine.connect() as connection:
+        size_bytes = connection.execute(
+            text(
+                "SELECT SUM(LENGTH(message)) "
+                f"FROM {chat_history.message_table}"
+            )
+        ).scalar_one()
+    count = sum(len(messages) for messages in conversations.values())
+    return {
+        "messages": count,
+        "size_bytes": size_bytes,
+        "bytes_per_message": size_bytes / count,
+        "write_seconds": write_time,
+        "read_seconds": read_time,
+        "read_us_per_message": read_time / count * 1e6,
+    }
+
+
+def run_benchmark(
+    conversations: dict[str, list[BaseMessage]], training_share: float = 0.2
+) -> dict[str, Any]:
+    """
+    Compare the storage formats on the conversations. The compression
+    dictionary is trained on a share of the conversations, so the binary
+    format is measured with a dictionary trained on similar messages.
+
+    :param conversations: The messages of each conversation.
+    :type conversations: dict[str, list[BaseMessage]]
+    :param training_share: The share of conversations the dictionary is
+        trained on.
+    :type training_share: float
+    :return: The results for each format, and how the binary format compares
+        to JSON.
+    :rtype: dict[str, Any]
+    """
+    results: dict[str, Any] = {}
+    training = list(conversations.values())
+    training = training[: max(1, int(len(training) * training_share))]
+    with TemporaryDirectory() as tmp_dir:
+        json_history = ChatHistory(url=f"sqlite:///{Path(tmp_dir) / 'j.db'}")
+        results["json"] = measure(json_history, conversations)
+
+        binary_history = ChatHistory(
+            url=f"sqlite:///{Path(tmp_dir) / 'b.db'}", storage="binary"
+        )
+        dictionary = train_dictionary(
+            message for messages in training for message in messages
+        )
+        save_dictionary(binary_history.engine, dictionary)
+        binary_history.codec.add_dictionary(dictionary)
+        results["binary"] = measure(binary_history, conversations)
+
+    results["size_ratio"] = (
+        results["binary"]["size_bytes"] / results["json"]["size_bytes"]
+    )
+    results["read_speedup"] = (
+        results["json"]["read_seconds"] / results["binary"]["read_seconds"]
+    )
+    return results
+
+
+def main() -> None:
+    """
+    Main function to parse the command line arguments, run the benchmark and
+    report the results.
+    """
+    parser = ArgumentParser(description="Compare chat history storage")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument(
+        "--db-url",
+        type=str,
+        help="Use the conversations of this chat history database",
+    )
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    if args.db_url:
+        conversations = load_conversations(args.db_url)
+    else:
+        conversations = generate_conversations(args.sessions, args.turns)
+    results = run_benchmark(conversations)
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        args.output.write_text(report, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+"""
+Module for benchmarking the ``/invoke`` endpoint of the web API offline. The
+web API is started against the fake model and an in-process fake MCP server,
+then driven at a fixed concurrency while the latency of each request and the
+event loop lag of the server are recorded. Results are saved as JSON so they
+can be compared across commits.
+
+Example usage:
+    python -m mcp_personal.benchmark.invoke_benchmark --concurrency 16
+    python -m mcp_personal.benchmark.invoke_benchmark --compare base.json
+"""
+
+from argparse import ArgumentParser
+import asyncio
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import platform
+import subprocess
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+import time
+from typing import Any
+
+import httpx
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import create_fake_server
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+from mcp_personal.web_api.main import AsyncWebAPI
+
+COMPARED_METRICS = [
+    ("latency", "p50"),
+    ("latency", "p95"),
+    ("latency", "p99"),
+    ("throughput", "requests_per_second"),
+    ("event_loop_lag", "p99"),
+    ("event_loop_lag", "max"),
+]
+
+
+@dataclass
+class BenchmarkConfig:  # pylint: disable=too-many-instance-attributes
+    """
+    Configuration for a benchmark run.
+
+    :param requests: Number of measured requests to send.
+    :type requests: int
+    :param concurrency: Number of requests in flight at once.
+    :type concurrency: int
+    :param warmup: Number of requests sent before measuring starts.
+    :type warmup: int
+    :param sessions: Number of distinct chat sessions the requests are spread
+        over.
+    :type sessions: int
+    :param tool_latency: Time in seconds each fake tool call takes.
+    :type tool_latency: float
+    :param lag_interval: Interval in seconds at which event loop lag is
+        sampled.
+    :type lag_interval: float
+    :param host: Host the web API binds to.
+    :type host: str
+    :param port: Port the web API binds to.
+    :type port: int
+    :param model: Configuration for the fake model.
+    :type model: FakeModelConfig
+    """
+
+    requests: int = 200
+    concurrency: int = 8
+    warmup: int = 10
+    sessions: int = 8
+    tool_latency: float = 0.01
+    lag_interval: float = 0.01
+    host: str = "127.0.0.1"
+    port: int = 12399
+    model: FakeModelConfig = field(default_factory=FakeModelConfig)
+
+
+class _ServerThread(Thread):
+    """
+    Thread which runs the web API on its own event loop, so that the load
+    generator does not compete with it for the loop. The lag of the server
+    event loop is sampled for the lifetime of the thread.
+
+    :param config: The benchmark configuration.
+    :type config: BenchmarkConfig
+    :param db_url: The database URL for the chat history.
+    :type db_url: str
+    """
+
+    def __init__(self, config: BenchmarkConfig, db_url: str) -> None:
+        super().__init__(daemon=True)
+        self._config = config
+        self._db_url = db_url
+        self._started = Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._shutdown: asyncio.Event | None = None
+        self.lag_samples: list[tuple[float, float]] = []
+        self.error: BaseException | None = None
+
+    def run(self) -> None:
+        """
+        Run the web API until it is stopped.
+        """
+        try:
+            asyncio.run(self._serve())
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            self.error = e
+            self._started.set()
+
+    def wait_started(self, timeout: float) -> None:
+        """
+        Wait for the web API to have connected to its servers.
+
+        :param timeout: Maximum time to wait in seconds.
+        :type timeout: float
+        :raises RuntimeError: If the web API failed or did not start in time.
+        """
+        if not self._started.wait(timeout) or self.error is not None:
+            raise RuntimeError("Web API failed to start") from self.error
+
+    def stop(self) -> None:
+        """
+        Signal the web API to shut down and wait for the thread to finish.
+        """
+        if self._loop is not None and self._shutdown is not None:
+            self._loop.call_soon_threadsafe(self._shutdown.set)
+        self.join()
+
+    async def _serve(self) -> None:
+        """
+        Start the web API against the fake model and fake server, and serve
+        until the stop event is set.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._shutdown = asyncio.Event()
+        mcp_client = MCPClient(
+            model=FakeModel(self._config.model),
+            servers={
+                "fake": create_fake_server(latency=self._config.tool_latency)
+            },
+            chat_history=ChatHistory(url=self._db_url),
+        )
+        monitor = asyncio.create_task(self._monitor_lag())
+        try:
+            async with AsyncWebAPI(
+                host=self._config.host,
+                port=self._config.port,
+                mcp_client=mcp_client,
+            ) as api:
+                self._started.set()
+                await api.run(shutdown_trigger=self._shutdown.wait)
+        finally:
+            monitor.cancel()
+
+    async def _monitor_lag(self) -> None:
+        """
+        Repeatedly sleep for the sampling interval and record how late the
+        loop was in waking up, along with the time of the sample.
+        """
+        interval = self._config.lag_interval
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            end = time.monotonic()
+            self.lag_samples.append((end, max(0.0, end - start - interval)))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Compute a percentile of the values using the nearest-rank method.
+
+    :param values: The values.
+    :type values: list[float]
+    :param pct: The percentile to compute, between 0 and 100.
+    :type pct: float
+    :return: The percentile, or 0.0 if there are no values.
+    :rtype: float
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(-(-pct * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarise(values: list[float]) -> dict[str, float]:
+    """
+    Summarise a list of durations in seconds as milliseconds.
+
+    :param values: The durations in seconds.
+    :type values: list[float]
+    :return: The mean, p50, p95, p99 and max in milliseconds.
+    :rtype: dict[str, float]
+    """
+    mean = sum(values) / len(values) if values else 0.0
+    return {
+        "mean": mean * 1000,
+        "p50": percentile(values, 50) * 1000,
+        "p95": percentile(values, 95) * 1000,
+        "p99": percentile(values, 99) * 1000,
+        "max": (max(values) if values else 0.0) * 1000,
+    }
+
+
+async def _drive(
+    config: BenchmarkConfig, total: int
+) -> tuple[list[float], int, float, float]:
+    """
+    Send requests to the ``/invoke`` endpoint at the configured concurrency.
+
+    :param config: The benchmark configuration.
+    :type config: BenchmarkConfig
+    :param total: The number of requests to send.
+    :type total: int
+    :return: The latency of each successful request in seconds, the number of
+        failed requests, and the start and end times of the run.
+    :rtype: tuple[list[float], int, float, float]
+    """
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(
+        max_connections=config.concurrency,
+        max_keepalive_connections=config.concurrency,
+    )
+
+    async with httpx.AsyncClient(
+        base_url=f"http://{config.host}:{config.port}",
+        limits=limits,
+        timeout=60,
+    ) as client:
+
+        async def _worker() -> None:
+            nonlocal errors
+            for index in counter:
+                payload = {
+                    "query": f"Benchmark query {index}",
+                    "session_id": f"bench-{index % config.sessions}",
+                }
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/invoke", json=payload)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(_worker() for _ in range(config.concurrency)))
+        finished = time.monotonic()
+
+    return latencies, errors, started, finished
+
+
+async def _wait_until_serving(config: BenchmarkConfig, timeout: float) -> None:
+    """
+    Poll the homepage until the web API accepts connections.
+
+    :param config: The benchmark configuration.
+    :type config: BenchmarkConfig
+    :param timeout: Maximum time to wait in seconds.
+    :type timeout: float
+    :raises RuntimeError: If the web API is not serving in time.
+    """
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=1) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(f"http://{config.host}:{config.port}/")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.05)
+    raise RuntimeError("Web API did not start serving in time")
+
+
+def _git_commit() -> str | None:
+    """
+    Get the commit of the working tree, if it is a git repository.
+
+    :return: The commit hash, or None if it cannot be determined.
+    :rtype: str | None
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(config: BenchmarkConfig) -> dict[str, Any]:
+    """
+    Run the benchmark and collect the results.
+
+    :param config: The benchmark configuration.
+    :type config: BenchmarkConfig
+    :return: The benchmark results.
+    :rtype: dict[str, Any]
+    """
+    with TemporaryDirectory() as tmp_dir:
+        server = _ServerThread(
+            config=config, db_url=f"sqlite:///{Path(tmp_dir) / 'bench.db'}"
+        )
+        server.start()
+        try:
+            server.wait_started(timeout=30)
+            asyncio.run(_wait_until_serving(config, timeout=30))
+            if config.warmup:
+                asyncio.run(_drive(config, config.warmup))
+            latencies, errors, started, finished = asyncio.run(
+                _drive(config, config.requests)
+            )
+        finally:
+            server.stop()
+
+    lags = [
+        lag
+        for sampled_at, lag in server.lag_samples
+        if started <= sampled_at <= finished
+    ]
+    duration = finished - started
+    return {
+        "metadata": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": asdict(config),
+        "latency": summarise(latencies),
+        "event_loop_lag": summarise(lags),
+        "throughput": {
+            "requests_per_second": (
+                len(latencies) / duration if duration > 0 else 0.0
+            ),
+            "duration": duration,
+            "completed": len(latencies),
+            "errors": errors,
+        },
+    }
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any]) -> str:
+    """
+    Format a comparison of the key metrics of two benchmark runs.
+
+    :param results: The results of the current run.
+    :type results: dict[str, Any]
+    :param baseline: The results of the run to compare against.
+    :type baseline: dict[str, Any]
+    :return: A table of the metrics and their relative change.
+    :rtype: str
+    """
+    lines = [
+        f"Baseline commit: {baseline['metadata'].get('commit')}",
+        f"{'metric':<32}{'baseline':>12}{'current':>12}{'change':>10}",
+    ]
+    for group, metric in COMPARED_METRICS:
+        old = baseline[group][metric]
+        new = results[group][metric]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        lines.append(
+            f"{group + '.' + metric:<32}{old:>12.2f}{new:>12.2f}{change:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """
+    Main function to parse the command line arguments, run the benchmark, save
+    the results and optionally compare them against a previous run.
+    """
+    defaults = BenchmarkConfig()
+    model_defaults = defaults.model
+    parser = ArgumentParser(description="Benchmark the /invoke endpoint")
+    parser.add_argument("--requests", type=int, default=defaults.requests)
+    parser.add_argument(
+        "--concurrency", type=int, default=defaults.concurrency
+    )
+    parser.add_argument("--warmup", type=int, default=defaults.warmup)
+    parser.add_argument("--sessions", type=int, default=defaults.sessions)
+    parser.add_argument(
+        "--model-latency", type=float, default=model_defaults.latency
+    )
+    parser.add_argument(
+        "--model-jitter", type=float, default=model_defaults.jitter
+    )
+    parser.add_argument(
+        "--tool-rounds", type=int, default=model_defaults.tool_rounds
+    )
+    parser.add_argument(
+        "--tool-calls-per-round",
+        type=int,
+        default=model_defaults.tool_calls_per_round,
+    )
+    parser.add_argument(
+        "--tool-latency", type=float, default=defaults.tool_latency
+    )
+    parser.add_argument("--seed", type=int, default=model_defaults.seed)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark_results.json"),
+        help="Path to save the results to",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        default=None,
+        help="Path to the results of a previous run to compare against",
+    )
+    args = parser.parse_args()
+
+    config = BenchmarkConfig(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        warmup=args.warmup,
+        sessions=args.sessions,
+        tool_latency=args.tool_latency,
+        port=args.port,
+        model=FakeModelConfig(
+            latency=args.model_latency,
+            jitter=args.model_jitter,
+            tool_rounds=args.tool_rounds,
+            tool_calls_per_round=args.tool_calls_per_round,
+            seed=args.seed,
+        ),
+    )
+    results = run_benchmark(config)
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    print(json.dumps(results["latency"] | results["throughput"], indent=2))
+    print(f"Results saved to {args.output}")
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print(compare(results, baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Module for replaying a recorded cassette through the MCP client. With no
+replay latency, the time taken is the client-side overhead of the tool loop on
+its own, which can be profiled to find where that time goes.
+
+Example usage:
+    python -m mcp_personal.benchmark.replay_benchmark conversation.cassette
+    python -m mcp_personal.benchmark.replay_benchmark conversation.cassette \
+        --repeat 20 --profile
+"""
+
+from argparse import ArgumentParser
+import asyncio
+from cProfile import Profile
+import json
+from pathlib import Path
+from pstats import SortKey, Stats
+from tempfile import TemporaryDirectory
+import time
+
+from mcp_personal.benchmark.invoke_benchmark import summarise
+from mcp_personal.clients.cassette import Cassette, CassetteMode
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+
+
+async def replay(cassette: Cassette, db_url: str) -> list[float]:
+    """
+    Replay every recorded query through a client backed by the cassette.
+
+    :param cassette: The cassette to replay.
+    :type cassette: Cassette
+    :param db_url: The database URL for the chat history.
+    :type db_url: str
+    :return: The time taken by each query in seconds.
+    :rtype: list[float]
+    """
+    durations = []
+    client = MCPClient(chat_history=ChatHistory(url=db_url), cassette=cassette)
+    async with client:
+        for recorded in cassette.queries:
+            start = time.perf_counter()
+            await client.invoke(
+                query=recorded["query"], session_id=recorded["session_id"]
+            )
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main() -> None:
+    """
+    Main function to parse the command line arguments, replay the cassette
+    and report how long the queries took.
+    """
+    parser = ArgumentParser(description="Replay a cassette offline")
+    parser.add_argument("cassette", type=Path)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="Wait for the recorded duration of each interaction",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the replay and print the most expensive functions",
+    )
+    args = parser.parse_args()
+
+    cassette = Cassette(
+        args.cassette, CassetteMode.REPLAY, realtime=args.realtime
+    )
+    profile = Profile() if args.profile else None
+    durations: list[float] = []
+    for _ in range(args.repeat):
+        cassette.load()
+        with TemporaryDirectory() as tmp_dir:
+            db_url = f"sqlite:///{Path(tmp_dir) / 'replay.db'}"
+            if profile is not None:
+                profile.enable()
+            durations += asyncio.run(replay(cassette, db_url))
+            if profile is not None:
+                profile.disable()
+
+    print(json.dumps(summarise(durations), indent=2))
+    if profile is not None:
+        Stats(profile).sort_stats(SortKey.CUMULATIVE).print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
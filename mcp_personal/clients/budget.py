@@ -0,0 +1,179 @@
+"""
+Module for limiting the work done to answer a single query. A budget bounds
+the time taken, the number of rounds of tool calls and the number of tokens
+used, and records why processing of the query stopped.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from enum import Enum
+import json
+import math
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+CHARS_PER_TOKEN = 4
+
+
+class StopReason(Enum):
+    """
+    Why processing of a query stopped.
+    """
+
+    COMPLETE = "complete"
+    DEADLINE = "deadline"
+    MAX_ITERATIONS = "max_iterations"
+    MAX_TOKENS = "max_tokens"
+    CANCELLED = "cancelled"
+    ERROR = "error"
+
+
+class BudgetExceededError(Exception):
+    """
+    Raised when processing of a query must stop because its budget has run
+    out.
+
+    :param reason: Which part of the budget ran out.
+    :type reason: StopReason
+    """
+
+    def __init__(self, reason: StopReason) -> None:
+        super().__init__(f"Budget exceeded: {reason.value}")
+        self.reason = reason
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    """
+    Estimate the number of input tokens the messages take, from the length of
+    their content and tool calls. This errs high for English text, which is
+    about four characters per token.
+
+    :param messages: The messages.
+    :type messages: list[BaseMessage]
+    :return: The estimated number of tokens.
+    :rtype: int
+    """
+    chars = 0
+    for message in messages:
+        content = message.content
+        chars += len(
+            content
+            if isinstance(content, str)
+            else json.dumps(content, default=str)
+        )
+        if isinstance(message, AIMessage) and message.tool_calls:
+            chars += len(json.dumps(message.tool_calls, default=str))
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+@dataclass
+class InvokeBudget:
+    """
+    Limits on the work done to answer a single query. The budget also tracks
+    the work done as the query is processed, so each query needs its own.
+
+    :param timeout: Maximum time in seconds to spend on the query.
+    :type timeout: float | None
+    :param max_iterations: Maximum number of rounds of tool calls.
+    :type max_iterations: int | None
+    :param max_tokens: Maximum number of tokens, input and output, used across
+        all model calls. The input of each call is estimated before it is
+        made, and the call is only made if there is room left for it, with
+        its output limited to the rest. The real usage of each call is then
+        counted.
+    :type max_tokens: int | None
+    """
+
+    timeout: float | None = None
+    max_iterations: int | None = None
+    max_tokens: int | None = None
+    iterations: int = field(default=0, init=False)
+    tokens_used: int = field(default=0, init=False)
+    stop_reason: StopReason | None = field(default=None, init=False)
+    deadline: float | None = field(default=None, init=False)
+
+    def start(self) -> None:
+        """
+        Start the clock on the budget. The deadline is measured on the clock
+        of the running event loop.
+        """
+        if self.timeout is not None:
+            self.deadline = asyncio.get_running_loop().time() + self.timeout
+
+    def remaining_time(self) -> float | None:
+        """
+        Get the time left before the deadline.
+
+        :return: The time left in seconds, or None if there is no deadline.
+        :rtype: float | None
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - asyncio.get_running_loop().time())
+
+    def remaining_tokens(self) -> int | None:
+        """
+        Get the number of tokens left in the budget.
+
+        :return: The tokens left, or None if tokens are not limited.
+        :rtype: int | None
+        """
+        if self.max_tokens is None:
+            return None
+        return max(0, self.max_tokens - self.tokens_used)
+
+    def output_tokens(self, input_tokens: int) -> int | None:
+        """
+        Get the number of tokens a model call may generate, once its input
+        has been counted against the budget.
+
+        :param input_tokens: The estimated input tokens of the call.
+        :type input_tokens: int
+        :raises BudgetExceededError: If the input alone would use the rest of
+            the tokens.
+        :return: The tokens the call may generate, or None if tokens are not
+            limited.
+        :rtype: int | None
+        """
+        remaining = self.remaining_tokens()
+        if remaining is None:
+            return None
+        if input_tokens >= remaining:
+            raise BudgetExceededError(StopReason.MAX_TOKENS)
+        return remaining - input_tokens
+
+    def check(self) -> None:
+        """
+        Check that there is time and tokens left to do more work.
+
+        :raises BudgetExceededError: If the deadline has passed or the tokens
+            have run out.
+        """
+        if self.remaining_time() == 0.0:
+            raise BudgetExceededError(StopReason.DEADLINE)
+        if self.remaining_tokens() == 0:
+            raise BudgetExceededError(StopReason.MAX_TOKENS)
+
+    def next_iteration(self) -> None:
+        """
+        Count the start of a round of tool calls.
+
+        :raises BudgetExceededError: If the maximum number of rounds has
+            already been made.
+        """
+        if (
+            self.max_iterations is not None
+            and self.iterations >= self.max_iterations
+        ):
+            raise BudgetExceededError(StopReason.MAX_ITERATIONS)
+        self.iterations += 1
+
+    def record_usage(self, message: AIMessage) -> None:
+        """
+        Count the tokens used by a model call.
+
+        :param message: The response from the model.
+        :type message: AIMessage
+        """
+        if message.usage_metadata:
+            self.tokens_used += message.usage_metadata["total_tokens"]
@@ -0,0 +1,533 @@
+"""
+Module for recording and replaying the traffic between the MCP client, the
+model and the MCP servers. A cassette stores every model request and response
+and every tool call and result, along with how long each took, in a gzip
+compressed JSON file. Replaying a cassette runs the tool loop offline, either
+with the original timings or with no latency at all.
+"""
+
+import asyncio
+from collections import defaultdict, deque
+from datetime import timedelta
+from enum import Enum
+import gzip
+from hashlib import sha256
+import json
+from pathlib import Path
+from time import perf_counter, sleep
+from typing import Any, Collection
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+    messages_to_dict,
+)
+from mcp.types import CallToolResult
+
+from mcp_personal.clients.model.base import BaseModel
+from mcp_personal.clients.tool_session import ToolSession
+
+CASSETTE_VERSION = 1
+
+
+class CassetteError(Exception):
+    """
+    Raised when a cassette cannot satisfy a request during replay.
+    """
+
+
+class CassetteMode(Enum):
+    """
+    Whether a cassette is being recorded to or replayed from.
+    """
+
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+def _fingerprint(data: Any) -> str:
+    """
+    Compute a stable fingerprint of JSON serialisable data.
+
+    :param data: The data to fingerprint.
+    :type data: Any
+    :return: The hex digest of the data.
+    :rtype: str
+    """
+    encoded = json.dumps(data, sort_keys=True, default=str).encode()
+    return sha256(encoded).hexdigest()[:16]
+
+
+class Cassette:  # pylint: disable=too-many-instance-attributes
+    """
+    Store of recorded model and tool traffic. Interactions are matched on
+    replay by a fingerprint of the request. If no recorded interaction matches,
+    the earliest unused one is returned instead, unless the cassette is
+    strict.
+
+    :param path: Path of the cassette file.
+    :type path: Path
+    :param mode: Whether to record to or replay from the cassette.
+    :type mode: CassetteMode
+    :param realtime: Whether replayed interactions take as long as they did
+        when recorded. Otherwise they are returned immediately.
+    :type realtime: bool
+    :param strict: Whether to raise an error during replay when no recorded
+        interaction matches a request.
+    :type strict: bool
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: CassetteMode,
+        realtime: bool = False,
+        strict: bool = False,
+    ) -> None:
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.strict = strict
+        self.tools: dict[str, list[dict[str, Any]]] = {}
+        self.queries: list[dict[str, str]] = []
+        self._interactions: dict[str, list[dict[str, Any]]] = {
+            "model": [],
+            "tool": [],
+        }
+        self._by_key: dict[str, dict[str, deque[int]]] = {}
+        self._in_order: dict[str, deque[int]] = {}
+        self._used: set[tuple[str, int]] = set()
+        if mode is CassetteMode.REPLAY:
+            self.load()
+
+    def load(self) -> None:
+        """
+        Load the cassette from its file and index it for replay.
+
+        :raises CassetteError: If the cassette was written by an incompatible
+            version.
+        """
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != CASSETTE_VERSION:
+            raise CassetteError(
+                f"Unsupported cassette version: {data.get('version')}"
+            )
+        self.tools = data["tools"]
+        self.queries = data["queries"]
+        self._interactions = {"model": data["model"], "tool": data["tool"]}
+        self._by_key = {}
+        self._in_order = {}
+        self._used = set()
+        for kind, interactions in self._interactions.items():
+            by_key: dict[str, deque[int]] = defaultdict(deque)
+            for position, interaction in enumerate(interactions):
+                by_key[interaction["key"]].append(position)
+            self._by_key[kind] = by_key
+            self._in_order[kind] = deque(range(len(interactions)))
+
+    def save(self) -> None:
+        """
+        Write the recorded interactions to the cassette file.
+        """
+        data = {
+            "version": CASSETTE_VERSION,
+            "tools": self.tools,
+            "queries": self.queries,
+            "model": self._interactions["model"],
+            "tool": self._interactions["tool"],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.path, "wt", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"))
+
+    def record_tools(self, server: str, tools: list[dict[str, Any]]) -> None:
+        """
+        Record the tools listed by a server.
+
+        :param server: The name of the server.
+        :type server: str
+        :param tools: The tools the server provides.
+        :type tools: list[dict[str, Any]]
+        """
+        self.tools[server] = tools
+
+    def record_query(self, session_id: str, query: str) -> None:
+        """
+        Record a query made to the client, so that the conversation can be
+        replayed in full.
+
+        :param session_id: The session ID the query was made in.
+        :type session_id: str
+        :param query: The query.
+        :type query: str
+        """
+        self.queries.append({"session_id": session_id, "query": query})
+
+    def record_model(
+        self,
+        messages: list[BaseMessage],
+        response: AIMessage,
+        duration: float,
+    ) -> None:
+        """
+        Record a model call. Only a fingerprint of the request is stored,
+        since the request is rebuilt from earlier responses during replay.
+
+        :param messages: The messages sent to the model.
+        :type messages: list[BaseMessage]
+        :param response: The response from the model.
+        :type response: AIMessage
+        :param duration: How long the call took in seconds.
+        :type duration: float
+        """
+        self._interactions["model"].append(
+            {
+                "key": _fingerprint(messages_to_dict(messages)),
+                "response": message_to_dict(response),
+                "duration": duration,
+            }
+        )
+
+    def record_tool_call(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None,
+        result: CallToolResult,
+        duration: float,
+    ) -> None:
+        """
+        Record a tool call.
+
+        :param name: The name of the tool.
+        :type name: str
+        :param arguments: The arguments passed to the tool.
+        :type arguments: dict[str, Any] | None
+        :param result: The result of the tool call.
+        :type result: CallToolResult
+        :param duration: How long the call took in seconds.
+        :type duration: float
+        """
+        self._interactions["tool"].append(
+            {
+                "key": _fingerprint([name, arguments]),
+                "result": result.model_dump(mode="json", exclude_none=True),
+                "duration": duration,
+            }
+        )
+
+    def replay_model(
+        self, messages: list[BaseMessage]
+    ) -> tuple[AIMessage, float]:
+        """
+        Find the recorded response to a model call.
+
+        :param messages: The messages sent to the model.
+        :type messages: list[BaseMessage]
+        :raises CassetteError: If the recorded response is not an AI message.
+        :return: The recorded response and how long the call took.
+        :rtype: tuple[AIMessage, float]
+        """
+        interaction = self._take(
+            "model", _fingerprint(messages_to_dict(messages))
+        )
+        (response,) = messages_from_dict([interaction["response"]])
+        if not isinstance(response, AIMessage):
+            raise CassetteError(
+                f"Expected AIMessage, got {type(response).__name__}"
+            )
+        return response, interaction["duration"]
+
+    def replay_tool_call(
+        self, name: str, arguments: dict[str, Any] | None
+    ) -> tuple[CallToolResult, float]:
+        """
+        Find the recorded result of a tool call.
+
+        :param name: The name of the tool.
+        :type name: str
+        :param arguments: The arguments passed to the tool.
+        :type arguments: dict[str, Any] | None
+        :return: The recorded result and how long the call took.
+        :rtype: tuple[CallToolResult, float]
+        """
+        interaction = self._take("tool", _fingerprint([name, arguments]))
+        return (
+            CallToolResult.model_validate(interaction["result"]),
+            interaction["duration"],
+        )
+
+    def _take(self, kind: str, key: str) -> dict[str, Any]:
+        """
+        Take the earliest unused interaction matching the key, falling back
+        to the earliest unused interaction of any key if not strict.
+
+        :param kind: The kind of interaction, either ``model`` or ``tool``.
+        :type kind: str
+        :param key: The fingerprint of the request.
+        :type key: str
+        :raises CassetteError: If there is no interaction to replay.
+        :return: The interaction.
+        :rtype: dict[str, Any]
+        """
+        queues = [self._by_key[kind].get(key, deque())]
+        if not self.strict:
+            queues.append(self._in_order[kind])
+        for queue in queues:
+            while queue:
+                position = queue.popleft()
+                if (kind, position) not in self._used:
+                    self._used.add((kind, position))
+                    return self._interactions[kind][position]
+        raise CassetteError(f"No recorded {kind} interaction for {key}")
+
+
+class RecordingModel(BaseModel):
+    """
+    Model which records every call made to an underlying model.
+
+    :param model: The model to record.
+    :type model: BaseModel
+    :param cassette: The cassette to record to.
+    :type cassette: Cassette
+    """
+
+    def __init__(self, model: BaseModel, cassette: Cassette) -> None:
+        super().__init__()
+        self._inner = model
+        self._cassette = cassette
+
+    def chat(self, messages: list[BaseMessage]) -> AIMessage:
+        """
+        Method to send a list of messages to the underlying model and record
+        the response.
+
+        :param messages: List of messages to send to the model.
+        :type messages: list[BaseMessage]
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        start = perf_counter()
+        response = self._inner.chat(messages)
+        self._cassette.record_model(messages, response, perf_counter() - start)
+        return response
+
+    async def achat(
+        self,
+        messages: list[BaseMessage],
+        max_tokens: int | None = None,
+        tools: Collection[str] | None = None,
+    ) -> AIMessage:
+        """
+        Method to asynchronously send a list of messages to the underlying
+        model and record the response.
+
+        :param messages: List of messages to send to the model.
+        :type messages: list[BaseMessage]
+        :param max_tokens: Maximum number of tokens to generate.
+        :type max_tokens: int | None
+        :param tools: Names of the tools the model may use, defaults to all
+            of them.
+        :type tools: Collection[str] | None
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        start = perf_counter()
+        response = await self._inner.achat(
+            messages, max_tokens=max_tokens, tools=tools
+        )
+        self._cassette.record_model(messages, response, perf_counter() - start)
+        return response
+
+    def invoke(self, prompt: str) -> str:
+        """
+        Method to send a prompt to the underlying model. Prompts are not
+        recorded, since the tool loop only uses chat.
+
+        :param prompt: The prompt to send to the model.
+        :type prompt: str
+        :return: The model's response.
+        :rtype: str
+        """
+        return self._inner.invoke(prompt)
+
+    def bind_tools(self, tools: list[dict[str, Any]]) -> None:
+        """
+        Method to bind tools to the underlying model.
+
+        :param tools: List of tool names to bind to the model.
+        :type tools: list[dict[str, Any]]
+        """
+        self._inner.bind_tools(tools)
+
+    def warm_up(self) -> None:
+        """
+        Method to prepare the underlying model for use.
+        """
+        self._inner.warm_up()
+
+
+class ReplayModel(BaseModel):
+    """
+    Model which answers from the responses recorded in a cassette.
+
+    :param cassette: The cassette to replay from.
+    :type cassette: Cassette
+    """
+
+    def __init__(self, cassette: Cassette) -> None:
+        super().__init__()
+        self._cassette = cassette
+
+    def chat(self, messages: list[BaseMessage]) -> AIMessage:
+        """
+        Method to return the recorded response to the messages. With realtime
+        replay, this blocks for as long as the original call took.
+
+        :param messages: List of messages to send to the model.
+        :type messages: list[BaseMessage]
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        response, duration = self._cassette.replay_model(messages)
+        if self._cassette.realtime:
+            sleep(duration)
+        return response
+
+    async def achat(
+        self,
+        messages: list[BaseMessage],
+        max_tokens: int | None = None,
+        tools: Collection[str] | None = None,
+    ) -> AIMessage:
+        """
+        Method to return the recorded response to the messages. With realtime
+        replay, this waits for as long as the original call took.
+
+        :param messages: List of messages to send to the model.
+        :type messages: list[BaseMessage]
+        :param max_tokens: Maximum number of tokens to generate, which has no
+            effect during replay.
+        :type max_tokens: int | None
+        :param tools: Names of the tools the model may use, which has no
+            effect during replay.
+        :type tools: Collection[str] | None
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        _ = max_tokens, tools
+        response, duration = self._cassette.replay_model(messages)
+        if self._cassette.realtime:
+            await asyncio.sleep(duration)
+        return response
+
+    def invoke(self, prompt: str) -> str:
+        """
+        Method to send a prompt to the model, which is not supported during
+        replay.
+
+        :param prompt: The prompt to send to the model.
+        :type prompt: str
+        :raises CassetteError: Always, since prompts are not recorded.
+        :return: Never returns.
+        :rtype: str
+        """
+        raise CassetteError(f"Prompts are not recorded: {prompt!r}")
+
+    def bind_tools(self, tools: list[dict[str, Any]]) -> None:
+        """
+        Method to bind tools to the model, which has no effect during replay.
+
+        :param tools: List of tool names to bind to the model.
+        :type tools: list[dict[str, Any]]
+        """
+        self._tools_bound = True
+
+    def warm_up(self) -> None:
+        """
+        Method to prepare the model for use, which replay does not need.
+        """
+
+
+class RecordingToolSession:  # pylint: disable=too-few-public-methods
+    """
+    Tool session which records every call made through an underlying
+    session.
+
+    :param session: The session to record.
+    :type session: ToolSession
+    :param cassette: The cassette to record to.
+    :type cassette: Cassette
+    """
+
+    def __init__(self, session: ToolSession, cassette: Cassette) -> None:
+        self._session = session
+        self._cassette = cassette
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Call a tool through the underlying session and record the result.
+
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: How long to wait for the result.
+        :type read_timeout_seconds: timedelta | None
+        :return: The result of the tool call.
+        :rtype: CallToolResult
+        """
+        start = perf_counter()
+        result = await self._session.call_tool(
+            name=name,
+            arguments=arguments,
+            read_timeout_seconds=read_timeout_seconds,
+        )
+        self._cassette.record_tool_call(
+            name, arguments, result, perf_counter() - start
+        )
+        return result
+
+
+class ReplayToolSession:  # pylint: disable=too-few-public-methods
+    """
+    Tool session which answers from the results recorded in a cassette.
+
+    :param cassette: The cassette to replay from.
+    :type cassette: Cassette
+    """
+
+    def __init__(self, cassette: Cassette) -> None:
+        self._cassette = cassette
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Return the recorded result of a tool call. With realtime replay, this
+        waits for as long as the original call took.
+
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: How long to wait for the result.
+        :type read_timeout_seconds: timedelta | None
+        :return: The result of the tool call.
+        :rtype: CallToolResult
+        """
+        _ = read_timeout_seconds
+        result, duration = self._cassette.replay_tool_call(name, arguments)
+        if self._cassette.realtime:
+            await asyncio.sleep(duration)
+        return result
@@ -2,22 +2,208 @@
 Module for managing conversation history in a SQL database.
 """
 
-from langchain_core.messages import BaseMessage
-from langchain_community.chat_message_histories.sql import (
-    SQLChatMessageHistory,
-)
+import json
+from threading import Lock
+import time
+from typing import TYPE_CHECKING
 
-from sqlalchemy import create_engine
+from langchain_core.messages import BaseMessage, message_to_dict
+
+if TYPE_CHECKING:
+    from langchain_community.chat_message_histories.sql import (
+        BaseMessageConverter,
+        SQLChatMessageHistory,
+    )
+    from sqlalchemy.engine import Engine
+
+    from mcp_personal.clients.message_codec import MessageCodec
+
+MESSAGE_TABLE = "message_store"
+BINARY_MESSAGE_TABLE = "message_store_binary"
+ACTIVITY_TABLE = "session_activity"
+STORAGE_FORMATS = ["json", "binary"]
 
 
 class ChatHistory:
     """
     Class for managing chat history using a SQL database. This class provides
-    methods to get, add, and clear messages for a specific session.
+    methods to get, add, and clear messages for a specific session. The
+    database engine is created on first use, which keeps importing SQLAlchemy
+    and LangChain Community off the startup path. The time each session was
+    last added to is kept alongside the messages, so that idle sessions can
+    be expired.
+
+    Messages are stored either as JSON, the LangChain default, or in a
+    compact binary format in a separate table, which is smaller and faster
+    to read. The binary format needs the ``storage`` extra.
+
+    :param url: The SQLAlchemy database URL for the chat history store.
+    :type url: str
+    :param storage: The storage format of the messages, either ``json`` or
+        ``binary``.
+    :type storage: str
+    :raises ValueError: If the storage format is not known.
     """
 
-    def __init__(self) -> None:
-        self._engine = create_engine(url="sqlite:///chat_history.db")
+    def __init__(
+        self, url: str = "sqlite:///chat_history.db", storage: str = "json"
+    ) -> None:
+        if storage not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format: {storage}")
+        self._url = url
+        self._storage = storage
+        self.message_table = (
+            BINARY_MESSAGE_TABLE if storage == "binary" else MESSAGE_TABLE
+        )
+        self._codec: "MessageCodec | None" = None
+        self._engine: "Engine | None" = None
+        self._converter: "BaseMessageConverter | None" = None
+        self._engine_lock = Lock()
+
+    def warm_up(self) -> None:
+        """
+        Create the database engine and message table ahead of the first
+        request, so the first query does not pay for it.
+        """
+        _ = self.engine
+
+    @property
+    def engine(self) -> "Engine":
+        """
+        Property to get the database engine, creating it and the tables if
+        this is the first use. The engine may be first used by a warm up in
+        a worker thread and a request at the same time, so only one of them
+        creates it.
+
+        :return: The database engine.
+        :rtype: Engine
+        """
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = self._create_engine()
+        return self._engine
+
+    def _create_engine(self) -> "Engine":
+        """
+        Create the database engine, the tables and the message converter.
+
+        :return: The database engine.
+        :rtype: Engine
+        """
+        # pylint: disable=import-outside-toplevel
+        from langchain_community.chat_message_histories.sql import (
+            DefaultMessageConverter,
+            SQLChatMessageHistory,
+        )
+        from sqlalchemy import create_engine
+
+        engine = create_engine(url=self._url)
+        if self._storage == "binary":
+            from mcp_personal.clients.message_codec import (
+                BinaryMessageConverter,
+                MessageCodec,
+                create_dictionary_table,
+                load_dictionaries,
+            )
+
+            create_dictionary_table(engine)
+            self._codec = MessageCodec(load_dictionaries(engine))
+            converter: "BaseMessageConverter" = BinaryMessageConverter(
+                self.message_table, self._codec
+            )
+        else:
+            converter = DefaultMessageConverter(self.message_table)
+
+        # LangChain creates the message table when a history is created.
+        SQLChatMessageHistory(
+            connection=engine,
+            session_id="",
+            custom_message_converter=converter,
+        )
+        self._create_schema(engine, self.message_table)
+        self._converter = converter
+        return engine
+
+    @property
+    def codec(self) -> "MessageCodec":
+        """
+        Property to get the codec of the binary storage format.
+
+        :raises ValueError: If the messages are stored as JSON.
+        :return: The codec.
+        :rtype: MessageCodec
+        """
+        _ = self.engine
+        if self._codec is None:
+            raise ValueError("Messages are stored as JSON")
+        return self._codec
+
+    def _history(self, session_id: str) -> "SQLChatMessageHistory":
+        """
+        Get the message history for a session, creating the database engine
+        if this is the first use.
+
+        :param session_id: The ID of the session.
+        :type session_id: str
+        :return: The message history for the session.
+        :rtype: SQLChatMessageHistory
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from langchain_community.chat_message_histories.sql import (
+            SQLChatMessageHistory,
+        )
+
+        engine = self.engine
+        return SQLChatMessageHistory(
+            connection=engine,
+            session_id=session_id,
+            custom_message_converter=self._converter,
+        )
+
+    def message_json(self, stored: str | bytes) -> str:
+        """
+        Convert a message as stored in the message table to JSON, in the
+        format the LangChain default storage uses.
+
+        :param stored: The stored message.
+        :type stored: str | bytes
+        :return: The message as JSON.
+        :rtype: str
+        """
+        if isinstance(stored, str):
+            return stored
+        if self._codec is None:
+            return stored.decode("utf-8")
+        return json.dumps(message_to_dict(self._codec.decode(stored)))
+
+    @staticmethod
+    def _create_schema(engine: "Engine", message_table: str) -> None:
+        """
+        Create the index that messages are read by and the table of session
+        activity, in addition to the message table created by LangChain.
+
+        :param engine: The database engine.
+        :type engine: Engine
+        :param message_table: The name of the message table.
+        :type message_table: str
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from sqlalchemy import text
+
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{message_table}_session_id"
+                    f" ON {message_table} (session_id, id)"
+                )
+            )
+            connection.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {ACTIVITY_TABLE} ("
+                    "session_id TEXT PRIMARY KEY, last_active FLOAT NOT NULL)"
+                )
+            )
 
     def get_messages(self, session_id: str) -> list[BaseMessage]:
         """
@@ -29,10 +215,7 @@ class ChatHistory:
         :return: A list of messages associated with the session.
         :rtype: list[BaseMessage]
         """
-        return SQLChatMessageHistory(
-            connection=self._engine,
-            session_id=session_id,
-        ).get_messages()
+        return self._history(session_id).get_messages()
 
     def add_messages(
         self, session_id: str, messages: list[BaseMessage]
@@ -46,10 +229,19 @@ class ChatHistory:
         :param messages: A list of messages to add to the chat history.
         :type messages: list[BaseMessage]
         """
-        SQLChatMessageHistory(
-            connection=self._engine,
-            session_id=session_id,
-        ).add_messages(messages=messages)
+        # pylint: disable-next=import-outside-toplevel
+        from sqlalchemy import text
+
+        self._history(session_id).add_messages(messages=messages)
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"INSERT INTO {ACTIVITY_TABLE} (session_id, last_active) "
+                    "VALUES (:session_id, :now) ON CONFLICT (session_id) DO "
+                    "UPDATE SET last_active = excluded.last_active"
+                ),
+                {"session_id": session_id, "now": time.time()},
+            )
 
     def clear(self, session_id: str) -> None:
         """
@@ -58,7 +250,12 @@ class ChatHistory:
         :param session_id: The ID of the session for which to clear messages.
         :type session_id: str
         """
-        SQLChatMessageHistory(
-            connection=self._engine,
-            session_id=session_id,
-        ).clear()
+        # pylint: disable-next=import-outside-toplevel
+        from sqlalchemy import text
+
+        self._history(session_id).clear()
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(f"DELETE FROM {ACTIVITY_TABLE} WHERE session_id = :id"),
+                {"id": session_id},
+            )
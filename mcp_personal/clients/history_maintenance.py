@@ -0,0 +1,472 @@
+"""
+Module for maintaining the chat history database. Sessions which have been
+idle for longer than their time to live are archived to compressed files and
+removed, stored tool outputs which have not been used for a while are deleted,
+and SQLite databases are incrementally vacuumed and analysed. Each
+pass does a bounded amount of work in short transactions, so it can run on a
+schedule alongside live traffic.
+
+Example usage:
+    maintenance = HistoryMaintenance(chat_history, MaintenanceConfig())
+    print(maintenance.stats())
+    report = maintenance.run_once()
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+import gzip
+from hashlib import sha256
+import json
+import logging
+from pathlib import Path
+import time
+from typing import TYPE_CHECKING
+
+from mcp_personal.clients.chat_history import ACTIVITY_TABLE, ChatHistory
+from mcp_personal.clients.tool_output import BlobStore
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+
+@dataclass
+class MaintenanceConfig:  # pylint: disable=too-many-instance-attributes
+    """
+    Configuration of the chat history maintenance.
+
+    :param session_ttl: Time in seconds a session can be idle before it is
+        expired, or None to keep sessions forever, which is the default.
+    :type session_ttl: float | None
+    :param archive_dir: Directory expired sessions are archived to, or None to
+        delete them without archiving.
+    :type archive_dir: Path | None
+    :param interval: Time in seconds between scheduled maintenance passes.
+    :type interval: float
+    :param max_sessions: Maximum number of sessions expired by each pass.
+    :type max_sessions: int
+    :param vacuum_pages: Maximum number of free pages returned to the
+        filesystem by each pass.
+    :type vacuum_pages: int
+    :param analysis_limit: Approximate number of rows examined in each index
+        when the database is analysed.
+    :type analysis_limit: int
+    :param tool_outputs: Store of large tool outputs to clean up, or None to
+        leave them alone.
+    :type tool_outputs: BlobStore | None
+    :param tool_output_ttl: Time in seconds since a tool output was last
+        stored or read before it is deleted. Messages which refer to a
+        deleted output keep their preview, but the rest can no longer be
+        read.
+    :type tool_output_ttl: float
+    :param max_tool_outputs: Maximum number of tool outputs deleted by each
+        pass.
+    :type max_tool_outputs: int
+    """
+
+    session_ttl: float | None = None
+    archive_dir: Path | None = None
+    interval: float = 60 * 60
+    max_sessions: int = 100
+    vacuum_pages: int = 1000
+    analysis_limit: int = 1000
+    tool_outputs: BlobStore | None = None
+    tool_output_ttl: float = 30 * DAY
+    max_tool_outputs: int = 1000
+
+
+@dataclass
+class SessionStats:
+    """
+    Statistics for a single session.
+
+    :param session_id: The ID of the session.
+    :type session_id: str
+    :param messages: The number of messages in the session.
+    :type messages: int
+    :param size_bytes: The total size of the stored messages in bytes.
+    :type size_bytes: int
+    :param last_active: When the session was last added to, as a Unix time,
+        or None if it is not known.
+    :type last_active: float | None
+    """
+
+    session_id: str
+    messages: int
+    size_bytes: int
+    last_active: float | None
+
+
+@dataclass
+class HistoryStats:
+    """
+    Statistics for the chat history database.
+
+    :param size_bytes: The size of the database in bytes, if known.
+    :type size_bytes: int | None
+    :param free_bytes: The size of the unused pages in the database in bytes,
+        if known.
+    :type free_bytes: int | None
+    :param sessions: The number of sessions.
+    :type sessions: int
+    :param messages: The number of messages.
+    :type messages: int
+    :param largest_sessions: The largest sessions, by size of messages.
+    :type largest_sessions: list[SessionStats]
+    """
+
+    size_bytes: int | None
+    free_bytes: int | None
+    sessions: int
+    messages: int
+    largest_sessions: list[SessionStats] = field(default_factory=list)
+
+
+@dataclass
+class MaintenanceReport:
+    """
+    Summary of the work done by a maintenance pass.
+
+    :param expired_sessions: The number of sessions expired.
+    :type expired_sessions: int
+    :param archived_messages: The number of messages archived.
+    :type archived_messages: int
+    :param removed_tool_outputs: The number of stored tool outputs deleted.
+    :type removed_tool_outputs: int
+    :param vacuumed_pages: The number of free pages returned to the
+        filesystem.
+    :type vacuumed_pages: int
+    :param duration: Time in seconds taken by the pass.
+    :type duration: float
+    """
+
+    expired_sessions: int = 0
+    archived_messages: int = 0
+    removed_tool_outputs: int = 0
+    vacuumed_pages: int = 0
+    duration: float = 0.0
+
+
+class HistoryMaintenance:
+    """
+    Maintenance of the chat history database.
+
+    :param chat_history: The chat history to maintain.
+    :type chat_history: ChatHistory
+    :param config: The configuration of the maintenance.
+    :type config: MaintenanceConfig | None
+    """
+
+    def __init__(
+        self,
+        chat_history: ChatHistory,
+        config: MaintenanceConfig | None = None,
+    ) -> None:
+        self._chat_history = chat_history
+        self._config = config or MaintenanceConfig()
+
+    @property
+    def _is_sqlite(self) -> bool:
+        """
+        Property to get whether the database is SQLite, which supports
+        incremental vacuuming.
+
+        :return: Whether the database is SQLite.
+        :rtype: bool
+        """
+        return self._chat_history.engine.dialect.name == "sqlite"
+
+    def stats(self, limit: int = 20) -> HistoryStats:
+        """
+        Get statistics for the database and its largest sessions.
+
+        :param limit: The number of sessions to give statistics for.
+        :type limit: int
+        :return: The statistics.
+        :rtype: HistoryStats
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from sqlalchemy import text
+
+        table = self._chat_history.message_table
+        with self._chat_history.engine.connect() as connection:
+            sessions, messages = connection.execute(
+                text(
+                    "SELECT COUNT(DISTINCT session_id), COUNT(*) "
+                    f"FROM {table}"
+                )
+            ).one()
+            rows = connection.execute(
+                text(
+                    "SELECT m.session_id, COUNT(*), "
+                    "SUM(LENGTH(m.message)), MAX(a.last_active) "
+                    f"FROM {table} m LEFT JOIN {ACTIVITY_TABLE} a "
+                    "ON a.session_id = m.session_id GROUP BY m.session_id "
+                    "ORDER BY SUM(LENGTH(m.message)) DESC LIMIT :limit"
+                ),
+                {"limit": limit},
+            ).all()
+
+            size_bytes = free_bytes = None
+            if self._is_sqlite:
+                page_size = self._pragma(connection, "page_size")
+                size_bytes = self._pragma(connection, "page_count") * page_size
+                free_bytes = (
+                    self._pragma(connection, "freelist_count") * page_size
+                )
+
+        return HistoryStats(
+            size_bytes=size_bytes,
+            free_bytes=free_bytes,
+            sessions=sessions,
+            messages=messages,
+            largest_sessions=[
+                SessionStats(
+                    session_id=row[0],
+                    messages=row[1],
+                    size_bytes=row[2] or 0,
+                    last_active=row[3],
+                )
+                for row in rows
+            ],
+        )
+
+    def run_once(self) -> MaintenanceReport:
+        """
+        Run a single maintenance pass. Expired sessions are archived and
+        removed, old tool outputs are deleted, then the database is
+        incrementally vacuumed and analysed.
+
+        :return: A summary of the work done.
+        :rtype: MaintenanceReport
+        """
+        start = time.perf_counter()
+        report = MaintenanceReport()
+        if self._config.session_ttl is not None:
+            self._track_untracked_sessions()
+            cutoff = time.time() - self._config.session_ttl
+            for session_id in self._expired_sessions(cutoff):
+                report.archived_messages += self._expire_session(
+                    session_id, cutoff
+                )
+                report.expired_sessions += 1
+        if self._config.tool_outputs is not None:
+            report.removed_tool_outputs = (
+                self._config.tool_outputs.remove_older_than(
+                    time.time() - self._config.tool_output_ttl,
+                    self._config.max_tool_outputs,
+                )
+            )
+        if self._is_sqlite:
+            report.vacuumed_pages = self._incremental_vacuum()
+            self._analyse()
+        report.duration = time.perf_counter() - start
+        return report
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """
+        Run maintenance passes on a schedule until stopped. Each pass runs in
+        a worker thread, so it does not block the event loop.
+
+        :param stop: Event which stops the schedule when set.
+        :type stop: asyncio.Event
+        """
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), self._config.interval)
+                return
+            except TimeoutError:
+                pass
+
+            try:
+                report = await asyncio.to_thread(self.run_once)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Chat history maintenance failed: %s", e)
+                continue
+            logger.info("Chat history maintenance: %s", report)
+
+    def prepare(self) -> None:
+        """
+        Prepare a SQLite database to be maintained alongside live traffic. It
+        is switched to write-ahead logging, so maintenance does not block
+        readers, and to incremental vacuuming. Switching to incremental
+        vacuuming rebuilds the database with a full vacuum, which blocks
+        other connections, so this should be run while the web API is
+        stopped. It does nothing if the database is already prepared.
+        """
+        if not self._is_sqlite:
+            return
+        engine = self._chat_history.engine
+        with engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode = WAL")
+            if self._pragma(connection, "auto_vacuum") != 2:
+                connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                connection.exec_driver_sql("VACUUM")
+
+    def _track_untracked_sessions(self) -> None:
+        """
+        Start tracking the activity of sessions which have messages but no
+        activity recorded, which were created before activity was tracked.
+        Their time to live starts from now.
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from sqlalchemy import text
+
+        table = self._chat_history.message_table
+        with self._chat_history.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"INSERT INTO {ACTIVITY_TABLE} (session_id, last_active) "
+                    f"SELECT DISTINCT session_id, :now FROM {table} "
+                    "WHERE session_id NOT IN "
+                    f"(SELECT session_id FROM {ACTIVITY_TABLE})"
+                ),
+                {"now": time.time()},
+            )
+
+    def _expired_sessions(self, cutoff: float) -> list[str]:
+        """
+        Get the sessions which have been idle since before the cutoff.
+
+        :param cutoff: The Unix time sessions must have been active since.
+        :type cutoff: float
+        :return: The IDs of the expired sessions, oldest first.
+        :rtype: list[str]
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from sqlalchemy import text
+
+        with self._chat_history.engine.connect() as connection:
+            return list(
+                connection.execute(
+                    text(
+                        f"SELECT session_id FROM {ACTIVITY_TABLE} "
+                        "WHERE last_active < :cutoff "
+                        "ORDER BY last_active LIMIT :limit"
+                    ),
+                    {"cutoff": cutoff, "limit": self._config.max_sessions},
+                ).scalars()
+            )
+
+    def _expire_session(self, session_id: str, cutoff: float) -> int:
+        """
+        Archive and remove a session in a single transaction. If the session
+        has become active since it was found to be expired, it is left alone.
+
+        :param session_id: The ID of the session.
+        :type session_id: str
+        :param cutoff: The Unix time the session must have been active since.
+        :type cutoff: float
+        :return: The number of messages archived.
+        :rtype: int
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from sqlalchemy import text
+
+        table = self._chat_history.message_table
+        params = {"session_id": session_id, "cutoff": cutoff}
+        with self._chat_history.engine.begin() as connection:
+            expired = connection.execute(
+                text(
+                    f"DELETE FROM {ACTIVITY_TABLE} WHERE session_id = "
+                    ":session_id AND last_active < :cutoff"
+                ),
+                params,
+            )
+            if expired.rowcount == 0:
+                return 0
+
+            rows = connection.execute(
+                text(
+                    f"SELECT message FROM {table} "
+                    "WHERE session_id = :session_id ORDER BY id"
+                ),
+                params,
+            ).scalars()
+            messages = [
+                self._chat_history.message_json(stored) for stored in rows
+            ]
+            if self._config.archive_dir is not None:
+                self._archive(self._config.archive_dir, session_id, messages)
+            connection.execute(
+                text(f"DELETE FROM {table} WHERE session_id = :session_id"),
+                params,
+            )
+        return len(messages)
+
+    @staticmethod
+    def _archive(
+        archive_dir: Path, session_id: str, messages: list[str]
+    ) -> None:
+        """
+        Append the messages of a session to its gzip compressed archive. The
+        archive is JSON lines, with a header line for each time the session
+        is archived followed by its messages.
+
+        :param archive_dir: The directory of the archives.
+        :type archive_dir: Path
+        :param session_id: The ID of the session.
+        :type session_id: str
+        :param messages: The stored messages of the session, as JSON.
+        :type messages: list[str]
+        """
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        name = sha256(session_id.encode("utf-8")).hexdigest()[:16]
+        path = archive_dir / f"{name}.jsonl.gz"
+        header = {"session_id": session_id, "archived_at": time.time()}
+        with gzip.open(path, "at", encoding="utf-8") as file:
+            file.write(json.dumps(header) + "\n")
+            for message in messages:
+                file.write(message.strip() + "\n")
+
+    def _incremental_vacuum(self) -> int:
+        """
+        Return up to the configured number of free pages to the filesystem,
+        if the database uses incremental vacuuming.
+
+        :return: The number of pages returned.
+        :rtype: int
+        """
+        with self._chat_history.engine.connect() as connection:
+            if self._pragma(connection, "auto_vacuum") != 2:
+                return 0
+            before = self._pragma(connection, "freelist_count")
+            # The SQLite driver only steps a statement once on execute, which
+            # frees a single page, so the pragma is run as a script instead.
+            connection.connection.executescript(
+                f"PRAGMA incremental_vacuum({int(self._config.vacuum_pages)});"
+            )
+            connection.commit()
+            return before - self._pragma(connection, "freelist_count")
+
+    def _analyse(self) -> None:
+        """
+        Update the statistics the query planner uses, examining a limited
+        number of rows in each index so the analysis stays quick.
+        """
+        with self._chat_history.engine.connect() as connection:
+            connection.exec_driver_sql(
+                "PRAGMA analysis_limit = "
+                f"{int(self._config.analysis_limit)}"
+            )
+            connection.exec_driver_sql("ANALYZE")
+            connection.commit()
+
+    @staticmethod
+    def _pragma(connection: "Connection", name: str) -> int:
+        """
+        Read an integer SQLite pragma.
+
+        :param connection: The database connection.
+        :type connection: Connection
+        :param name: The name of the pragma.
+        :type name: str
+        :return: The value of the pragma.
+        :rtype: int
+        """
+        return int(connection.exec_driver_sql(f"PRAGMA {name}").scalar_one())
@@ -2,9 +2,11 @@
 Module for MCP client that interacts with MCP servers.
 """
 
-from typing import Any
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, Awaitable, Protocol, TypeVar
 from types import TracebackType
-from contextlib import AsyncExitStack
+from contextlib import AbstractAsyncContextManager, AsyncExitStack
 
 from typing_extensions import Self
 from mcp import ClientSession
@@ -12,14 +14,58 @@ from mcp.client.stdio import stdio_client, StdioServerParameters
 from mcp.client.sse import sse_client
 from mcp.types import TextContent
 from langchain_core.messages import (
+    AIMessage,
     SystemMessage,
     HumanMessage,
     BaseMessage,
     ToolMessage,
 )
+from langchain_core.messages.tool import ToolCall
 
+from mcp_personal.clients.budget import (
+    BudgetExceededError,
+    InvokeBudget,
+    StopReason,
+    estimate_tokens,
+)
+from mcp_personal.clients.cassette import (
+    Cassette,
+    CassetteMode,
+    RecordingModel,
+    RecordingToolSession,
+    ReplayModel,
+    ReplayToolSession,
+)
 from mcp_personal.clients.chat_history import ChatHistory
 from mcp_personal.clients.model.anthropic import AnthropicModel
+from mcp_personal.clients.model.base import BaseModel
+from mcp_personal.clients.server_pool import (
+    PoolConfig,
+    PooledServer,
+    StdioServerPool,
+)
+from mcp_personal.clients.session_history import SessionHistory
+from mcp_personal.clients.tool_cache import ToolCache, server_fingerprint
+from mcp_personal.clients.tool_guard import (
+    GuardConfig,
+    GuardedToolSession,
+    ToolGuard,
+)
+from mcp_personal.clients.tool_output import (
+    READ_TOOL_NAME,
+    ToolOutputPolicy,
+    ToolOutputSession,
+)
+from mcp_personal.clients.tool_selection import ToolSelector
+from mcp_personal.clients.tool_session import (
+    DeferredToolSession,
+    ToolSession,
+    start_call,
+)
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
 
 SYSTEM_PROMPT_TEMPLATE = (
     "You are a helpful assistant. Try to answer questions concisely and "
@@ -28,33 +74,123 @@ SYSTEM_PROMPT_TEMPLATE = (
     "Here are the tools you can use: \n\n{tools}\n\n"
 )
 
-SERVERS: dict[str, str | StdioServerParameters] = {
+
+class ConnectableServer(Protocol):  # pylint: disable=too-few-public-methods
+    """
+    Protocol for servers which open their own client session, such as the
+    in-process servers used by the benchmarks.
+    """
+
+    name: str
+
+    def connect(self) -> AbstractAsyncContextManager[ClientSession]:
+        """
+        Open an initialised client session with the server.
+
+        :return: A context manager which yields the session and closes it on
+            exit.
+        :rtype: AbstractAsyncContextManager[ClientSession]
+        """
+
+
+ServerConfig = str | StdioServerParameters | PooledServer | ConnectableServer
+
+SERVERS: dict[str, ServerConfig] = {
     "maths": "http://localhost:54321/sse",
-    "notion": StdioServerParameters(
-        command="docker",
-        args=["run", "--rm", "-i", "-e", "OPENAPI_MCP_HEADERS", "mcp/notion"],
-        env={
-            "OPENAPI_MCP_HEADERS": '{"Authorization":"Bearer ntn_****","Notion-Version":"2022-06-28"}'
-        },
+    "notion": PooledServer(
+        StdioServerParameters(
+            command="docker",
+            args=[
+                "run",
+                "--rm",
+                "-i",
+                "-e",
+                "OPENAPI_MCP_HEADERS",
+                "mcp/notion",
+            ],
+            env={
+                "OPENAPI_MCP_HEADERS": '{"Authorization":"Bearer ntn_****","Notion-Version":"2022-06-28"}'
+            },
+        ),
+        PoolConfig(size=2),
     ),
 }
 
 
-class MCPClient:
+class MCPClient:  # pylint: disable=too-many-instance-attributes
     """
     MCPClient is an asynchronous client for interacting with the MCP servers.
     It manages sessions, handles tool calls, and processes queries through a
     model. It also maintains a chat history for each session.
+
+    :param model: The model used to answer queries, defaults to the Anthropic
+        model.
+    :type model: BaseModel | None
+    :param servers: The MCP servers to connect to, keyed by name. A server is
+        either an SSE URL, stdio parameters, a pool of stdio servers or a
+        server which connects itself.
+        Defaults to ``SERVERS``.
+    :type servers: dict[str, ServerConfig] | None
+    :param chat_history: The chat history store, defaults to the SQLite store
+        in the working directory.
+    :type chat_history: ChatHistory | None
+    :param cassette: A cassette to record model and tool traffic to, or to
+        replay it from instead of calling the model and servers.
+    :type cassette: Cassette | None
+    :param tool_cache: A snapshot of the tools provided by the servers. If it
+        matches the configured servers, tools are bound from it at startup
+        instead of waiting for the servers to connect.
+    :type tool_cache: ToolCache | None
+    :param tool_output: A policy limiting how much of each tool output is sent
+        to the model. Larger outputs are stored, and the model can page
+        through them with the built-in ``read_tool_output`` tool.
+    :type tool_output: ToolOutputPolicy | None
+    :param tool_selector: An index of the tools which selects those relevant
+        to each query, so only they are bound to the model and listed in the
+        system prompt. Defaults to offering every tool.
+    :type tool_selector: ToolSelector | None
+    :param tool_guard: Timeouts, circuit breakers and hedging for calls to
+        the tools of the servers. Failed calls are returned to the model as
+        error results. Defaults to calling tools unguarded.
+    :type tool_guard: GuardConfig | None
     """
 
-    def __init__(self) -> None:
-        self.chat_history = ChatHistory()
-        self.sessions: list[ClientSession] = []
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        model: BaseModel | None = None,
+        servers: dict[str, ServerConfig] | None = None,
+        chat_history: ChatHistory | None = None,
+        cassette: Cassette | None = None,
+        tool_cache: ToolCache | None = None,
+        tool_output: ToolOutputPolicy | None = None,
+        tool_selector: ToolSelector | None = None,
+        tool_guard: GuardConfig | None = None,
+    ) -> None:
+        self.chat_history = chat_history or ChatHistory()
+        self.sessions: list[ClientSession | StdioServerPool] = []
         self.exit_stack = AsyncExitStack()
-        self.tool_sessions: dict[str, ClientSession] = {}
-        self._model = AnthropicModel()
+        self.tool_sessions: dict[str, ToolSession] = {}
+        self._cassette = cassette
+        if cassette is None:
+            self._model = model or AnthropicModel()
+        elif cassette.mode is CassetteMode.REPLAY:
+            self._model = ReplayModel(cassette)
+        else:
+            self._model = RecordingModel(model or AnthropicModel(), cassette)
+        self._servers = SERVERS if servers is None else servers
+        self._tool_cache = tool_cache
+        self._tool_output = tool_output
+        self._tool_selector = tool_selector
+        self._tool_guard = tool_guard
+        self._guards: dict[str, ToolGuard] = {}
         self._system_prompt = SYSTEM_PROMPT_TEMPLATE
         self._all_tools: list[dict[str, Any]] = []
+        self._closing = asyncio.Event()
+        self._connection_task: asyncio.Task[None] | None = None
+        self._refresh_task: asyncio.Task[None] | None = None
+        self._warm_up_tasks: set[asyncio.Task[None]] = set()
+        self._warm_up_requested = False
 
     async def __aenter__(self) -> Self:
         """
@@ -88,43 +224,297 @@ class MCPClient:
         """
         Connect to the MCP servers and initialize sessions for each tool.
         This method retrieves the list of tools from each server and binds them
-        to the model for use in the client.
+        to the model for use in the client. If the tool snapshot matches the
+        configured servers, the tools are bound from it straight away and the
+        servers finish connecting in the background, with each tool call
+        waiting for its server to be ready.
         """
-        for _, server_params in SERVERS.items():
-            if isinstance(server_params, str):
-                sse_transport = await self.exit_stack.enter_async_context(
-                    sse_client(server_params)
-                )
-                session = await self.exit_stack.enter_async_context(
-                    ClientSession(*sse_transport)
-                )
-            else:
-                stdio_transport = await self.exit_stack.enter_async_context(
-                    stdio_client(server_params)
-                )
-                session = await self.exit_stack.enter_async_context(
-                    ClientSession(*stdio_transport)
-                )
+        if self._cassette and self._cassette.mode is CassetteMode.REPLAY:
+            # The results were recorded through the guards, so replaying
+            # them through the guards again could hedge a call or time out.
+            replay_session = ReplayToolSession(self._cassette)
+            for server_tools in self._cassette.tools.values():
+                self._register_tools(replay_session, server_tools)
+            self._bind_tools()
+            return
+
+        loop = asyncio.get_running_loop()
+        sessions: dict[str, asyncio.Future[ToolSession]] = {
+            name: loop.create_future() for name in self._servers
+        }
+        tools: dict[str, asyncio.Future[list[dict[str, Any]]]] = {
+            name: loop.create_future() for name in self._servers
+        }
+        # The transports must be entered and exited in the same task, so a
+        # single task owns the connections for the lifetime of the client.
+        self._connection_task = asyncio.create_task(
+            self._maintain_connections(sessions, tools)
+        )
+
+        fingerprints = {
+            name: server_fingerprint(server_params)
+            for name, server_params in self._servers.items()
+        }
+        cached = (
+            self._tool_cache.load(fingerprints) if self._tool_cache else None
+        )
+        if cached is None:
+            live = {name: await tools[name] for name in self._servers}
+            for name, server_tools in live.items():
+                self._register_tools(await sessions[name], server_tools, name)
+            self._bind_tools()
+            if self._tool_cache is not None:
+                self._tool_cache.save(fingerprints, live)
+            return
 
-            await session.initialize()
-            self.sessions.append(session)
+        for name, server_tools in cached.items():
+            self._register_tools(
+                DeferredToolSession(sessions[name]), server_tools, name
+            )
+        self._bind_tools()
+        self._refresh_task = asyncio.create_task(
+            self._refresh_tools(sessions, tools, cached, fingerprints)
+        )
+
+    async def _maintain_connections(
+        self,
+        sessions: dict[str, asyncio.Future[ToolSession]],
+        tools: dict[str, asyncio.Future[list[dict[str, Any]]]],
+    ) -> None:
+        """
+        Connect to each server in turn, resolving its session and tools as it
+        becomes ready, then hold the connections open until the client is
+        closed.
 
-            response = await session.list_tools()
-            tools = response.tools
+        :param sessions: Futures to resolve with the session for each server.
+        :type sessions: dict[str, asyncio.Future[ToolSession]]
+        :param tools: Futures to resolve with the tools of each server.
+        :type tools: dict[str, asyncio.Future[list[dict[str, Any]]]]
+        """
+        async with self.exit_stack:
+            for server_name, server_params in self._servers.items():
+                try:
+                    session = await self._open_session(server_params)
+                    response = await session.list_tools()
+                # pylint: disable-next=broad-exception-caught
+                except Exception as e:
+                    sessions[server_name].set_exception(e)
+                    tools[server_name].set_exception(e)
+                    continue
 
-            for tool in tools:
-                self.tool_sessions[tool.name] = session
-                self._all_tools.append(
+                self.sessions.append(session)
+                server_tools = [
                     {
                         "name": tool.name,
                         "description": tool.description,
                         "input_schema": tool.inputSchema,
                     }
-                )
+                    for tool in response.tools
+                ]
+
+                if self._cassette is not None:
+                    self._cassette.record_tools(server_name, server_tools)
+                sessions[server_name].set_result(session)
+                tools[server_name].set_result(server_tools)
+
+            await self._closing.wait()
+
+    async def _refresh_tools(
+        self,
+        sessions: dict[str, asyncio.Future[ToolSession]],
+        tools: dict[str, asyncio.Future[list[dict[str, Any]]]],
+        cached: dict[str, list[dict[str, Any]]],
+        fingerprints: dict[str, str],
+    ) -> None:
+        """
+        Once every server has connected, rebind the tools and update the
+        snapshot if the servers provide different tools to the snapshot.
+
+        :param sessions: Futures resolving to the session for each server.
+        :type sessions: dict[str, asyncio.Future[ToolSession]]
+        :param tools: Futures resolving to the tools of each server.
+        :type tools: dict[str, asyncio.Future[list[dict[str, Any]]]]
+        :param cached: The tools for each server from the snapshot.
+        :type cached: dict[str, list[dict[str, Any]]]
+        :param fingerprints: The fingerprint of each configured server.
+        :type fingerprints: dict[str, str]
+        """
+        live: dict[str, list[dict[str, Any]]] = {}
+        for name in self._servers:
+            try:
+                live[name] = await tools[name]
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # Tool calls to this server will raise the same error.
+                sessions[name].exception()
+                logger.error("Failed to connect to server %s: %s", name, e)
+
+        if len(live) < len(self._servers) or live == cached:
+            return
+
+        self.tool_sessions = {}
+        self._all_tools = []
+        for name, server_tools in live.items():
+            self._register_tools(sessions[name].result(), server_tools, name)
+        self._bind_tools()
+        if self._tool_cache is not None:
+            self._tool_cache.save(fingerprints, live)
+        if self._warm_up_requested:
+            # Bind the new tools ahead of the next query too.
+            self.start_warm_up()
+
+    def warm_up(self) -> None:
+        """
+        Create the model client and the chat history database ahead of the
+        first query. This blocks, so should be run in a worker thread once the
+        client has connected.
+        """
+        self._model.warm_up()
+        self.chat_history.warm_up()
 
+    def start_warm_up(self) -> None:
+        """
+        Warm up the client in a worker thread, so the event loop can carry on
+        serving requests while it happens. A failure is logged, since the
+        first query creates whatever was not warmed up anyway. If the tools
+        are rebound, the warm up is run again.
+        """
+        self._warm_up_requested = True
+        task = asyncio.create_task(asyncio.to_thread(self.warm_up))
+        self._warm_up_tasks.add(task)
+        task.add_done_callback(self._warm_up_done)
+
+    def _warm_up_done(self, task: "asyncio.Task[None]") -> None:
+        """
+        Forget a finished warm up, logging it if it failed.
+
+        :param task: The finished warm up.
+        :type task: asyncio.Task[None]
+        """
+        self._warm_up_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Warm up failed", exc_info=task.exception())
+
+    def _bind_tools(self) -> None:
+        """
+        Register the built-in tools alongside the tools of the servers, then
+        bind all of the tools to the model and index them for selection. The
+        built-in tools are offered for every query.
+        """
+        if self._tool_output is not None:
+            self._register_tools(
+                ToolOutputSession(self._tool_output), [self._tool_output.tool]
+            )
         self._model.bind_tools(self._all_tools)
+        if self._tool_selector is not None:
+            self._tool_selector.index(self._all_tools, pinned=[READ_TOOL_NAME])
+
+    def _select_tools(
+        self, query: str, history: list[BaseMessage]
+    ) -> list[dict[str, Any]]:
+        """
+        Select the tools to offer the model for a query.
+
+        :param query: The query.
+        :type query: str
+        :param history: The earlier messages of the conversation.
+        :type history: list[BaseMessage]
+        :return: The selected tools, or every tool if there is no selector or
+            none are selected for a conversation which has called tools.
+        :rtype: list[dict[str, Any]]
+        """
+        if self._tool_selector is None:
+            return self._all_tools
+        recent = [
+            tool_call["name"]
+            for message in reversed(history)
+            if isinstance(message, AIMessage)
+            for tool_call in message.tool_calls
+        ]
+        selected = set(self._tool_selector.select(query, recent))
+        if not selected and recent:
+            # The API rejects a history with tool calls if no tools are
+            # offered, which happens if the tools called have since gone.
+            return self._all_tools
+        return [tool for tool in self._all_tools if tool["name"] in selected]
+
+    def _register_tools(
+        self,
+        session: ToolSession,
+        tools: list[dict[str, Any]],
+        server: str | None = None,
+    ) -> None:
+        """
+        Register tools so that calls to them are routed to the given session.
+        Calls to the tools of a server go through the server's guard, if the
+        tool calls are guarded, and are recorded if a cassette is recording.
+        The guarded result is recorded, so a hedged call is recorded once.
+
+        :param session: The session which provides the tools.
+        :type session: ToolSession
+        :param tools: The tools provided by the session.
+        :type tools: list[dict[str, Any]]
+        :param server: The name of the server which provides the tools, or
+            None for built-in tools.
+        :type server: str | None
+        """
+        if self._tool_guard is not None and server is not None:
+            guard = self._guards.get(server)
+            if guard is None:
+                guard = ToolGuard(server, self._tool_guard)
+                self._guards[server] = guard
+            session = GuardedToolSession(session, guard)
+        if (
+            self._cassette is not None
+            and self._cassette.mode is CassetteMode.RECORD
+            and server is not None
+        ):
+            session = RecordingToolSession(session, self._cassette)
+        for tool in tools:
+            self.tool_sessions[tool["name"]] = session
+            self._all_tools.append(tool)
+
+    async def _open_session(
+        self, server_params: ServerConfig
+    ) -> ClientSession | StdioServerPool:
+        """
+        Open and initialise a session with a single MCP server. The transport
+        and session are registered on the exit stack so they are closed with
+        the client.
+
+        :param server_params: The configuration of the server to connect to.
+        :type server_params: ServerConfig
+        :return: The initialised session, or the started pool of servers.
+        :rtype: ClientSession | StdioServerPool
+        """
+        if isinstance(server_params, PooledServer):
+            return await self.exit_stack.enter_async_context(
+                StdioServerPool(server_params)
+            )
+
+        if isinstance(server_params, str):
+            transport = await self.exit_stack.enter_async_context(
+                sse_client(server_params)
+            )
+        elif isinstance(server_params, StdioServerParameters):
+            transport = await self.exit_stack.enter_async_context(
+                stdio_client(server_params)
+            )
+        else:
+            return await self.exit_stack.enter_async_context(
+                server_params.connect()
+            )
+        session = await self.exit_stack.enter_async_context(
+            ClientSession(*transport)
+        )
+        await session.initialize()
+        return session
 
-    async def invoke(self, query: str, session_id: str) -> list[BaseMessage]:
+    async def invoke(
+        self,
+        query: str,
+        session_id: str,
+        budget: InvokeBudget | None = None,
+    ) -> list[BaseMessage]:
         """
         Invoke the MCP client with a query and session ID, processing the query
         through the model and tools, and returning the response messages.
@@ -133,54 +523,264 @@ class MCPClient:
         :type query: str
         :param session_id: The session ID for tracking the conversation.
         :type session_id: str
+        :param budget: Limits on the work done to answer the query, which
+            records why processing stopped.
+        :type budget: InvokeBudget | None
         :return: A list of messages containing the response from the model and
             any tool calls.
         :rtype: list[BaseMessage]
         """
-        messages = [
-            SystemMessage(
-                content=self._system_prompt.format(tools=self._all_tools)
+        return [
+            message
+            async for message in self.stream(
+                query=query, session_id=session_id, budget=budget
             )
-        ] + self.chat_history.get_messages(session_id)
-        query_message = HumanMessage(content=query)
+        ]
+
+    async def stream(
+        self,
+        query: str,
+        session_id: str,
+        budget: InvokeBudget | None = None,
+        history: SessionHistory | None = None,
+    ) -> AsyncGenerator[BaseMessage, None]:
+        """
+        Process a query through the model and tools, yielding each response
+        message as soon as it is produced. The messages are added to the chat
+        history once processing stops, whether the model has given its final
+        answer, the budget has run out, the query was cancelled or it failed.
+        Any tool calls left unanswered are closed with an error message, so
+        the history stays valid for the next query.
+
+        :param query: The query to process.
+        :type query: str
+        :param session_id: The session ID for tracking the conversation.
+        :type session_id: str
+        :param budget: Limits on the work done to answer the query, which
+            records why processing stopped.
+        :type budget: InvokeBudget | None
+        :param history: The history of the session held in memory, which is
+            used instead of reading and writing the chat history.
+        :type history: SessionHistory | None
+        :raises asyncio.CancelledError: If the query is cancelled.
+        :raises GeneratorExit: If the generator is closed early.
+        :raises Exception: If the model or a tool call fails.
+        :yield: Each message from the model and any tool calls.
+        :ytype: BaseMessage
+        """
+        if budget is None:
+            budget = InvokeBudget()
+        budget.start()
+        if self._cassette and self._cassette.mode is CassetteMode.RECORD:
+            self._cassette.record_query(session_id, query)
+
+        if history is None:
+            past = self.chat_history.get_messages(session_id)
+        else:
+            past = history.get_messages()
+        tools = self._select_tools(query, past)
+        tool_names = (
+            None
+            if self._tool_selector is None
+            else [tool["name"] for tool in tools]
+        )
+        messages = [
+            SystemMessage(content=self._system_prompt.format(tools=tools)),
+            *past,
+            HumanMessage(content=query),
+        ]
         new_messages: list[BaseMessage] = []
-        response = self._model.chat(messages + [query_message] + new_messages)
-        new_messages.append(response)
+        pending: list[ToolCall] = []
+        try:
+            response = await self._call_model(messages, budget, tool_names)
+            pending = list(response.tool_calls)
+            new_messages.append(response)
+            yield response
 
-        while len(response.tool_calls) > 0:
-            for tool_call in response.tool_calls:
-                result = await self.tool_sessions[tool_call["name"]].call_tool(
-                    name=tool_call["name"], arguments=tool_call["args"]
-                )
+            while pending:
+                budget.next_iteration()
+                while pending:
+                    message = await self._call_tool(pending[0], budget)
+                    pending.pop(0)
+                    new_messages.append(message)
+                    yield message
 
-                new_messages.append(
-                    ToolMessage(
-                        content=result.content,  # type: ignore[arg-type]
-                        artifact={
-                            "call": tool_call,
-                            "result": (
-                                result.content[0].text
-                                if isinstance(result.content[0], TextContent)
-                                else result.content[0]
-                            ),
-                        },
-                        name=tool_call["name"],
-                        tool_call_id=tool_call["id"],
-                    )
+                response = await self._call_model(
+                    messages + new_messages, budget, tool_names
                 )
-            response = self._model.chat(
-                messages + [query_message] + new_messages
+                pending = list(response.tool_calls)
+                new_messages.append(response)
+                yield response
+            budget.stop_reason = StopReason.COMPLETE
+        except BudgetExceededError as e:
+            budget.stop_reason = e.reason
+            while pending:
+                message = self._unanswered_message(pending.pop(0), e.reason)
+                new_messages.append(message)
+                yield message
+        except (asyncio.CancelledError, GeneratorExit, Exception) as e:
+            budget.stop_reason = (
+                StopReason.ERROR
+                if isinstance(e, Exception)
+                else StopReason.CANCELLED
             )
-            new_messages.append(response)
+            new_messages += [
+                self._unanswered_message(tool_call, budget.stop_reason)
+                for tool_call in pending
+            ]
+            raise
+        finally:
+            if new_messages and history is not None:
+                history.add_messages(new_messages)
+            elif new_messages:
+                self.chat_history.add_messages(
+                    messages=new_messages, session_id=session_id
+                )
+
+    async def _call_model(
+        self,
+        messages: list[BaseMessage],
+        budget: InvokeBudget,
+        tools: list[str] | None = None,
+    ) -> AIMessage:
+        """
+        Call the model within the budget, counting the tokens it uses.
+
+        :param messages: The messages to send to the model.
+        :type messages: list[BaseMessage]
+        :param budget: The budget of the query.
+        :type budget: InvokeBudget
+        :param tools: Names of the tools offered to the model, defaults to
+            every tool.
+        :type tools: list[str] | None
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        budget.check()
+        max_tokens = budget.output_tokens(estimate_tokens(messages))
+        response = await self._before_deadline(
+            self._model.achat(messages, max_tokens=max_tokens, tools=tools),
+            budget,
+        )
+        budget.record_usage(response)
+        return response
+
+    async def _call_tool(
+        self, tool_call: ToolCall, budget: InvokeBudget
+    ) -> ToolMessage:
+        """
+        Call a tool within the budget. If the output is larger than the tool
+        output policy allows, the message holds a preview of the output and
+        the handle it is stored under.
+
+        :param tool_call: The tool call requested by the model.
+        :type tool_call: ToolCall
+        :param budget: The budget of the query.
+        :type budget: InvokeBudget
+        :return: The message with the result of the tool call.
+        :rtype: ToolMessage
+        """
+        budget.check()
+        call = start_call(
+            self.tool_sessions[tool_call["name"]],
+            tool_call["name"],
+            tool_call["args"],
+        )
+        # A call which is given up on is left to finish, see start_call.
+        result = await self._before_deadline(asyncio.shield(call), budget)
+        content: Any = result.content
+        artifact = {
+            "call": tool_call,
+            "result": (
+                result.content[0].text
+                if isinstance(result.content[0], TextContent)
+                else result.content[0]
+            ),
+        }
+        if (
+            self._tool_output is not None
+            and tool_call["name"] != READ_TOOL_NAME
+            and all(isinstance(block, TextContent) for block in content)
+        ):
+            text, handle = self._tool_output.apply(
+                "".join(block.text for block in content)
+            )
+            if handle is not None:
+                content = text
+                artifact = {
+                    "call": tool_call,
+                    "result": text,
+                    "handle": handle,
+                }
 
-        self.chat_history.add_messages(
-            messages=new_messages, session_id=session_id
+        return ToolMessage(
+            content=content,
+            artifact=artifact,
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error" if result.isError else "success",
         )
 
-        return new_messages
+    @staticmethod
+    async def _before_deadline(
+        awaitable: Awaitable[_T], budget: InvokeBudget
+    ) -> _T:
+        """
+        Await a call, cancelling it if the deadline of the budget passes.
+
+        :param awaitable: The call to await.
+        :type awaitable: Awaitable[_T]
+        :param budget: The budget of the query.
+        :type budget: InvokeBudget
+        :raises TimeoutError: If the call times out on its own.
+        :raises BudgetExceededError: If the deadline passes before the call
+            completes.
+        :return: The result of the call.
+        :rtype: _T
+        """
+        timeout = asyncio.timeout_at(budget.deadline)
+        try:
+            async with timeout:
+                return await awaitable
+        except TimeoutError as e:
+            if not timeout.expired():
+                raise
+            raise BudgetExceededError(StopReason.DEADLINE) from e
+
+    @staticmethod
+    def _unanswered_message(
+        tool_call: ToolCall, reason: StopReason
+    ) -> ToolMessage:
+        """
+        Create the error message for a tool call that was not run.
+
+        :param tool_call: The tool call requested by the model.
+        :type tool_call: ToolCall
+        :param reason: Why the tool call was not run.
+        :type reason: StopReason
+        :return: The message with the error.
+        :rtype: ToolMessage
+        """
+        content = f"Tool call not run: {reason.value}"
+        return ToolMessage(
+            content=content,
+            artifact={"call": tool_call, "result": content},
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error",
+        )
 
     async def close(self) -> None:
         """
-        Close the MCP client and all sessions.
+        Close the MCP client and all sessions, saving the cassette if one is
+        being recorded.
         """
-        await self.exit_stack.aclose()
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        self._closing.set()
+        if self._connection_task is not None:
+            await self._connection_task
+        # Worker threads cannot be cancelled, so the warm ups are waited for.
+        await asyncio.gather(*self._warm_up_tasks, return_exceptions=True)
+        if self._cassette and self._cassette.mode is CassetteMode.RECORD:
+            self._cassette.save()
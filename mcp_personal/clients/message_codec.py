@@ -0,0 +1,311 @@
+"""
+Module for the compact binary storage format of chat history messages. Each
+message is packed with msgpack, leaving out empty fields, and compressed with
+zstd. Messages are small and repetitive, so the compression uses dictionaries
+trained on typical messages, which are stored in the database alongside the
+messages. Each compressed message records the ID of its dictionary, so
+messages compressed with an older dictionary can still be read after a new
+one is trained.
+
+This needs the optional ``msgpack`` and ``zstandard`` dependencies, which are
+installed with the ``storage`` extra.
+"""
+
+import threading
+import time
+from typing import Any, Iterable
+
+from langchain_community.chat_message_histories.sql import (
+    BaseMessageConverter,
+)
+from langchain_core.messages import (
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from sqlalchemy import (
+    Column,
+    Float,
+    Integer,
+    LargeBinary,
+    MetaData,
+    Table,
+    Text,
+    select,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import declarative_base
+
+try:
+    import msgpack  # type: ignore[import-untyped]
+    import zstandard
+except ImportError:  # pragma: no cover - these are optional dependencies
+    msgpack = None
+    zstandard = None  # type: ignore[assignment]
+
+DICTIONARY_TABLE = "message_dictionary"
+COMPRESSION_LEVEL = 3
+DICTIONARY_SIZE = 16 * 1024
+MIN_TRAINING_SAMPLES = 100
+
+_metadata = MetaData()
+_dictionary_table = Table(
+    DICTIONARY_TABLE,
+    _metadata,
+    Column("dict_id", Integer, primary_key=True, autoincrement=False),
+    Column("data", LargeBinary, nullable=False),
+    Column("created", Float, nullable=False),
+)
+
+
+class MessageCodec:
+    """
+    Codec which encodes messages in the compact binary format.
+
+    :param dictionaries: Trained compression dictionaries, of which the last
+        is used to compress messages.
+    :type dictionaries: Iterable[bytes]
+    :raises ImportError: If msgpack or zstandard is not installed.
+    """
+
+    def __init__(self, dictionaries: Iterable[bytes] = ()) -> None:
+        if msgpack is None or zstandard is None:
+            raise ImportError(
+                "The binary chat history storage needs msgpack and "
+                "zstandard, which are installed with the storage extra"
+            )
+        self._dictionaries: dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self._current: "zstandard.ZstdCompressionDict | None" = None
+        # Compressors are not thread safe, so each thread has its own.
+        self._local = threading.local()
+        for data in dictionaries:
+            self.add_dictionary(data)
+
+    @property
+    def dictionary_id(self) -> int | None:
+        """
+        Property to get the ID of the dictionary messages are compressed
+        with.
+
+        :return: The ID of the dictionary, or None if there is none.
+        :rtype: int | None
+        """
+        return self._current.dict_id() if self._current else None
+
+    def add_dictionary(self, data: bytes) -> int:
+        """
+        Add a trained dictionary, which is used to compress messages from
+        now on.
+
+        :param data: The dictionary.
+        :type data: bytes
+        :return: The ID of the dictionary.
+        :rtype: int
+        """
+        dictionary = zstandard.ZstdCompressionDict(data)
+        dictionary.precompute_compress(level=COMPRESSION_LEVEL)
+        self._dictionaries[dictionary.dict_id()] = dictionary
+        self._current = dictionary
+        self._local = threading.local()
+        return int(dictionary.dict_id())
+
+    @staticmethod
+    def pack(message: BaseMessage) -> bytes:
+        """
+        Pack a message with msgpack, without compressing it. Fields which are
+        empty are left out, as they are restored to their defaults when the
+        message is unpacked.
+
+        :param message: The message to pack.
+        :type message: BaseMessage
+        :return: The packed message.
+        :rtype: bytes
+        """
+        message_dict = message_to_dict(message)
+        message_dict["data"] = {
+            key: value
+            for key, value in message_dict["data"].items()
+            if key == "content" or value not in (None, {}, [])
+        }
+        packed: bytes = msgpack.packb(message_dict)
+        return packed
+
+    def encode(self, message: BaseMessage) -> bytes:
+        """
+        Encode a message in the compact binary format.
+
+        :param message: The message to encode.
+        :type message: BaseMessage
+        :return: The encoded message.
+        :rtype: bytes
+        """
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(
+                level=COMPRESSION_LEVEL, dict_data=self._current
+            )
+            self._local.compressor = compressor
+        encoded: bytes = compressor.compress(self.pack(message))
+        return encoded
+
+    def decode(self, data: bytes) -> BaseMessage:
+        """
+        Decode a message from the compact binary format.
+
+        :param data: The encoded message.
+        :type data: bytes
+        :raises ValueError: If the message was compressed with a dictionary
+            which is not known.
+        :return: The decoded message.
+        :rtype: BaseMessage
+        """
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id and dict_id not in self._dictionaries:
+                raise ValueError(f"Unknown compression dictionary {dict_id}")
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=self._dictionaries.get(dict_id)
+            )
+            decompressors[dict_id] = decompressor
+        message_dict = msgpack.unpackb(decompressor.decompress(data))
+        return messages_from_dict([message_dict])[0]
+
+
+def train_dictionary(messages: Iterable[BaseMessage]) -> bytes:
+    """
+    Train a compression dictionary on a sample of typical messages.
+
+    :param messages: The sample of messages.
+    :type messages: Iterable[BaseMessage]
+    :raises ValueError: If there are too few messages to train on.
+    :return: The trained dictionary.
+    :rtype: bytes
+    """
+    samples = [MessageCodec.pack(message) for message in messages]
+    if len(samples) < MIN_TRAINING_SAMPLES:
+        raise ValueError(
+            f"At least {MIN_TRAINING_SAMPLES} messages are needed to train a "
+            f"dictionary, got {len(samples)}"
+        )
+    dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, samples)
+    data: bytes = dictionary.as_bytes()
+    return data
+
+
+def create_dictionary_table(engine: Engine) -> None:
+    """
+    Create the table the compression dictionaries are stored in.
+
+    :param engine: The database engine.
+    :type engine: Engine
+    """
+    _metadata.create_all(engine)
+
+
+def load_dictionaries(engine: Engine) -> list[bytes]:
+    """
+    Load the stored compression dictionaries, oldest first.
+
+    :param engine: The database engine.
+    :type engine: Engine
+    :return: The dictionaries.
+    :rtype: list[bytes]
+    """
+    with engine.connect() as connection:
+        return list(
+            connection.execute(
+                select(_dictionary_table.c.data).order_by(
+                    _dictionary_table.c.created
+                )
+            ).scalars()
+        )
+
+
+def save_dictionary(engine: Engine, data: bytes) -> None:
+    """
+    Store a compression dictionary, which becomes the newest.
+
+    :param engine: The database engine.
+    :type engine: Engine
+    :param data: The dictionary.
+    :type data: bytes
+    """
+    dict_id = zstandard.ZstdCompressionDict(data).dict_id()
+    with engine.begin() as connection:
+        connection.execute(
+            _dictionary_table.delete().where(
+                _dictionary_table.c.dict_id == dict_id
+            )
+        )
+        connection.execute(
+            _dictionary_table.insert().values(
+                dict_id=dict_id, data=data, created=time.time()
+            )
+        )
+
+
+class BinaryMessageConverter(BaseMessageConverter):
+    """
+    Converter between messages and rows of a table which stores them in the
+    compact binary format.
+
+    :param table_name: The name of the message table.
+    :type table_name: str
+    :param codec: The codec used to encode the messages.
+    :type codec: MessageCodec
+    """
+
+    def __init__(self, table_name: str, codec: MessageCodec) -> None:
+        self.codec = codec
+
+        # pylint: disable-next=too-few-public-methods
+        class Message(declarative_base()):  # type: ignore[misc]
+            """
+            Row of the binary message table.
+            """
+
+            __tablename__ = table_name
+            id = Column(Integer, primary_key=True)
+            session_id = Column(Text)
+            message = Column(LargeBinary)
+
+        self.model_class = Message
+
+    def from_sql_model(self, sql_message: Any) -> BaseMessage:
+        """
+        Convert a row of the message table to a message.
+
+        :param sql_message: The row.
+        :type sql_message: Any
+        :return: The message.
+        :rtype: BaseMessage
+        """
+        return self.codec.decode(sql_message.message)
+
+    def to_sql_model(self, message: BaseMessage, session_id: str) -> Any:
+        """
+        Convert a message to a row of the message table.
+
+        :param message: The message.
+        :type message: BaseMessage
+        :param session_id: The ID of the session of the message.
+        :type session_id: str
+        :return: The row.
+        :rtype: Any
+        """
+        return self.model_class(
+            session_id=session_id, message=self.codec.encode(message)
+        )
+
+    def get_sql_model_class(self) -> Any:
+        """
+        Get the model class of the message table.
+
+        :return: The model class.
+        :rtype: Any
+        """
+        return self.model_class
@@ -2,20 +2,33 @@
 Module for interacting with the Anthropic API.
 """
 
+from functools import cached_property
 from os import environ
 
-from langchain_anthropic.chat_models import ChatAnthropic
+from langchain_core.language_models.chat_models import BaseChatModel
 
 from mcp_personal.clients.model.base import BaseModel
 
 
 class AnthropicModel(BaseModel):
     """
-    Model class for interacting with the Anthropic API.
+    Model class for interacting with the Anthropic API. The client is created
+    on first use, which keeps importing the Anthropic SDK off the startup
+    path.
     """
 
-    def __init__(self) -> None:
-        self._model = ChatAnthropic(  # type: ignore[call-arg]
+    @cached_property
+    def _model(self) -> BaseChatModel:  # type: ignore[override]
+        """
+        The Anthropic chat model, created on first access.
+
+        :return: The chat model.
+        :rtype: BaseChatModel
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from langchain_anthropic.chat_models import ChatAnthropic
+
+        return ChatAnthropic(  # type: ignore[call-arg]
             model_name="claude-3-haiku-20240307",
             temperature=0.3,
             max_tokens_to_sample=1024,
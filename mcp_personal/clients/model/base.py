@@ -3,7 +3,9 @@ Module for the BaseModel class, which provides a unified interface
 for interacting with various language models.
 """
 
-from typing import Any, Optional
+import asyncio
+from threading import Lock
+from typing import Any, Collection
 
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langchain_core.runnables import Runnable
@@ -15,11 +17,23 @@ class BaseModel:
     """
     Base class for interacting with a language model. Provides methods to
     chat with the model and invoke it with a prompt. Can also bind tools to
-    the model for enhanced functionality."""
+    the model for enhanced functionality. A chat can use a subset of the
+    bound tools, and the model with each subset bound is kept for reuse.
+    The kept models are guarded by a lock, as the model may be warmed up in a
+    worker thread while the tools are rebound on the event loop. The lock is
+    only held to look up and store models, never while a model is created or
+    bound, so the event loop does not wait behind a warm up."""
 
     _model: BaseChatModel
     _tools_bound: bool = False
-    _tool_model: Optional[Runnable[LanguageModelInput, BaseMessage]]
+    _tools: list[dict[str, Any]]
+    _tool_models: dict[
+        tuple[str, ...], Runnable[LanguageModelInput, BaseMessage]
+    ]
+    max_tool_models: int = 32
+
+    def __init__(self) -> None:
+        self._bind_lock = Lock()
 
     def chat(self, messages: list[BaseMessage]) -> AIMessage:
         """
@@ -33,8 +47,8 @@ class BaseModel:
         :return: The model's response message.
         :rtype: AIMessage
         """
-        if self._tools_bound and self._tool_model:
-            result = self._tool_model.invoke(input=messages)
+        if self._tools_bound:
+            result = self._get_tool_model().invoke(input=messages)
         else:
             result = self._model.invoke(input=messages)
 
@@ -42,6 +56,51 @@ class BaseModel:
             raise TypeError(f"Expected AIMessage, got {type(result).__name__}")
         return result
 
+    async def achat(
+        self,
+        messages: list[BaseMessage],
+        max_tokens: int | None = None,
+        tools: Collection[str] | None = None,
+    ) -> AIMessage:
+        """
+        Method to asynchronously send a list of messages to the model and
+        generate the next response, without blocking the event loop.
+
+        :param messages: List of messages to send to the model.
+        :type messages: list[BaseMessage]
+        :param max_tokens: Maximum number of tokens to generate. The model's
+            own limit still applies if it is lower.
+        :type max_tokens: int | None
+        :param tools: Names of the bound tools the model may use for this
+            call, defaults to all of them.
+        :type tools: Collection[str] | None
+        :raises TypeError: If the model's response is not an instance of
+            AIMessage.
+        :return: The model's response message.
+        :rtype: AIMessage
+        """
+        kwargs: dict[str, Any] = {}
+        if max_tokens is not None:
+            limit = getattr(self._model, "max_tokens", None)
+            kwargs["max_tokens"] = (
+                max_tokens if limit is None else min(max_tokens, limit)
+            )
+
+        if self._tools_bound and (tools is None or tools):
+            tool_model = self._find_tool_model(tools)
+            if tool_model is None:
+                # Creating the model and binding the tools may be slow.
+                tool_model = await asyncio.to_thread(
+                    self._get_tool_model, tools
+                )
+            result = await tool_model.ainvoke(input=messages, **kwargs)
+        else:
+            result = await self._model.ainvoke(input=messages, **kwargs)
+
+        if not isinstance(result, AIMessage):
+            raise TypeError(f"Expected AIMessage, got {type(result).__name__}")
+        return result
+
     def invoke(self, prompt: str) -> str:
         """
         Method to send a prompt to the model and get the response.
@@ -52,10 +111,12 @@ class BaseModel:
         :return: The model's response.
         :rtype: str
         """
-        if self._tools_bound and self._tool_model:
-            result = self._tool_model.invoke(
-                input=[HumanMessage(content=prompt)]
-            ).content
+        if self._tools_bound:
+            result = (
+                self._get_tool_model()
+                .invoke(input=[HumanMessage(content=prompt)])
+                .content
+            )
         else:
             result = self._model.invoke(
                 input=[HumanMessage(content=prompt)]
@@ -68,10 +129,81 @@ class BaseModel:
 
     def bind_tools(self, tools: list[dict[str, Any]]) -> None:
         """
-        Method to bind tools to the model.
+        Method to bind tools to the model. The tools are converted into the
+        model's format when the model is first used with them.
 
         :param tools: List of tool names to bind to the model.
         :type tools: list[dict[str, Any]]
         """
-        self._tool_model = self._model.bind_tools(tools)
-        self._tools_bound = True
+        with self._bind_lock:
+            self._tools = tools
+            self._tool_models = {}
+            self._tools_bound = True
+
+    def warm_up(self) -> None:
+        """
+        Method to create the underlying model and bind its tools ahead of the
+        first call, so the first query does not pay for it.
+        """
+        _ = self._model
+        if self._tools_bound:
+            self._get_tool_model()
+
+    def _find_tool_model(
+        self, names: Collection[str] | None = None
+    ) -> Runnable[LanguageModelInput, BaseMessage] | None:
+        """
+        Get the model with the tools bound, if it has been kept since the
+        tools were last set, marking it as the most recently used.
+
+        :param names: Names of the tools to bind, defaults to all of them.
+        :type names: Collection[str] | None
+        :return: The model with the tools bound, or None if it must be bound.
+        :rtype: Runnable[LanguageModelInput, BaseMessage] | None
+        """
+        with self._bind_lock:
+            key = tuple(
+                tool["name"]
+                for tool in self._tools
+                if names is None or tool["name"] in names
+            )
+            tool_model = self._tool_models.pop(key, None)
+            if tool_model is not None:
+                self._tool_models[key] = tool_model
+            return tool_model
+
+    def _get_tool_model(
+        self, names: Collection[str] | None = None
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """
+        Get the model with the tools bound, binding them if this has not been
+        done since the tools were last set. The most recently used models are
+        kept, up to ``max_tool_models`` of them.
+
+        :param names: Names of the tools to bind, defaults to all of them.
+        :type names: Collection[str] | None
+        :return: The model with the tools bound.
+        :rtype: Runnable[LanguageModelInput, BaseMessage]
+        """
+        tool_model = self._find_tool_model(names)
+        if tool_model is not None:
+            return tool_model
+
+        with self._bind_lock:
+            tools = [
+                tool
+                for tool in self._tools
+                if names is None or tool["name"] in names
+            ]
+            tool_models = self._tool_models
+        tool_model = self._model.bind_tools(tools)
+        with self._bind_lock:
+            # Models bound to tools which have since been replaced are not
+            # kept.
+            if tool_models is self._tool_models:
+                key = tuple(tool["name"] for tool in tools)
+                tool_models.pop(key, None)
+                if len(tool_models) >= self.max_tool_models:
+                    del tool_models[next(iter(tool_models))]
+                tool_models[key] = tool_model
+        return tool_model
@@ -0,0 +1,537 @@
+"""
+Module for a warm pool of stdio MCP servers. Several processes of the same
+server are spawned ahead of time, and tool calls are spread across them round
+robin, so calls are not serialised through a single pipe and a server which
+is slow to start, such as one run in a container, is only waited for once.
+Servers which crash are replaced in the background, the pool grows while
+every server is busy, and servers beyond the warm size are stopped once they
+have been idle for a while.
+
+Example usage:
+    pool = StdioServerPool(PooledServer(params, PoolConfig(size=2)))
+    async with pool:
+        result = await pool.call_tool("search", {"query": "notes"})
+"""
+
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import timedelta
+import logging
+from types import TracebackType
+from typing import Any, Awaitable, TypeVar
+
+import anyio
+from anyio.streams.memory import (
+    MemoryObjectReceiveStream,
+    MemoryObjectSendStream,
+)
+from mcp import ClientSession
+from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.types import CallToolResult, ListToolsResult
+from typing_extensions import Self
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+class ServerUnavailableError(ConnectionError):
+    """
+    Raised when no server in the pool can take a call, or the server handling
+    a call crashes before it answers.
+    """
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """
+    Configuration of a pool of stdio servers.
+
+    :param size: The number of servers kept running at all times.
+    :type size: int
+    :param max_size: The most servers run at once while every server is busy.
+    :type max_size: int
+    :param idle_timeout: Time in seconds a server beyond the warm size can be
+        idle before it is stopped.
+    :type idle_timeout: float
+    :param health_interval: Time in seconds between health checks of idle
+        servers.
+    :type health_interval: float
+    :param start_timeout: Time in seconds to wait for a server to start.
+    :type start_timeout: float
+    :param max_restart_delay: Maximum time in seconds to wait before starting
+        a server again after it failed to start.
+    :type max_restart_delay: float
+    """
+
+    size: int = 2
+    max_size: int = 4
+    idle_timeout: float = 300.0
+    health_interval: float = 30.0
+    start_timeout: float = 60.0
+    max_restart_delay: float = 30.0
+
+    def __post_init__(self) -> None:
+        """
+        Check the pool sizes are consistent.
+
+        :raises ValueError: If the warm size is less than one, or more than
+            the maximum size.
+        """
+        if not 1 <= self.size <= self.max_size:
+            raise ValueError("Pool size must be between 1 and max_size")
+
+
+@dataclass(frozen=True)
+class PooledServer:
+    """
+    Configuration of a stdio server run as a warm pool of processes.
+
+    :param params: The parameters used to start each process.
+    :type params: StdioServerParameters
+    :param config: The configuration of the pool.
+    :type config: PoolConfig
+    """
+
+    params: StdioServerParameters
+    config: PoolConfig = PoolConfig()
+
+
+@dataclass(eq=False)
+class _Member:
+    """
+    A single server process in the pool.
+    """
+
+    session: ClientSession | None = None
+    in_flight: int = 0
+    last_used: float = 0.0
+    started: "asyncio.Future[None]" = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+    stop: asyncio.Event = field(default_factory=asyncio.Event)
+    dead: asyncio.Event = field(default_factory=asyncio.Event)
+    task: "asyncio.Task[None] | None" = None
+
+    @property
+    def client(self) -> ClientSession:
+        """
+        Property to get the session of the server.
+
+        :raises ServerUnavailableError: If the server has not started.
+        :return: The session.
+        :rtype: ClientSession
+        """
+        if self.session is None:
+            raise ServerUnavailableError("Server has not started")
+        return self.session
+
+
+class StdioServerPool:  # pylint: disable=too-many-instance-attributes
+    """
+    Warm pool of processes of a stdio MCP server, which is used as a single
+    tool session. Each process is owned by its own task, since the stdio
+    transport must be entered and exited in the same task.
+
+    :param server: The server to run and the configuration of the pool.
+    :type server: PooledServer
+    """
+
+    def __init__(self, server: PooledServer) -> None:
+        self._params = server.params
+        self._config = server.config
+        self._members: list[_Member] = []
+        self._ready: list[_Member] = []
+        self._next = 0
+        self._available = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._failures = 0
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._supervisor: "asyncio.Task[None] | None" = None
+
+    async def __aenter__(self) -> Self:
+        """
+        Asynchronous context manager entry method, which spawns the warm
+        servers and waits for the first to be ready.
+
+        :raises ServerUnavailableError: If none of the servers start.
+        :return: The pool.
+        :rtype: Self
+        """
+        members = [self._spawn() for _ in range(self._config.size)]
+        errors: list[BaseException] = []
+        for started in asyncio.as_completed([m.started for m in members]):
+            try:
+                await started
+                break
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                errors.append(e)
+        else:
+            await self.close()
+            raise ServerUnavailableError(
+                f"No server in the pool started: {errors[-1]}"
+            )
+        self._supervisor = asyncio.create_task(self._supervise())
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """
+        Asynchronous context manager exit method, which stops every server.
+
+        :param exc_type: The type of exception raised, if any.
+        :type exc_type: type[BaseException] | None
+        :param exc_value: The exception instance, if any.
+        :type exc_value: BaseException | None
+        :param traceback: The traceback of the exception, if any.
+        :type traceback: TracebackType | None
+        """
+        await self.close()
+
+    @property
+    def size(self) -> int:
+        """
+        Property to get the number of servers running or starting.
+
+        :return: The number of servers.
+        :rtype: int
+        """
+        return len(self._members)
+
+    async def close(self) -> None:
+        """
+        Stop every server in the pool.
+        """
+        self._closing.set()
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        for member in self._members:
+            member.stop.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def list_tools(self) -> ListToolsResult:
+        """
+        List the tools provided by the server.
+
+        :return: The tools.
+        :rtype: ListToolsResult
+        """
+        member = await self._acquire()
+        try:
+            return await self._until_dead(member, member.client.list_tools())
+        finally:
+            self._release(member)
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Call a tool on the next server in the pool.
+
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: How long to wait for the result.
+        :type read_timeout_seconds: timedelta | None
+        :return: The result of the tool call.
+        :rtype: CallToolResult
+        """
+        member = await self._acquire()
+        try:
+            return await self._until_dead(
+                member,
+                member.client.call_tool(
+                    name=name,
+                    arguments=arguments,
+                    read_timeout_seconds=read_timeout_seconds,
+                ),
+            )
+        finally:
+            self._release(member)
+
+    async def _acquire(self) -> _Member:
+        """
+        Take the next ready server round robin, waiting for one to start if
+        none are ready. If every server is busy, another is started in the
+        background for later calls.
+
+        :raises ServerUnavailableError: If no server is ready in time.
+        :return: The server.
+        :rtype: _Member
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._config.start_timeout
+        # A server which became ready may die before this call resumes.
+        while not self._ready:
+            try:
+                await asyncio.wait_for(
+                    self._available.wait(), deadline - loop.time()
+                )
+            except TimeoutError as e:
+                raise ServerUnavailableError("No server is available") from e
+
+        member = self._ready[self._next % len(self._ready)]
+        self._next += 1
+        if (
+            member.in_flight > 0
+            and all(m.in_flight > 0 for m in self._ready)
+            and len(self._members) < self._config.max_size
+        ):
+            self._spawn()
+        member.in_flight += 1
+        return member
+
+    def _release(self, member: _Member) -> None:
+        """
+        Return a server after a call.
+
+        :param member: The server.
+        :type member: _Member
+        """
+        member.in_flight -= 1
+        member.last_used = asyncio.get_running_loop().time()
+
+    @staticmethod
+    async def _until_dead(member: _Member, call: Awaitable[_T]) -> _T:
+        """
+        Await a call to a server, giving up if the server crashes first. The
+        session does not fail calls in flight when its process exits, so
+        they would otherwise never return.
+
+        :param member: The server the call was made to.
+        :type member: _Member
+        :param call: The call.
+        :type call: Awaitable[_T]
+        :raises ServerUnavailableError: If the server crashes before the call
+            returns, or the call fails because the server has crashed.
+        :return: The result of the call.
+        :rtype: _T
+        """
+        call_task = asyncio.ensure_future(call)
+        dead_task = asyncio.ensure_future(member.dead.wait())
+        try:
+            await asyncio.wait(
+                {call_task, dead_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            dead_task.cancel()
+            if not call_task.done():
+                call_task.cancel()
+        if not call_task.done() or call_task.cancelled():
+            raise ServerUnavailableError("Server exited during the call")
+        error = call_task.exception()
+        if error is not None and member.dead.is_set():
+            raise ServerUnavailableError(
+                "Server exited during the call"
+            ) from error
+        return call_task.result()
+
+    def _spawn(self) -> _Member:
+        """
+        Start a new server in the background.
+
+        :return: The server.
+        :rtype: _Member
+        """
+        member = _Member()
+        # Nothing waits for a replacement to start, so a failure to start is
+        # retrieved here rather than logged as never retrieved.
+        member.started.add_done_callback(_retrieve_exception)
+        member.task = asyncio.create_task(self._run_member(member))
+        self._tasks.add(member.task)
+        member.task.add_done_callback(self._tasks.discard)
+        self._members.append(member)
+        return member
+
+    async def _run_member(self, member: _Member) -> None:
+        """
+        Start a server and hold its transport open until it is stopped or
+        crashes, then replace it if the pool is below its warm size.
+
+        :param member: The server.
+        :type member: _Member
+        """
+        try:
+            await self._serve(member)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if not member.started.done():
+                member.started.set_exception(e)
+                self._failures += 1
+            logger.error("Pooled server failed: %s", e)
+        finally:
+            member.dead.set()
+            self._remove(member)
+
+        if not member.started.done():
+            member.started.set_exception(
+                ServerUnavailableError("Server exited before it started")
+            )
+        if self._needs_replacement():
+            # Back off while the server keeps failing to start.
+            delay = min(
+                2.0**self._failures - 1, self._config.max_restart_delay
+            )
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._closing.wait(), delay)
+            if self._needs_replacement():
+                self._spawn()
+
+    def _needs_replacement(self) -> bool:
+        """
+        Check whether the pool is below its warm size and not closing.
+
+        :return: Whether another server should be started.
+        :rtype: bool
+        """
+        return (
+            not self._closing.is_set()
+            and len(self._members) < self._config.size
+        )
+
+    async def _serve(self, member: _Member) -> None:
+        """
+        Open the transport and session of a server, and serve calls until it
+        is stopped or its process exits.
+
+        :param member: The server.
+        :type member: _Member
+        """
+        async with stdio_client(self._params) as (read_stream, write_stream):
+            relay_send, relay_receive = anyio.create_memory_object_stream[Any](
+                0
+            )
+            relay = asyncio.create_task(
+                self._relay(read_stream, relay_send, member)
+            )
+            try:
+                async with ClientSession(
+                    relay_receive, write_stream
+                ) as session:
+                    await asyncio.wait_for(
+                        self._until_dead(member, session.initialize()),
+                        self._config.start_timeout,
+                    )
+                    member.session = session
+                    member.last_used = asyncio.get_running_loop().time()
+                    member.started.set_result(None)
+                    self._failures = 0
+                    self._ready.append(member)
+                    self._available.set()
+
+                    stop = asyncio.ensure_future(member.stop.wait())
+                    dead = asyncio.ensure_future(member.dead.wait())
+                    await asyncio.wait(
+                        {stop, dead}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    stop.cancel()
+                    dead.cancel()
+                    # Closing the transport takes a while, so the server is
+                    # taken out of the pool first.
+                    self._remove(member)
+                    if member.dead.is_set() and not member.stop.is_set():
+                        logger.warning("Pooled server exited, replacing it")
+            finally:
+                relay.cancel()
+
+    @staticmethod
+    async def _relay(
+        read_stream: MemoryObjectReceiveStream[Any],
+        relay_send: MemoryObjectSendStream[Any],
+        member: _Member,
+    ) -> None:
+        """
+        Pass messages from the server to its session, and mark the server as
+        dead once its output ends.
+
+        :param read_stream: The messages from the server.
+        :type read_stream: MemoryObjectReceiveStream[Any]
+        :param relay_send: The stream the session reads from.
+        :type relay_send: MemoryObjectSendStream[Any]
+        :param member: The server.
+        :type member: _Member
+        """
+        try:
+            async with relay_send:
+                async for message in read_stream:
+                    await relay_send.send(message)
+        except anyio.ClosedResourceError:
+            pass
+        finally:
+            member.dead.set()
+
+    def _remove(self, member: _Member) -> None:
+        """
+        Take a server out of the pool.
+
+        :param member: The server.
+        :type member: _Member
+        """
+        if member in self._ready:
+            self._ready.remove(member)
+        if member in self._members:
+            self._members.remove(member)
+        if not self._ready:
+            self._available.clear()
+
+    async def _supervise(self) -> None:
+        """
+        Periodically check the health of idle servers and stop servers
+        beyond the warm size which have been idle for too long.
+        """
+        interval = min(
+            self._config.health_interval, self._config.idle_timeout / 2
+        )
+        while True:
+            await asyncio.sleep(interval)
+            now = asyncio.get_running_loop().time()
+            for member in list(self._ready):
+                if member.in_flight > 0:
+                    continue
+                if (
+                    len(self._ready) > self._config.size
+                    and now - member.last_used > self._config.idle_timeout
+                ):
+                    self._ready.remove(member)
+                    member.stop.set()
+                    continue
+                await self._check_health(member)
+
+    async def _check_health(self, member: _Member) -> None:
+        """
+        Ping an idle server, and stop it if it does not answer in time so it
+        is replaced.
+
+        :param member: The server.
+        :type member: _Member
+        """
+        try:
+            await asyncio.wait_for(
+                self._until_dead(member, member.client.send_ping()),
+                self._config.start_timeout,
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning("Pooled server failed health check: %s", e)
+            if member in self._ready:
+                self._ready.remove(member)
+            member.stop.set()
+
+
+def _retrieve_exception(future: "asyncio.Future[None]") -> None:
+    """
+    Retrieve the exception of a future, so a future which nothing awaits
+    does not log it as never retrieved.
+
+    :param future: The finished future.
+    :type future: asyncio.Future[None]
+    """
+    if not future.cancelled():
+        future.exception()
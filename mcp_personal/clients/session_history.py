@@ -0,0 +1,120 @@
+"""
+Module for the history of a session held in memory while a client stays
+connected. The history is read from the chat history once, when the session
+is opened, and new messages are added to memory straight away and written to
+the chat history in the background, so queries never wait on the database.
+"""
+
+import asyncio
+import logging
+
+from langchain_core.messages import BaseMessage
+from typing_extensions import Self
+
+from mcp_personal.clients.chat_history import ChatHistory
+
+logger = logging.getLogger(__name__)
+
+
+class SessionHistory:
+    """
+    History of a single session, held in memory. While it is open, the
+    session should not be written to by anything else, as the messages held
+    in memory would no longer match those stored.
+
+    :param chat_history: The chat history the messages are stored in.
+    :type chat_history: ChatHistory
+    :param session_id: The ID of the session.
+    :type session_id: str
+    :param messages: The messages of the session so far.
+    :type messages: list[BaseMessage]
+    """
+
+    def __init__(
+        self,
+        chat_history: ChatHistory,
+        session_id: str,
+        messages: list[BaseMessage],
+    ) -> None:
+        self.session_id = session_id
+        self._chat_history = chat_history
+        self._messages = messages
+        self._unsaved: list[BaseMessage] = []
+        self._flush_task: asyncio.Task[None] | None = None
+
+    @classmethod
+    async def load(cls, chat_history: ChatHistory, session_id: str) -> Self:
+        """
+        Open the history of a session, reading its messages in a worker
+        thread.
+
+        :param chat_history: The chat history the messages are stored in.
+        :type chat_history: ChatHistory
+        :param session_id: The ID of the session.
+        :type session_id: str
+        :return: The history of the session.
+        :rtype: Self
+        """
+        messages = await asyncio.to_thread(
+            chat_history.get_messages, session_id
+        )
+        return cls(chat_history, session_id, messages)
+
+    def get_messages(self) -> list[BaseMessage]:
+        """
+        Get the messages of the session.
+
+        :return: A copy of the messages.
+        :rtype: list[BaseMessage]
+        """
+        return list(self._messages)
+
+    def add_messages(self, messages: list[BaseMessage]) -> None:
+        """
+        Add messages to the session. They are stored in the background, in
+        the order they were added.
+
+        :param messages: The messages to add.
+        :type messages: list[BaseMessage]
+        """
+        self._messages += messages
+        self._unsaved += messages
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def close(self) -> None:
+        """
+        Wait for the messages added so far to be stored, then store any
+        messages left over by an earlier failure. If they still cannot be
+        stored, the error is raised.
+        """
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._unsaved:
+            batch, self._unsaved = self._unsaved, []
+            await asyncio.to_thread(
+                self._chat_history.add_messages,
+                session_id=self.session_id,
+                messages=batch,
+            )
+
+    async def _flush(self) -> None:
+        """
+        Store the messages which have not been stored yet, until there are
+        none left. If storing fails, the messages are kept and stored with
+        the next messages added.
+        """
+        while self._unsaved:
+            batch, self._unsaved = self._unsaved, []
+            try:
+                await asyncio.to_thread(
+                    self._chat_history.add_messages,
+                    session_id=self.session_id,
+                    messages=batch,
+                )
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception(
+                    "Failed to store messages of session %s", self.session_id
+                )
+                self._unsaved = batch + self._unsaved
+                return
@@ -0,0 +1,101 @@
+"""
+Module for the persisted snapshot of the tools each MCP server provides. The
+snapshot lets the client bind tools to the model at startup, before the
+servers have finished connecting.
+"""
+
+from hashlib import sha256
+import json
+from pathlib import Path
+from typing import Any
+
+from mcp_personal.clients.server_pool import PooledServer
+
+TOOL_CACHE_VERSION = 1
+
+
+def server_fingerprint(server_params: Any) -> str:
+    """
+    Compute a fingerprint of a server configuration, so that a snapshot is
+    not used after the configuration changes. Only the hash is stored, since
+    the configuration may contain secrets.
+
+    :param server_params: The configuration of the server.
+    :type server_params: Any
+    :return: The hex digest of the configuration.
+    :rtype: str
+    """
+    if isinstance(server_params, PooledServer):
+        # Every server in a pool provides the same tools, whatever its size.
+        server_params = server_params.params
+    if hasattr(server_params, "model_dump"):
+        data = server_params.model_dump(mode="json")
+    elif isinstance(server_params, str):
+        data = server_params
+    else:
+        data = f"{type(server_params).__name__}:{server_params.name}"
+    encoded = json.dumps(data, sort_keys=True, default=str).encode()
+    return sha256(encoded).hexdigest()
+
+
+class ToolCache:
+    """
+    Snapshot of the tools provided by each server, stored as JSON.
+
+    :param path: Path of the snapshot file.
+    :type path: Path
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def load(
+        self, fingerprints: dict[str, str]
+    ) -> dict[str, list[dict[str, Any]]] | None:
+        """
+        Load the tools for each server from the snapshot. The snapshot is
+        only used if it covers exactly the given servers with the same
+        configurations.
+
+        :param fingerprints: The fingerprint of each configured server.
+        :type fingerprints: dict[str, str]
+        :return: The tools for each server, or None if there is no usable
+            snapshot.
+        :rtype: dict[str, list[dict[str, Any]]] | None
+        """
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != TOOL_CACHE_VERSION:
+            return None
+        servers = data.get("servers", {})
+        if {
+            name: server["fingerprint"] for name, server in servers.items()
+        } != fingerprints:
+            return None
+        return {name: server["tools"] for name, server in servers.items()}
+
+    def save(
+        self,
+        fingerprints: dict[str, str],
+        tools: dict[str, list[dict[str, Any]]],
+    ) -> None:
+        """
+        Save the tools for each server to the snapshot.
+
+        :param fingerprints: The fingerprint of each configured server.
+        :type fingerprints: dict[str, str]
+        :param tools: The tools for each server.
+        :type tools: dict[str, list[dict[str, Any]]]
+        """
+        data = {
+            "version": TOOL_CACHE_VERSION,
+            "servers": {
+                name: {"fingerprint": fingerprints[name], "tools": tools[name]}
+                for name in fingerprints
+            },
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(data, indent=2), encoding="utf-8")
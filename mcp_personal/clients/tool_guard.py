@@ -0,0 +1,532 @@
+"""
+Module for guarding calls to the tools of MCP servers, so a slow or broken
+server cannot stall a query. Each call is bounded by the timeout configured
+for its tool or server. Each server has a circuit breaker which, after
+repeated failures, fails calls straight away for a while instead of waiting
+on a server which is down. Failures are returned to the model as error
+results, so it can answer without the tool.
+
+Calls to idempotent tools can also be hedged. If a call takes longer than
+most calls to the tool do, a second call is made and whichever answers first
+is used, which cuts the slowest calls short. Calls which time out count as
+taking the whole timeout, so the latency a call is hedged after rises while
+a tool is struggling, and the trial call of a half open breaker is not
+hedged.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import timedelta
+from enum import Enum
+import json
+import logging
+from typing import Any
+
+import httpx
+from mcp import McpError
+from mcp.types import CallToolResult, TextContent
+
+from mcp_personal.clients.tool_session import ToolSession, start_call
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 200
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    """
+    How calls to a tool are made.
+
+    :param timeout: Seconds to wait for a call, or None to wait for as long
+        as the query allows.
+    :type timeout: float | None
+    :param hedge: Whether slow calls are hedged with a second call. This must
+        only be set for idempotent tools, since the tool may run twice.
+    :type hedge: bool
+    """
+
+    timeout: float | None = 30.0
+    hedge: bool = False
+
+
+@dataclass(frozen=True)
+class GuardConfig:  # pylint: disable=too-many-instance-attributes
+    """
+    Configuration of the guards on tool calls.
+
+    :param default: The policy for tools with no policy of their own or of
+        their server.
+    :type default: CallPolicy
+    :param servers: Policies for the tools of each server, keyed by server
+        name.
+    :type servers: dict[str, CallPolicy]
+    :param tools: Policies for single tools, keyed by tool name, which take
+        precedence over the policies of their servers.
+    :type tools: dict[str, CallPolicy]
+    :param failure_threshold: Number of failed calls in a row after which a
+        server's circuit breaker opens.
+    :type failure_threshold: int
+    :param reset_timeout: Seconds a circuit breaker stays open before a trial
+        call is let through.
+    :type reset_timeout: float
+    :param hedge_quantile: The quantile of the latency of a tool after which
+        a call is hedged.
+    :type hedge_quantile: float
+    :param hedge_min_samples: Number of calls to a tool which must have been
+        timed before its calls are hedged.
+    :type hedge_min_samples: int
+    :param min_hedge_delay: Minimum seconds to wait before hedging a call.
+    :type min_hedge_delay: float
+    """
+
+    default: CallPolicy = CallPolicy()
+    servers: dict[str, CallPolicy] = field(default_factory=dict)
+    tools: dict[str, CallPolicy] = field(default_factory=dict)
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    min_hedge_delay: float = 0.05
+
+    def policy(self, server: str, tool: str) -> CallPolicy:
+        """
+        Get the policy for calls to a tool.
+
+        :param server: The name of the server which provides the tool.
+        :type server: str
+        :param tool: The name of the tool.
+        :type tool: str
+        :return: The policy of the tool, else that of its server, else the
+            default.
+        :rtype: CallPolicy
+        """
+        return self.tools.get(tool) or self.servers.get(server) or self.default
+
+
+class BreakerState(Enum):
+    """
+    State of a circuit breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a server. It opens after a number of failed calls in
+    a row, failing calls straight away. Once the reset timeout has passed, a
+    single trial call is let through, which closes the breaker if it
+    succeeds and opens it again if it fails. The trial call is limited to
+    the reset timeout, so the breaker cannot be left half open by a call
+    which never finishes.
+
+    :param failure_threshold: Number of failed calls in a row after which the
+        breaker opens.
+    :type failure_threshold: int
+    :param reset_timeout: Seconds the breaker stays open before a trial call.
+    :type reset_timeout: float
+    :param name: The name of the server, for logging.
+    :type name: str
+    """
+
+    def __init__(
+        self, failure_threshold: int, reset_timeout: float, name: str = ""
+    ) -> None:
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self.state = BreakerState.CLOSED
+
+    @property
+    def retry_after(self) -> float:
+        """
+        Property to get how long until a call will be let through.
+
+        :return: The number of seconds, which is zero if the breaker is
+            closed.
+        :rtype: float
+        """
+        if self.state is BreakerState.CLOSED:
+            return 0.0
+        remaining = self._opened_at + self._reset_timeout - self._now()
+        return max(remaining, 0.0)
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may be made, which lets the trial call through
+        if the breaker has been open for long enough.
+
+        :return: Whether the call may be made.
+        :rtype: bool
+        """
+        if self.state is BreakerState.CLOSED:
+            return True
+        if self.state is BreakerState.OPEN and self.retry_after == 0:
+            self.state = BreakerState.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """
+        Record a successful call, which closes the breaker.
+        """
+        self._failures = 0
+        self.state = BreakerState.CLOSED
+
+    def record_failure(self) -> None:
+        """
+        Record a failed call, which opens the breaker if it was the trial
+        call or there have been enough failures in a row.
+        """
+        self._failures += 1
+        if (
+            self.state is BreakerState.HALF_OPEN
+            or self._failures >= self._failure_threshold
+        ):
+            if self.state is not BreakerState.OPEN:
+                logger.warning("Circuit breaker for %s opened", self.name)
+            self.state = BreakerState.OPEN
+            self._opened_at = self._now()
+
+    @staticmethod
+    def _now() -> float:
+        """
+        Get the current time of the event loop.
+
+        :return: The time in seconds.
+        :rtype: float
+        """
+        return asyncio.get_running_loop().time()
+
+
+class ToolGuard:
+    """
+    Guard on the calls to the tools of one server, which holds the server's
+    circuit breaker and the latency of its recent calls.
+
+    :param server: The name of the server.
+    :type server: str
+    :param config: The configuration of the guards.
+    :type config: GuardConfig
+    """
+
+    def __init__(self, server: str, config: GuardConfig) -> None:
+        self.server = server
+        self._config = config
+        self.breaker = CircuitBreaker(
+            config.failure_threshold, config.reset_timeout, server
+        )
+        self._latencies: dict[str, deque[float]] = {}
+
+    async def call(
+        self,
+        session: ToolSession,
+        name: str,
+        arguments: dict[str, Any] | None,
+        timeout: float | None = None,
+    ) -> CallToolResult:
+        """
+        Call a tool within its timeout, unless the server's circuit breaker
+        is open. If the caller stops waiting, the call still finishes, so
+        the outcome is recorded.
+
+        :param session: The session of the server.
+        :type session: ToolSession
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param timeout: The most seconds to wait for the call, which only
+            applies if it is shorter than the timeout of the tool's policy.
+            The trial call of a half open breaker is also limited to the
+            reset timeout, and is not hedged.
+        :type timeout: float | None
+        :return: The result of the tool call, or an error result if the call
+            failed, timed out or was not made.
+        :rtype: CallToolResult
+        """
+        if not self.breaker.allow():
+            return self._failure(
+                "server_unavailable",
+                name,
+                "The server is failing, so the tool was not called",
+                retry_after=round(self.breaker.retry_after, 1),
+            )
+
+        policy = self._config.policy(self.server, name)
+        if timeout is None or (
+            policy.timeout is not None and policy.timeout < timeout
+        ):
+            timeout = policy.timeout
+        hedge = policy.hedge
+        if self.breaker.state is BreakerState.HALF_OPEN:
+            # Every other call waits on the outcome of the trial call.
+            if timeout is None or timeout > self._config.reset_timeout:
+                timeout = self._config.reset_timeout
+            hedge = False
+        attempt = asyncio.ensure_future(
+            self._attempt(session, name, arguments, timeout, hedge)
+        )
+        return await asyncio.shield(attempt)
+
+    def hedge_delay(self, name: str) -> float | None:
+        """
+        Get how long to wait for a call to a tool before hedging it.
+
+        :param name: The name of the tool.
+        :type name: str
+        :return: The delay in seconds, or None if too few calls to the tool
+            have been timed.
+        :rtype: float | None
+        """
+        latencies = sorted(self._latencies.get(name, ()))
+        if len(latencies) < self._config.hedge_min_samples:
+            return None
+        index = int(self._config.hedge_quantile * (len(latencies) - 1))
+        return max(latencies[index], self._config.min_hedge_delay)
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    async def _attempt(
+        self,
+        session: ToolSession,
+        name: str,
+        arguments: dict[str, Any] | None,
+        timeout: float | None,
+        hedge: bool,
+    ) -> CallToolResult:
+        """
+        Make a call, and record its outcome with the circuit breaker. A call
+        which the server answers with an error still counts as a success,
+        since the server is working, but one the session gave up waiting for
+        counts as a timeout.
+
+        :param session: The session of the server.
+        :type session: ToolSession
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param timeout: Seconds to wait for the call, or None to wait until
+            it finishes.
+        :type timeout: float | None
+        :param hedge: Whether to hedge the call.
+        :type hedge: bool
+        :return: The result of the tool call, or an error result.
+        :rtype: CallToolResult
+        """
+        try:
+            result = await asyncio.wait_for(
+                self._hedged(session, name, arguments, hedge, timeout),
+                timeout,
+            )
+        except TimeoutError:
+            self.breaker.record_failure()
+            if timeout is not None:
+                self._record_latency(name, timeout)
+            return self._failure(
+                "timeout",
+                name,
+                f"The tool did not answer within {timeout:g} seconds",
+            )
+        except McpError as e:
+            if e.error.code == httpx.codes.REQUEST_TIMEOUT:
+                # The session gave up waiting, so the server did not answer.
+                self.breaker.record_failure()
+                return self._failure("timeout", name, e.error.message)
+            self.breaker.record_success()
+            return self._failure("tool_error", name, e.error.message)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.breaker.record_failure()
+            logger.warning("Call to %s failed: %r", name, e)
+            return self._failure(
+                "server_error", name, f"The call failed: {e or type(e)}"
+            )
+        self.breaker.record_success()
+        return result
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    async def _hedged(
+        self,
+        session: ToolSession,
+        name: str,
+        arguments: dict[str, Any] | None,
+        hedge: bool,
+        timeout: float | None,
+    ) -> CallToolResult:
+        """
+        Make a call, and if hedging, make a second call when the first is
+        slower than the hedge delay. The first successful result is used, and
+        the other call is left to finish.
+
+        :param session: The session of the server.
+        :type session: ToolSession
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param hedge: Whether to hedge the call.
+        :type hedge: bool
+        :param timeout: Seconds the caller waits for the call, or None.
+        :type timeout: float | None
+        :return: The result of the tool call.
+        :rtype: CallToolResult
+        """
+        first = self._timed_call(session, name, arguments, timeout)
+        delay = self.hedge_delay(name) if hedge else None
+        if delay is None:
+            return await asyncio.shield(first)
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        logger.debug("Hedging call to %s after %.3fs", name, delay)
+        pending = {first, self._timed_call(session, name, arguments, timeout)}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for call in done:
+                if call.exception() is None:
+                    return call.result()
+        return first.result()
+
+    def _timed_call(
+        self,
+        session: ToolSession,
+        name: str,
+        arguments: dict[str, Any] | None,
+        timeout: float | None,
+    ) -> "asyncio.Future[CallToolResult]":
+        """
+        Start a call, recording how long it takes if it succeeds before the
+        caller stops waiting. A call which outlasts the timeout is recorded
+        when the caller times out instead.
+
+        :param session: The session of the server.
+        :type session: ToolSession
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param timeout: Seconds the caller waits for the call, or None.
+        :type timeout: float | None
+        :return: The running call.
+        :rtype: asyncio.Future[CallToolResult]
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        def _record(call: "asyncio.Future[CallToolResult]") -> None:
+            latency = loop.time() - start
+            if (
+                not call.cancelled()
+                and call.exception() is None
+                and (timeout is None or latency < timeout)
+            ):
+                self._record_latency(name, latency)
+
+        call = start_call(session, name, arguments)
+        call.add_done_callback(_record)
+        return call
+
+    def _record_latency(self, name: str, latency: float) -> None:
+        """
+        Record how long a call to a tool took.
+
+        :param name: The name of the tool.
+        :type name: str
+        :param latency: The time taken in seconds.
+        :type latency: float
+        """
+        latencies = self._latencies.setdefault(
+            name, deque(maxlen=LATENCY_WINDOW)
+        )
+        latencies.append(latency)
+
+    def _failure(
+        self,
+        error: str,
+        tool: str,
+        message: str,
+        retry_after: float | None = None,
+    ) -> CallToolResult:
+        """
+        Create the result of a call which failed or was not made, as a JSON
+        object the model can act on.
+
+        :param error: The kind of failure.
+        :type error: str
+        :param tool: The name of the tool.
+        :type tool: str
+        :param message: A description of the failure.
+        :type message: str
+        :param retry_after: Seconds until the server will be called again, if
+            the call was not made.
+        :type retry_after: float | None
+        :return: The tool result.
+        :rtype: CallToolResult
+        """
+        failure: dict[str, Any] = {
+            "error": error,
+            "server": self.server,
+            "tool": tool,
+            "message": message,
+        }
+        if retry_after is not None:
+            failure["retry_after"] = retry_after
+        text = json.dumps(failure)
+        return CallToolResult(
+            content=[TextContent(type="text", text=text)], isError=True
+        )
+
+
+class GuardedToolSession:  # pylint: disable=too-few-public-methods
+    """
+    Tool session whose calls are guarded by the guard of its server.
+
+    :param session: The session of the server.
+    :type session: ToolSession
+    :param guard: The guard of the server.
+    :type guard: ToolGuard
+    """
+
+    def __init__(self, session: ToolSession, guard: ToolGuard) -> None:
+        self._session = session
+        self._guard = guard
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Call a tool through the guard of the server.
+
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: The longest to wait for the result, if
+            shorter than the timeout of the tool's policy.
+        :type read_timeout_seconds: timedelta | None
+        :return: The result of the tool call, or an error result.
+        :rtype: CallToolResult
+        """
+        return await self._guard.call(
+            self._session,
+            name,
+            arguments,
+            (
+                read_timeout_seconds.total_seconds()
+                if read_timeout_seconds is not None
+                else None
+            ),
+        )
@@ -0,0 +1,281 @@
+"""
+Module for limiting how much tool output is sent to the model. Results larger
+than the inline limit are saved in full to a local blob store, and the model
+is given a preview along with a handle. The built-in ``read_tool_output`` tool
+lets the model page through the saved output when it needs more of it.
+"""
+
+from datetime import timedelta
+from hashlib import sha256
+import os
+from pathlib import Path
+import re
+from typing import Any
+
+from mcp.types import CallToolResult, TextContent
+
+READ_TOOL_NAME = "read_tool_output"
+HANDLE_PATTERN = re.compile(r"[0-9a-f]{16}")
+
+
+class BlobStore:
+    """
+    Store of tool outputs on the local filesystem. Outputs are addressed by a
+    hash of their content, so storing the same output twice keeps one copy.
+    Storing or reading an output marks it as recently used, so outputs which
+    are still being produced or paged through are not removed as old.
+
+    :param path: The directory the outputs are stored in.
+    :type path: Path
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+
+    def put(self, text: str) -> str:
+        """
+        Store an output.
+
+        :param text: The output to store.
+        :type text: str
+        :return: The handle of the stored output.
+        :rtype: str
+        """
+        data = text.encode("utf-8")
+        handle = sha256(data).hexdigest()[:16]
+        blob_path = self._path / handle
+        try:
+            os.utime(blob_path)
+            return handle
+        except FileNotFoundError:
+            pass
+        self._path.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, blob_path)
+        return handle
+
+    def get(self, handle: str) -> str:
+        """
+        Get a stored output, marking it as recently used.
+
+        :param handle: The handle of the output.
+        :type handle: str
+        :raises KeyError: If there is no output with the handle.
+        :return: The stored output.
+        :rtype: str
+        """
+        if not HANDLE_PATTERN.fullmatch(handle):
+            raise KeyError(handle)
+        blob_path = self._path / handle
+        try:
+            os.utime(blob_path)
+            return blob_path.read_text(encoding="utf-8")
+        except FileNotFoundError as e:
+            raise KeyError(handle) from e
+
+    def remove_older_than(self, cutoff: float, limit: int) -> int:
+        """
+        Remove outputs which were last stored or read before the cutoff,
+        along with any partly written outputs left behind by a crash.
+
+        :param cutoff: The Unix time outputs must have been used since.
+        :type cutoff: float
+        :param limit: The maximum number of outputs to remove.
+        :type limit: int
+        :return: The number of outputs removed.
+        :rtype: int
+        """
+        if not self._path.is_dir():
+            return 0
+        removed = 0
+        for path in self._path.iterdir():
+            if removed >= limit:
+                break
+            if not HANDLE_PATTERN.fullmatch(path.stem):
+                continue
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+        return removed
+
+
+class ToolOutputPolicy:
+    """
+    Policy for how much of each tool output is sent to the model inline.
+
+    :param store: The store for outputs which are too large to send inline.
+    :type store: BlobStore
+    :param max_inline_chars: The largest output, in characters, which is sent
+        inline in full.
+    :type max_inline_chars: int
+    :param preview_chars: The number of characters of a larger output which
+        are sent inline as a preview.
+    :type preview_chars: int
+    :param page_chars: The default number of characters returned by each call
+        to the ``read_tool_output`` tool.
+    :type page_chars: int
+    """
+
+    def __init__(
+        self,
+        store: BlobStore,
+        max_inline_chars: int = 4000,
+        preview_chars: int = 1000,
+        page_chars: int = 4000,
+    ) -> None:
+        self.store = store
+        self.max_inline_chars = max_inline_chars
+        self.preview_chars = preview_chars
+        self.page_chars = page_chars
+
+    @property
+    def tool(self) -> dict[str, Any]:
+        """
+        Property to get the definition of the ``read_tool_output`` tool.
+
+        :return: The tool definition.
+        :rtype: dict[str, Any]
+        """
+        return {
+            "name": READ_TOOL_NAME,
+            "description": (
+                "Read part of a tool output which was too large to return in "
+                "full. Pass the handle given with the truncated output and "
+                "the character offset to start reading from."
+            ),
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "handle": {"type": "string"},
+                    "offset": {"type": "integer", "minimum": 0, "default": 0},
+                    "length": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "default": self.page_chars,
+                    },
+                },
+                "required": ["handle"],
+            },
+        }
+
+    def apply(self, text: str) -> tuple[str, str | None]:
+        """
+        Apply the policy to a tool output. An output larger than the inline
+        limit is stored and replaced with a preview.
+
+        :param text: The tool output.
+        :type text: str
+        :return: The text to send to the model, and the handle of the stored
+            output if it was stored.
+        :rtype: tuple[str, str | None]
+        """
+        if len(text) <= self.max_inline_chars:
+            return text, None
+
+        handle = self.store.put(text)
+        preview = (
+            f"{text[:self.preview_chars]}\n\n[Output truncated: showing "
+            f"{self.preview_chars} of {len(text)} characters. Call "
+            f'{READ_TOOL_NAME} with handle "{handle}" and offset '
+            f"{self.preview_chars} to read more.]"
+        )
+        return preview, handle
+
+    def read(
+        self, handle: str, offset: int = 0, length: int | None = None
+    ) -> str:
+        """
+        Read a page of a stored output. A ``KeyError`` is raised by the store
+        if there is no output with the handle.
+
+        :param handle: The handle of the output.
+        :type handle: str
+        :param offset: The character offset to start reading from.
+        :type offset: int
+        :param length: The number of characters to read, capped at the
+            inline limit. Defaults to the page size.
+        :type length: int | None
+        :return: The page, followed by where to read from next if the output
+            continues.
+        :rtype: str
+        """
+        text = self.store.get(handle)
+        length = min(length or self.page_chars, self.max_inline_chars)
+        offset = max(0, offset)
+        end = min(offset + length, len(text))
+        page = text[offset:end]
+        if end < len(text):
+            page += (
+                f"\n\n[Showing characters {offset} to {end} of {len(text)}. "
+                f"Call {READ_TOOL_NAME} with offset {end} to read more.]"
+            )
+        return page
+
+
+class ToolOutputSession:  # pylint: disable=too-few-public-methods
+    """
+    Tool session for the built-in ``read_tool_output`` tool, which pages
+    through outputs stored by the policy.
+
+    :param policy: The policy whose stored outputs are read.
+    :type policy: ToolOutputPolicy
+    """
+
+    def __init__(self, policy: ToolOutputPolicy) -> None:
+        self._policy = policy
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Read a page of a stored tool output.
+
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The handle, offset and length of the page.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: How long to wait for the result, which
+            has no effect on the local store.
+        :type read_timeout_seconds: timedelta | None
+        :return: The page, or an error if the arguments are invalid.
+        :rtype: CallToolResult
+        """
+        _ = read_timeout_seconds
+        arguments = arguments or {}
+        if name != READ_TOOL_NAME:
+            return _error(f"Unknown tool: {name}")
+        try:
+            text = self._policy.read(
+                handle=str(arguments["handle"]),
+                offset=int(arguments.get("offset", 0)),
+                length=(
+                    int(arguments["length"]) if "length" in arguments else None
+                ),
+            )
+        except KeyError:
+            return _error("No stored output with that handle")
+        except (TypeError, ValueError):
+            return _error("Offset and length must be integers")
+        return CallToolResult(content=[TextContent(type="text", text=text)])
+
+
+def _error(message: str) -> CallToolResult:
+    """
+    Create the result of a failed tool call.
+
+    :param message: The error message.
+    :type message: str
+    :return: The tool result.
+    :rtype: CallToolResult
+    """
+    return CallToolResult(
+        content=[TextContent(type="text", text=message)], isError=True
+    )
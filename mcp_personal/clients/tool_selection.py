@@ -0,0 +1,162 @@
+"""
+Module for choosing which tools to offer the model for each query. Binding
+every tool of every server to each request makes the tool definitions a
+large part of the input, even for queries which need no tools. Instead, the
+tools are indexed by their names, descriptions and parameters, and only the
+tools most relevant to the query are bound, ranked with BM25.
+"""
+
+from collections import Counter
+import math
+import re
+from typing import Any, Collection, Sequence
+
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from get has have how i in is "
+    "it its me my of on or that the this to was what when where which who "
+    "will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lower case terms. Identifiers are split on case changes
+    and underscores, so ``searchPages`` and ``search_pages`` both give
+    ``search`` and ``page``, and plurals are reduced to the singular.
+
+    :param text: The text to split.
+    :type text: str
+    :return: The terms of the text.
+    :rtype: list[str]
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        term = word.lower()
+        if term in STOP_WORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+class ToolSelector:  # pylint: disable=too-many-instance-attributes
+    """
+    Index of tools, which selects the tools most relevant to a query.
+
+    :param max_tools: The maximum number of tools selected for a query, not
+        counting the pinned tools. If there are no more tools than this,
+        every tool is selected.
+    :type max_tools: int
+    :param k1: The BM25 term frequency saturation.
+    :type k1: float
+    :param b: The BM25 document length normalisation.
+    :type b: float
+    """
+
+    def __init__(
+        self, max_tools: int = 8, k1: float = 1.5, b: float = 0.75
+    ) -> None:
+        self.max_tools = max_tools
+        self._k1 = k1
+        self._b = b
+        self._names: list[str] = []
+        self._pinned: list[str] = []
+        self._documents: list[Counter[str]] = []
+        self._idf: dict[str, float] = {}
+        self._average_length = 0.0
+
+    def index(
+        self, tools: list[dict[str, Any]], pinned: Collection[str] = ()
+    ) -> None:
+        """
+        Index the tools, replacing any tools indexed before. The name of each
+        tool counts twice, since it is the most telling part.
+
+        :param tools: The tools, with their names, descriptions and input
+            schemas.
+        :type tools: list[dict[str, Any]]
+        :param pinned: Names of tools which are selected for every query.
+        :type pinned: Collection[str]
+        """
+        self._names = [tool["name"] for tool in tools]
+        self._pinned = [name for name in self._names if name in pinned]
+        self._documents = []
+        for tool in tools:
+            parameters = (tool.get("input_schema") or {}).get("properties", {})
+            terms = tokenize(tool["name"]) * 2
+            terms += tokenize(tool.get("description") or "")
+            terms += tokenize(" ".join(parameters))
+            self._documents.append(Counter(terms))
+
+        count = len(self._documents)
+        frequencies: Counter[str] = Counter()
+        for document in self._documents:
+            frequencies.update(document.keys())
+        self._idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in frequencies.items()
+        }
+        self._average_length = (
+            sum(document.total() for document in self._documents) / count
+            if count
+            else 0.0
+        )
+
+    def scores(self, query: str) -> dict[str, float]:
+        """
+        Score the relevance of each tool to a query.
+
+        :param query: The query.
+        :type query: str
+        :return: The BM25 score of each tool, keyed by name.
+        :rtype: dict[str, float]
+        """
+        terms = [term for term in tokenize(query) if term in self._idf]
+        scores = {}
+        for name, document in zip(self._names, self._documents):
+            length = document.total() / (self._average_length or 1.0)
+            norm = self._k1 * (1 - self._b + self._b * length)
+            scores[name] = sum(
+                self._idf[term]
+                * document[term]
+                * (self._k1 + 1)
+                / (document[term] + norm)
+                for term in terms
+                if term in document
+            )
+        return scores
+
+    def select(self, query: str, recent: Sequence[str] = ()) -> list[str]:
+        """
+        Select the tools to offer the model for a query. Tools the
+        conversation called recently are kept for follow up questions, using
+        up to half of the places, and the rest go to the tools which best
+        match the query. Tools which do not match the query at all are left
+        out, so a query which needs no tools gets only the pinned tools.
+
+        :param query: The query.
+        :type query: str
+        :param recent: Names of the tools the conversation called, most
+            recent first.
+        :type recent: Sequence[str]
+        :return: The names of the selected tools, in the order they were
+            indexed, so the same selection always gives the same list.
+        :rtype: list[str]
+        """
+        if len(self._names) - len(self._pinned) <= self.max_tools:
+            return list(self._names)
+
+        candidates = [n for n in self._names if n not in self._pinned]
+        chosen = list(dict.fromkeys(n for n in recent if n in candidates))
+        chosen = chosen[: max(1, self.max_tools // 2)]
+        scores = self.scores(query)
+        for name in sorted(candidates, key=lambda n: -scores[n]):
+            if len(chosen) >= self.max_tools or scores[name] <= 0:
+                break
+            if name not in chosen:
+                chosen.append(name)
+
+        selected = set(chosen) | set(self._pinned)
+        return [name for name in self._names if name in selected]
@@ -0,0 +1,124 @@
+"""
+Module for the interface the MCP client uses to call tools. A live MCP
+``ClientSession`` satisfies it, as do the wrappers which add behaviour around
+tool calls.
+"""
+
+import asyncio
+from datetime import timedelta
+from typing import Any, Protocol
+
+from mcp.types import CallToolResult
+
+MAX_CALL_TIME = timedelta(minutes=5)
+
+
+class ToolSession(Protocol):  # pylint: disable=too-few-public-methods
+    """
+    Protocol for sessions that can call tools by name.
+    """
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Call a tool with the given arguments.
+
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: How long to wait for the result.
+        :type read_timeout_seconds: timedelta | None
+        :return: The result of the tool call.
+        :rtype: CallToolResult
+        """
+
+
+class DeferredToolSession:  # pylint: disable=too-few-public-methods
+    """
+    Tool session for a server which may still be connecting. Calls wait for
+    the connection to be made and are then passed to the connected session.
+
+    :param session: Future which resolves to the connected session.
+    :type session: asyncio.Future[ToolSession]
+    """
+
+    def __init__(self, session: "asyncio.Future[ToolSession]") -> None:
+        self._session = session
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Wait for the server to connect, then call a tool with the given
+        arguments.
+
+        :param name: The name of the tool to call.
+        :type name: str
+        :param arguments: The arguments to pass to the tool.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: How long to wait for the result.
+        :type read_timeout_seconds: timedelta | None
+        :return: The result of the tool call.
+        :rtype: CallToolResult
+        """
+        session = await asyncio.shield(self._session)
+        return await session.call_tool(
+            name=name,
+            arguments=arguments,
+            read_timeout_seconds=read_timeout_seconds,
+        )
+
+
+def start_call(
+    session: ToolSession,
+    name: str,
+    arguments: dict[str, Any] | None,
+    timeout: timedelta = MAX_CALL_TIME,
+) -> "asyncio.Future[CallToolResult]":
+    """
+    Start a tool call in the background. Cancelling a request just as its
+    response arrives kills the session's receive loop in MCP 1.9, so a
+    caller which gives up on the call should stop waiting for it, for
+    example with ``asyncio.shield``, rather than cancel it. The call is then
+    left to finish, but the session itself gives up on it after the timeout,
+    so a hung server cannot hold calls open for the life of the process.
+
+    :param session: The session to call the tool with.
+    :type session: ToolSession
+    :param name: The name of the tool to call.
+    :type name: str
+    :param arguments: The arguments to pass to the tool.
+    :type arguments: dict[str, Any] | None
+    :param timeout: The longest the call may take, however long the caller
+        waits for it.
+    :type timeout: timedelta
+    :return: The running call.
+    :rtype: asyncio.Future[CallToolResult]
+    """
+    call = asyncio.ensure_future(
+        session.call_tool(
+            name=name, arguments=arguments, read_timeout_seconds=timeout
+        )
+    )
+    call.add_done_callback(_retrieve_exception)
+    return call
+
+
+def _retrieve_exception(task: "asyncio.Future[Any]") -> None:
+    """
+    Retrieve the exception of a task, so a task which nothing awaits any more
+    does not log it as never retrieved.
+
+    :param task: The finished task.
+    :type task: asyncio.Future[Any]
+    """
+    if not task.cancelled():
+        task.exception()
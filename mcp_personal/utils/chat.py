@@ -1,25 +1,55 @@
 """
-Module to interact with the MCP Personal API for chat functionality.
+Module to interact with the MCP Personal API for chat functionality. If the
+``websocket`` extra is installed, the chat is held over a persistent session,
+otherwise each query is a separate request.
 """
 
+import asyncio
+from typing import Any, AsyncIterator, Callable
 from uuid import uuid4
-import json
 
-import requests
+import httpx
 
+from mcp_personal.api_client.client import (
+    APIError,
+    AsyncAPIClient,
+    sessions_available,
+)
 
-def main() -> None:
+
+async def _chat() -> None:
     """
-    Main function to start the request loop for interacting with the MCP
-    Personal API. This function prompts the user for input, sends the query to
-    the API, and processes the response to display messages from the AI or
-    tools called by the AI.
+    Run the request loop over a persistent session if possible, otherwise
+    over separate requests.
     """
-    url = "http://localhost:12345/invoke"
-    session_id = uuid4().hex
     print("Starting request loop. Enter q or press Ctrl + C to stop.")
+    async with AsyncAPIClient(max_connections=1) as client:
+        if not sessions_available():
+            session_id = uuid4().hex
+            await _request_loop(lambda query: client.stream(query, session_id))
+            return
+
+        try:
+            async with client.session() as session:
+                await _request_loop(session.stream)
+        except ConnectionError as e:
+            print(f"Error connecting to API: {e}")
+
+
+async def _request_loop(
+    stream: Callable[[str], AsyncIterator[dict[str, Any]]],
+) -> None:
+    """
+    Run the request loop. This prompts the user for input, streams the
+    response from the API, and displays messages from the AI or tools called
+    by the AI as they arrive.
+
+    :param stream: Callable which sends a query and yields each message of
+        the response.
+    :type stream: Callable[[str], AsyncIterator[dict[str, Any]]]
+    """
     while True:
-        query = input("User: ").strip()
+        query = (await asyncio.to_thread(input, "User: ")).strip()
         if query.lower() == "q":
             print("Exiting request loop.")
             break
@@ -29,36 +59,30 @@ def main() -> None:
             continue
 
         try:
-            response = requests.post(
-                url,
-                timeout=60,
-                json={"query": query, "session_id": session_id},
-            )
-        except requests.exceptions.RequestException as e:
+            async for message in stream(query):
+                if message["role"] == "ai" and message["content"]:
+                    print(f"AI: {message['content']}")
+                elif message["role"] == "tool":
+                    print(f"Tool called: {message['name']}")
+                    print(f"Tool arguments: {message['args']}")
+                    print(f"Tool result: {message['result']}")
+        except APIError as e:
+            print(f"API returned status code: {e.status_code}")
+            print(f"Response: {e.body}")
+            return
+        except httpx.HTTPError as e:
             print(f"Error connecting to API: {e}")
             return
 
-        if response.status_code == 200:
-            resp_dict = json.loads(response.text)
 
-            for message in resp_dict.get("messages", []):
-                kwargs = message["kwargs"]
-
-                if kwargs["type"] == "ai":
-                    if isinstance(kwargs["content"], list):
-                        print(f"AI: {kwargs['content'][0]['text']}")
-                    else:
-                        print(f"AI: {kwargs['content']}")
-                elif kwargs["type"] == "tool":
-                    print(f"Tool called: {kwargs['name']}")
-                    print(
-                        f"Tool arguments: {kwargs['artifact']['call']['args']}"
-                    )
-                    print(f"Tool result: {kwargs['artifact']['result']}")
-        else:
-            print(f"API returned status code: {response.status_code}")
-            print(f"Response: {response.text}")
-            return
+def main() -> None:
+    """
+    Main function to start the request loop for interacting with the MCP
+    Personal API. This function prompts the user for input, sends the query to
+    the API, and processes the response to display messages from the AI or
+    tools called by the AI.
+    """
+    asyncio.run(_chat())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+"""
+Module to migrate the chat history from the JSON storage format to the compact
+binary format. A compression dictionary is trained on the most recent
+messages, then the messages are copied across in batches, keeping their IDs.
+The ID of the last message copied is recorded with each batch, so the
+migration can be stopped and run again and carries on from there. The JSON
+table is left in place.
+
+Messages written to the binary table by the web API take the next free ID, so
+the migration refuses to carry on once there are any, as they could clash
+with the messages still to be copied. Finish the migration before switching
+the web API to the binary format.
+
+Example usage:
+    python -m mcp_personal.utils.migrate_history
+    python -m mcp_personal.utils.migrate_history --db-url sqlite:///chat.db \
+        --retrain
+"""
+
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+import json
+
+from langchain_core.messages import messages_from_dict
+from sqlalchemy import text
+
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.message_codec import (
+    MIN_TRAINING_SAMPLES,
+    save_dictionary,
+    train_dictionary,
+)
+
+MIGRATION_TABLE = "message_migration"
+
+
+@dataclass
+class MigrationReport:
+    """
+    Summary of a migration.
+
+    :param messages: The number of messages copied.
+    :type messages: int
+    :param dictionary_id: The ID of the dictionary the messages were
+        compressed with, or None if there is no dictionary.
+    :type dictionary_id: int | None
+    :param trained: Whether a new dictionary was trained.
+    :type trained: bool
+    """
+
+    messages: int
+    dictionary_id: int | None
+    trained: bool
+
+
+def migrate(
+    url: str,
+    batch_size: int = 500,
+    sample_size: int = 2000,
+    retrain: bool = False,
+) -> MigrationReport:
+    """
+    Copy the messages which have not been migrated yet from the JSON table to
+    the binary table. A ``RuntimeError`` is raised if the binary table has
+    messages which were not copied by the migration and there are messages
+    left to copy.
+
+    :param url: The database URL of the chat history.
+    :type url: str
+    :param batch_size: The number of messages copied in each transaction.
+    :type batch_size: int
+    :param sample_size: The number of recent messages the dictionary is
+        trained on.
+    :type sample_size: int
+    :param retrain: Whether to train a new dictionary even if there is one.
+    :type retrain: bool
+    :return: A summary of the migration.
+    :rtype: MigrationReport
+    """
+    source = ChatHistory(url=url)
+    target = ChatHistory(url=url, storage="binary")
+    engine = target.engine
+    codec = target.codec
+    last_id = _migrated_id(source, target)
+
+    trained = False
+    if codec.dictionary_id is None or retrain:
+        with source.engine.connect() as connection:
+            sample = connection.execute(
+                text(
+                    f"SELECT message FROM {source.message_table} "
+                    "ORDER BY id DESC LIMIT :limit"
+                ),
+                {"limit": sample_size},
+            ).scalars()
+            messages = messages_from_dict([json.loads(row) for row in sample])
+        if len(messages) >= MIN_TRAINING_SAMPLES:
+            dictionary = train_dictionary(messages)
+            save_dictionary(engine, dictionary)
+            codec.add_dictionary(dictionary)
+            trained = True
+
+    copied = 0
+    while True:
+        with source.engine.connect() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT id, session_id, message "
+                    f"FROM {source.message_table} WHERE id > :last_id "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            ).all()
+        if not rows:
+            break
+
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"INSERT INTO {target.message_table} "
+                    "(id, session_id, message) "
+                    "VALUES (:id, :session_id, :message)"
+                ),
+                [
+                    {
+                        "id": row_id,
+                        "session_id": session_id,
+                        "message": codec.encode(
+                            messages_from_dict([json.loads(message)])[0]
+                        ),
+                    }
+                    for row_id, session_id, message in rows
+                ],
+            )
+            last_id = rows[-1][0]
+            connection.execute(
+                text(
+                    f"UPDATE {MIGRATION_TABLE} SET last_id = :last_id "
+                    "WHERE target_table = :target_table"
+                ),
+                {"last_id": last_id, "target_table": target.message_table},
+            )
+        copied += len(rows)
+
+    return MigrationReport(
+        messages=copied, dictionary_id=codec.dictionary_id, trained=trained
+    )
+
+
+def _migrated_id(source: ChatHistory, target: ChatHistory) -> int:
+    """
+    Get the ID of the last message copied by earlier runs of the migration,
+    checking it is safe to carry on from there.
+
+    :param source: The chat history stored as JSON.
+    :type source: ChatHistory
+    :param target: The chat history stored in the binary format.
+    :type target: ChatHistory
+    :raises RuntimeError: If the binary table has messages which were not
+        copied by the migration and there are messages left to copy.
+    :return: The ID of the last message copied, or 0 if there is none.
+    :rtype: int
+    """
+    with target.engine.begin() as connection:
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE} ("
+                "target_table TEXT PRIMARY KEY, last_id INTEGER NOT NULL)"
+            )
+        )
+        connection.execute(
+            text(
+                f"INSERT INTO {MIGRATION_TABLE} (target_table, last_id) "
+                "VALUES (:target_table, 0) ON CONFLICT (target_table) "
+                "DO NOTHING"
+            ),
+            {"target_table": target.message_table},
+        )
+        last_id: int = connection.execute(
+            text(
+                f"SELECT last_id FROM {MIGRATION_TABLE} "
+                "WHERE target_table = :target_table"
+            ),
+            {"target_table": target.message_table},
+        ).scalar_one()
+        written = connection.execute(
+            text(
+                f"SELECT COUNT(*) FROM {target.message_table} "
+                "WHERE id > :last_id"
+            ),
+            {"last_id": last_id},
+        ).scalar_one()
+    with source.engine.connect() as connection:
+        remaining = connection.execute(
+            text(
+                f"SELECT COUNT(*) FROM {source.message_table} "
+                "WHERE id > :last_id"
+            ),
+            {"last_id": last_id},
+        ).scalar_one()
+    if written and remaining:
+        raise RuntimeError(
+            f"{target.message_table} has {written} messages which were not "
+            f"migrated, and {remaining} messages are left to migrate. Their "
+            "IDs may clash, so the migration cannot carry on."
+        )
+    return last_id
+
+
+def main() -> None:
+    """
+    Main function to parse the command line arguments, run the migration and
+    report what it did.
+    """
+    parser = ArgumentParser(
+        description="Migrate the chat history to the binary storage format"
+    )
+    parser.add_argument(
+        "--db-url", type=str, default="sqlite:///chat_history.db"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--sample-size", type=int, default=2000)
+    parser.add_argument(
+        "--retrain",
+        action="store_true",
+        help="Train a new compression dictionary even if there is one",
+    )
+    args = parser.parse_args()
+
+    try:
+        report = migrate(
+            args.db_url,
+            batch_size=args.batch_size,
+            sample_size=args.sample_size,
+            retrain=args.retrain,
+        )
+    except RuntimeError as e:
+        parser.error(str(e))
+    print(json.dumps(asdict(report), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,29 +2,38 @@
 Test script to send a request to the API and print the response.
 """
 
+import asyncio
+import json
 from uuid import uuid4
-import requests
+
+import httpx
+
+from mcp_personal.api_client.client import APIError, AsyncAPIClient
+
+
+async def _request() -> None:
+    """
+    Send a request to the API and print the response.
+    """
+    async with AsyncAPIClient() as client:
+        try:
+            response = await client.invoke(
+                "What is 3 time 6 divided by 234234", uuid4().hex
+            )
+            print("Response from API:")
+            print(json.dumps(response, indent=2))
+        except APIError as e:
+            print(f"API returned status code: {e.status_code}")
+            print(f"Response: {e.body}")
+        except httpx.HTTPError as e:
+            print(f"Error connecting to API: {e}")
 
 
 def main() -> None:
     """
     Main function to send a request to the API and print the response.
     """
-    url = "http://localhost:12345/invoke"
-    data = {
-        "query": "What is 3 time 6 divided by 234234",
-        "session_id": uuid4().hex,
-    }
-    try:
-        response = requests.post(url, timeout=60, json=data)
-        if response.status_code == 200:
-            print("Response from API:")
-            print(response.text)
-        else:
-            print(f"API returned status code: {response.status_code}")
-            print(f"Response: {response.text}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to API: {e}")
+    asyncio.run(_request())
 
 
 if __name__ == "__main__":
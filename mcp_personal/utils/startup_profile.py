@@ -0,0 +1,113 @@
+"""
+Module to report where the import time of a service goes. The service module
+is imported in a fresh interpreter with ``-X importtime``, so the report
+reflects a cold start.
+"""
+
+from dataclasses import dataclass
+import subprocess
+import sys
+
+# Modules which are imported on first use rather than at startup.
+DEFERRED_MODULES = [
+    "langchain_anthropic",
+    "anthropic",
+    "langchain_community",
+    "sqlalchemy",
+]
+
+
+@dataclass
+class ImportTiming:
+    """
+    The time taken to import a module.
+
+    :param module: The name of the module.
+    :type module: str
+    :param self_us: Time spent importing the module itself in microseconds.
+    :type self_us: int
+    :param cumulative_us: Time spent importing the module and the modules it
+        imports in microseconds.
+    :type cumulative_us: int
+    :param depth: How deeply nested the import is.
+    :type depth: int
+    """
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure_imports(module: str) -> list[ImportTiming]:
+    """
+    Import a module in a fresh interpreter and collect the time taken by each
+    import.
+
+    :param module: The name of the module to import.
+    :type module: str
+    :return: The timings of every module imported.
+    :rtype: list[ImportTiming]
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split(
+            "|"
+        )
+        timings.append(
+            ImportTiming(
+                module=name.strip(),
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(name) - len(name.lstrip())) // 2,
+            )
+        )
+    return timings
+
+
+def startup_report(module: str, top: int = 20) -> str:
+    """
+    Build a report of the total import time of a module, the slowest top
+    level imports, and any deferred modules that are imported eagerly.
+
+    :param module: The name of the module to import.
+    :type module: str
+    :param top: The number of slowest imports to list.
+    :type top: int
+    :return: The report.
+    :rtype: str
+    """
+    timings = measure_imports(module)
+    total = next(t for t in timings if t.module == module)
+    imported = {t.module.split(".")[0] for t in timings}
+    eager = [name for name in DEFERRED_MODULES if name in imported]
+
+    lines = [
+        f"Import time for {module}: {total.cumulative_us / 1000:.1f} ms",
+        "",
+        f"{'cumulative ms':>14}{'self ms':>10}  module",
+    ]
+    slowest = sorted(
+        (t for t in timings if t.depth <= 1 and t.module != module),
+        key=lambda t: t.cumulative_us,
+        reverse=True,
+    )
+    for timing in slowest[:top]:
+        lines.append(
+            f"{timing.cumulative_us / 1000:>14.1f}"
+            f"{timing.self_us / 1000:>10.1f}  {timing.module}"
+        )
+    lines.append("")
+    if eager:
+        lines.append(f"Deferred modules imported eagerly: {', '.join(eager)}")
+    else:
+        lines.append("All deferred modules are kept off the import path.")
+    return "\n".join(lines)
@@ -8,7 +8,7 @@ service.
 
 from abc import ABC, abstractmethod
 from types import TracebackType
-from typing import Union, Callable, Any
+from typing import Union, Callable, Any, Awaitable
 from typing_extensions import Self
 
 from mcp_personal.web_api.app import WebApp, WebAppConfig
@@ -32,6 +32,7 @@ class BaseWebAPI(ABC):
                 port=port,
                 threads=4,
                 connection_limit=100,
+                compression_min_size=1024,
             )
         )
 
@@ -74,10 +75,17 @@ class BaseWebAPI(ABC):
         :type exc_tb: Union[TracebackType, None]
         """
 
-    async def run(self) -> None:
+    async def run(
+        self,
+        shutdown_trigger: Callable[..., Awaitable[Any]] | None = None,
+    ) -> None:
         """
         Run the web API. This method adds the endpoint handlers to the web app
         and starts the server.
+
+        :param shutdown_trigger: Awaitable callable which, when it completes,
+            gracefully shuts the server down.
+        :type shutdown_trigger: Callable[..., Awaitable[Any]] | None
         """
         for name, (
             methods,
@@ -91,4 +99,4 @@ class BaseWebAPI(ABC):
                 methods,
             )
 
-        await self._app.run()
+        await self._app.run(shutdown_trigger=shutdown_trigger)
@@ -7,11 +7,14 @@ API to enable communication.
 from dataclasses import dataclass
 from typing import Callable, Any, Awaitable
 
-from quart import Quart, request
+from quart import Quart, Response, request, websocket
+from quart.wrappers.response import DataBody
 from quart_cors import cors
 from hypercorn.asyncio import serve
 from hypercorn.config import Config as HypercornConfig
 
+from mcp_personal.web_api.encoding import available_encodings, compress
+
 
 @dataclass
 class WebAppConfig:
@@ -27,12 +30,17 @@ class WebAppConfig:
     :type threads: int
     :param connection_limit: Connection limit for the web app.
     :type connection_limit: int
+    :param compression_min_size: Minimum size in bytes of a response body for
+        it to be compressed, if the client accepts a supported encoding. If
+        None, responses are never compressed.
+    :type compression_min_size: int | None
     """
 
     host: str
     port: int
     threads: int
     connection_limit: int
+    compression_min_size: int | None = None
 
 
 class WebApp:
@@ -48,19 +56,59 @@ class WebApp:
     def __init__(self, config: WebAppConfig) -> None:
         self._app = cors(Quart(__name__))
         self._config = config
+        if config.compression_min_size is not None:
+            self._app.after_request(self._compress_response)
 
-    async def run(self) -> None:
+    async def run(
+        self,
+        shutdown_trigger: Callable[..., Awaitable[Any]] | None = None,
+    ) -> None:
         """
         Method to run the web app. This will start the web app and listen for
         incoming requests.
+
+        :param shutdown_trigger: Awaitable callable which, when it completes,
+            gracefully shuts the server down. If not given, the server runs
+            until it receives a termination signal.
+        :type shutdown_trigger: Callable[..., Awaitable[Any]] | None
         """
         config = HypercornConfig()
         config.bind = [f"{self._config.host}:{self._config.port}"]
         await serve(
             app=self._app,
             config=config,
+            shutdown_trigger=shutdown_trigger,
         )
 
+    async def _compress_response(self, response: Response) -> Response:
+        """
+        Compress the body of a response with the best encoding the client
+        accepts. Streamed, already encoded and small responses are left as
+        they are.
+
+        :param response: The response to compress.
+        :type response: Response
+        :return: The response, compressed if possible.
+        :rtype: Response
+        """
+        min_size = self._config.compression_min_size
+        if (
+            min_size is None
+            or not isinstance(response.response, DataBody)
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(available_encodings())
+        body = await response.get_data(as_text=False)
+        if encoding is None or len(body) < min_size:
+            return response
+
+        response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
     def add_endpoint(
         self,
         endpoint: str,
@@ -72,6 +120,8 @@ class WebApp:
         Method to add an endpoint to the web app. This must be done before
         starting the application and will set out the handler, methods,
         endpoint address and format (e.g. any variable parts of the endpoint).
+        An endpoint with the ``WEBSOCKET`` method accepts WebSocket
+        connections instead of HTTP requests.
 
         :param endpoint: Path of the endpoint.
         :type endpoint: str
@@ -82,6 +132,14 @@ class WebApp:
         :param methods: List of HTTP methods for the endpoint.
         :type methods: list[str]
         """
+        if methods == ["WEBSOCKET"]:
+            self._app.add_websocket(
+                endpoint,
+                endpoint_name,
+                self._wrap_handler(handler, methods),
+            )
+            return
+
         self._app.add_url_rule(
             endpoint,
             endpoint_name,
@@ -98,7 +156,8 @@ class WebApp:
         Wraps the handler function to accept the request data and arguments as
         parameters. This allows us to use special properties of requests, such
         as the query parameters and request body, and have different behaviour
-        for different endpoint methods.
+        for different endpoint methods. WebSocket handlers are given the
+        connection and the query parameters.
 
         :param handler: The handler function to wrap.
         :type handler: Callable[..., Awaitable[Any]]
@@ -125,6 +184,13 @@ class WebApp:
                     **kwargs,
                 )
 
+        elif method == "WEBSOCKET":
+
+            async def _handler(*args: Any, **kwargs: Any) -> Any:
+                return await handler(
+                    websocket, websocket.args.to_dict(), *args, **kwargs
+                )
+
         else:
             raise ValueError(f"Unsupported method: {method}")
 
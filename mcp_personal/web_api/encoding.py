@@ -0,0 +1,199 @@
+"""
+Module for encoding web API responses. This contains the compact message
+schema used by the ``/invoke`` endpoint, fast JSON encoding, and compression
+of response bodies for clients which accept it.
+"""
+
+import gzip
+from typing import Any
+
+import orjson
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from pydantic import BaseModel as PydanticModel
+
+try:
+    import brotli  # type: ignore[import-untyped]
+except ImportError:  # pragma: no cover - brotli is an optional dependency
+    brotli = None
+
+COMPRESSION_LEVELS = {"br": 4, "gzip": 5}
+
+
+def available_encodings() -> list[str]:
+    """
+    Get the content encodings that responses can be compressed with, in order
+    of preference.
+
+    :return: The names of the available encodings.
+    :rtype: list[str]
+    """
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a response body with the given content encoding.
+
+    :param body: The response body.
+    :type body: bytes
+    :param encoding: The content encoding, either ``br`` or ``gzip``.
+    :type encoding: str
+    :raises ValueError: If the encoding is not available.
+    :return: The compressed body.
+    :rtype: bytes
+    """
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVELS["gzip"])
+    if encoding == "br" and brotli is not None:
+        compressed: bytes = brotli.compress(
+            body, quality=COMPRESSION_LEVELS["br"]
+        )
+        return compressed
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def _default(obj: Any) -> Any:
+    """
+    Convert objects that orjson cannot serialise natively.
+
+    :param obj: The object to convert.
+    :type obj: Any
+    :return: A serialisable representation of the object.
+    :rtype: Any
+    """
+    if isinstance(obj, PydanticModel):
+        return obj.model_dump(mode="json", exclude_none=True)
+    return str(obj)
+
+
+def encode_json(obj: Any) -> bytes:
+    """
+    Encode an object as JSON.
+
+    :param obj: The object to encode.
+    :type obj: Any
+    :return: The encoded JSON.
+    :rtype: bytes
+    """
+    return orjson.dumps(obj, default=_default)
+
+
+def _text(content: Any) -> str:
+    """
+    Flatten message content into plain text. Content is either a string or a
+    list of content blocks, of which only the text is kept.
+
+    :param content: The message content.
+    :type content: Any
+    :return: The text of the content.
+    :rtype: str
+    """
+    if isinstance(content, str):
+        return content
+
+    parts = []
+    for block in content:
+        if isinstance(block, str):
+            parts.append(block)
+        elif isinstance(block, dict):
+            parts.append(block.get("text", ""))
+        else:
+            parts.append(getattr(block, "text", ""))
+    return "".join(parts)
+
+
+def compact_message(message: BaseMessage) -> dict[str, Any]:
+    """
+    Convert a message into the compact response schema. AI messages carry
+    their content, tool calls and token usage, and tool messages carry the
+    tool name, arguments and result.
+
+    :param message: The message to convert.
+    :type message: BaseMessage
+    :return: The compact representation of the message.
+    :rtype: dict[str, Any]
+    """
+    if isinstance(message, ToolMessage):
+        artifact = message.artifact or {}
+        # The message content holds the stringified MCP content blocks, so
+        # the plain text result recorded in the artifact is preferred.
+        result = artifact.get("result")
+        entry: dict[str, Any] = {
+            "role": "tool",
+            "name": message.name,
+            "tool_call_id": message.tool_call_id,
+            "args": artifact.get("call", {}).get("args", {}),
+            "result": (
+                result if isinstance(result, str) else _text(message.content)
+            ),
+        }
+        if message.status == "error":
+            entry["error"] = True
+        return entry
+
+    entry = {"role": message.type, "content": _text(message.content)}
+    if isinstance(message, AIMessage):
+        if message.tool_calls:
+            entry["tool_calls"] = [
+                {
+                    "id": tool_call["id"],
+                    "name": tool_call["name"],
+                    "args": tool_call["args"],
+                }
+                for tool_call in message.tool_calls
+            ]
+        if message.usage_metadata:
+            entry["usage"] = {
+                "input_tokens": message.usage_metadata["input_tokens"],
+                "output_tokens": message.usage_metadata["output_tokens"],
+            }
+    return entry
+
+
+def empty_usage() -> dict[str, int]:
+    """
+    Create a token usage total with no tokens counted.
+
+    :return: The token usage.
+    :rtype: dict[str, int]
+    """
+    return {"input_tokens": 0, "output_tokens": 0}
+
+
+def add_usage(usage: dict[str, int], entry: dict[str, Any]) -> None:
+    """
+    Add the token usage of a compact message to a running total.
+
+    :param usage: The running total, which is updated in place.
+    :type usage: dict[str, int]
+    :param entry: The compact message.
+    :type entry: dict[str, Any]
+    """
+    for key, value in entry.get("usage", {}).items():
+        usage[key] += value
+
+
+def compact_response(
+    messages: list[BaseMessage], session_id: str
+) -> dict[str, Any]:
+    """
+    Build the compact ``/invoke`` response for the messages of a turn, along
+    with the total token usage of the turn.
+
+    :param messages: The messages produced by the turn.
+    :type messages: list[BaseMessage]
+    :param session_id: The session ID of the conversation.
+    :type session_id: str
+    :return: The compact response.
+    :rtype: dict[str, Any]
+    """
+    entries = [compact_message(message) for message in messages]
+    usage = empty_usage()
+    for entry in entries:
+        add_usage(usage, entry)
+    return {
+        "format": "compact",
+        "session_id": session_id,
+        "messages": entries,
+        "usage": usage,
+    }
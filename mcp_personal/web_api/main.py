@@ -7,40 +7,105 @@ service.
 """
 
 import asyncio
-from typing import Callable, Any
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator, Callable, Any
 from types import TracebackType
 import json
+import logging
+from uuid import uuid4
 
 from typing_extensions import Self
 from quart import Response
+from quart.wrappers import Websocket
+import orjson
 
 from mcp_personal.web_api.api import BaseWebAPI
+from mcp_personal.clients.budget import InvokeBudget
+from mcp_personal.clients.cassette import Cassette
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.history_maintenance import (
+    HistoryMaintenance,
+    MaintenanceConfig,
+)
 from mcp_personal.clients.mcp import MCPClient
+from mcp_personal.clients.session_history import SessionHistory
+from mcp_personal.clients.tool_cache import ToolCache
+from mcp_personal.clients.tool_guard import GuardConfig
+from mcp_personal.clients.tool_output import BlobStore, ToolOutputPolicy
+from mcp_personal.clients.tool_selection import ToolSelector
+from mcp_personal.web_api.encoding import (
+    add_usage,
+    compact_message,
+    compact_response,
+    empty_usage,
+    encode_json,
+)
+
+RESPONSE_FORMATS = ["legacy", "compact"]
+TOOL_CACHE_PATH = "tool_cache.json"
+TOOL_OUTPUT_PATH = "tool_outputs"
+CHAT_ARCHIVE_PATH = "chat_archive"
+MAX_TIMEOUT = 120.0
+MAX_ITERATIONS = 10
+SESSION_OPEN = "Session is open over a WebSocket"
+
+logger = logging.getLogger(__name__)
 
 
 class AsyncWebAPI(BaseWebAPI):
     """
     Base Web API service, which contains the run method to start the web API
     and requires implementations to add endpoint handlers to the web app.
+
+    :param host: The host on which the web API will run.
+    :type host: str
+    :param port: The port on which the web API will run.
+    :type port: int
+    :param mcp_client: The MCP client used to answer queries, defaults to a
+        client connected to the configured servers.
+    :type mcp_client: MCPClient | None
+    :param maintenance: Maintenance of the chat history, run on a schedule
+        while the service is running.
+    :type maintenance: HistoryMaintenance | None
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 12345,
+        mcp_client: MCPClient | None = None,
+        maintenance: HistoryMaintenance | None = None,
+    ) -> None:
         super().__init__(
-            host="0.0.0.0",
-            port=12345,
+            host=host,
+            port=port,
         )
-        self._mcp_client = MCPClient()
+        self._mcp_client = mcp_client or MCPClient()
+        self._maintenance = maintenance
+        self._maintenance_task: asyncio.Task[None] | None = None
+        self._stopping = asyncio.Event()
+        # Sessions open over a WebSocket, with None while a session's history
+        # is being loaded.
+        self._live_sessions: dict[str, SessionHistory | None] = {}
 
     async def __aenter__(self) -> Self:
         """
         Asynchronous context manager entry method. This is used to start the
-        web API service when entering the context.
+        web API service when entering the context. The MCP client is warmed up
+        in a worker thread, so the server can start accepting requests while
+        it happens.
 
         :return: The instance of the AsyncWebAPI.
         :rtype: Self
         """
         super().__enter__()
         await self._mcp_client.__aenter__()
+        self._mcp_client.start_warm_up()
+        if self._maintenance is not None:
+            self._maintenance_task = asyncio.create_task(
+                self._maintenance.run(self._stopping)
+            )
         return self
 
     async def __aexit__(
@@ -60,6 +125,17 @@ class AsyncWebAPI(BaseWebAPI):
         :param traceback: The traceback of the exception raised, if any.
         :type traceback: TracebackType | None
         """
+        self._stopping.set()
+        await asyncio.gather(
+            *(
+                history.close()
+                for history in self._live_sessions.values()
+                if history is not None
+            ),
+            return_exceptions=True,
+        )
+        if self._maintenance_task is not None:
+            await self._maintenance_task
         await self._mcp_client.__aexit__(exc_type, exc_value, traceback)
         super().__exit__(exc_type, exc_value, traceback)
 
@@ -77,6 +153,8 @@ class AsyncWebAPI(BaseWebAPI):
         return {
             "homepage": (["GET"], "/", self._create_homepage),
             "invoke": (["POST"], "/invoke", self._invoke),
+            "invoke_stream": (["POST"], "/invoke/stream", self._invoke_stream),
+            "session": (["WEBSOCKET"], "/session", self._session),
         }
 
     async def _create_homepage(self, params: dict[str, Any]) -> Response:
@@ -99,7 +177,14 @@ class AsyncWebAPI(BaseWebAPI):
         """
         Handler for invoking the MCP client with a query. This is a POST
         request, which requires a query to be passed in the request data and
-        returns the response from the MCP client.
+        returns the response from the MCP client. The response format can be
+        chosen with the ``format`` field of the data or query parameter, as
+        either the LangChain serialisation of each message (``legacy``, the
+        default) or a flat schema (``compact``). The work done can be limited
+        with the ``timeout``, ``max_iterations`` and ``max_tokens`` fields,
+        and the response gives the ``stop_reason``. A session which is open
+        over a WebSocket is refused with status 409, since its history is
+        held by the socket.
 
         :param data: The request data.
         :type data: str
@@ -108,44 +193,467 @@ class AsyncWebAPI(BaseWebAPI):
         :return: The response.
         :rtype: Response
         """
-        _ = params
-        try:
-            data_dict = json.loads(data)
-        except json.JSONDecodeError:
-            return Response("Invalid JSON data", 400)
-
         try:
-            query = data_dict["query"]
-        except KeyError:
-            return Response("Query is required", 400)
+            data_dict, query, session_id = self._parse_query(data)
+            budget = self._parse_budget(data_dict)
+        except ValueError as e:
+            return Response(str(e), 400)
+        if session_id in self._live_sessions:
+            return Response(SESSION_OPEN, 409)
 
-        try:
-            session_id = data_dict["session_id"]
-        except KeyError:
-            return Response("Session ID is required", 400)
+        response_format = data_dict.get(
+            "format", params.get("format", "legacy")
+        )
+        if response_format not in RESPONSE_FORMATS:
+            return Response(f"Unknown format: {response_format}", 400)
 
         messages = await self._mcp_client.invoke(
-            query=query, session_id=session_id
+            query=query, session_id=session_id, budget=budget
         )
+        stop_reason = budget.stop_reason.value if budget.stop_reason else None
+        if response_format == "compact":
+            response = compact_response(messages, session_id)
+            response["stop_reason"] = stop_reason
+            return Response(
+                encode_json(response),
+                200,
+                content_type="application/json",
+            )
+
         response = {
             "messages": [message.to_json() for message in messages],
             "session_id": session_id,
+            "stop_reason": stop_reason,
         }
         return Response(json.dumps(response), 200)
 
+    async def _invoke_stream(
+        self, data: str, params: dict[str, Any]
+    ) -> Response:
+        """
+        Handler for invoking the MCP client with a query and streaming the
+        response. This is a POST request, which takes the same data as
+        ``/invoke`` and returns newline delimited JSON. Each line is either a
+        ``message`` event with a message in the compact schema, sent as soon
+        as it is produced, or the final ``done`` event with the token usage
+        and the reason processing stopped. If the client disconnects, the
+        query is cancelled. As for ``/invoke``, a session which is open over
+        a WebSocket is refused with status 409.
+
+        :param data: The request data.
+        :type data: str
+        :param params: The request parameters.
+        :type params: dict[str, Any]
+        :return: The streamed response.
+        :rtype: Response
+        """
+        _ = params
+        try:
+            data_dict, query, session_id = self._parse_query(data)
+            budget = self._parse_budget(data_dict)
+        except ValueError as e:
+            return Response(str(e), 400)
+        if session_id in self._live_sessions:
+            return Response(SESSION_OPEN, 409)
+
+        async def _events() -> AsyncIterator[bytes]:
+            usage = empty_usage()
+            async with aclosing(
+                self._message_events(query, session_id, budget, usage)
+            ) as events:
+                async for event in events:
+                    yield encode_json(event) + b"\n"
+            yield encode_json(
+                self._done_event(session_id, budget, usage)
+            ) + b"\n"
+
+        return Response(_events(), 200, content_type="application/x-ndjson")
+
+    async def _session(
+        self, connection: Websocket, params: dict[str, Any]
+    ) -> None:
+        """
+        Handler for a persistent chat session over a WebSocket. The session
+        is given by the ``session_id`` query parameter, or a new one is
+        started, and its history is held in memory until the connection
+        closes, with new messages stored in the background. The server first
+        sends a ``session`` event with the session ID. Each ``query`` event
+        sent by the client takes the same fields as ``/invoke``, apart from
+        the session ID, and is answered with the same events as
+        ``/invoke/stream``, one per WebSocket message. A ``cancel`` event
+        cancels the query being answered. Invalid events are answered with
+        an ``error`` event, and only one query can run at a time. A query
+        which fails is answered with an ``error`` event with a ``status`` of
+        500, followed by its ``done`` event.
+
+        :param connection: The WebSocket connection.
+        :type connection: Websocket
+        :param params: The request parameters.
+        :type params: dict[str, Any]
+        """
+        session_id = params.get("session_id") or uuid4().hex
+        await connection.accept()
+        if session_id in self._live_sessions:
+            await self._send_event(
+                connection, {"type": "error", "error": SESSION_OPEN}
+            )
+            await connection.close(1008)
+            return
+
+        # The session is taken before its history is loaded, so a second
+        # connection to it cannot get in while the first is loading.
+        self._live_sessions[session_id] = None
+        history = None
+        try:
+            history = await SessionHistory.load(
+                self._mcp_client.chat_history, session_id
+            )
+        finally:
+            if history is None:
+                del self._live_sessions[session_id]
+        self._live_sessions[session_id] = history
+        closed = asyncio.Event()
+        running: asyncio.Task[None] | None = None
+
+        try:
+            await self._send_event(
+                connection, {"type": "session", "session_id": session_id}
+            )
+            while True:
+                try:
+                    event = self._parse_event(await connection.receive())
+                    if event["type"] == "cancel":
+                        if running is not None:
+                            running.cancel()
+                        continue
+                    budget = self._parse_budget(event)
+                except ValueError as e:
+                    await self._send_event(
+                        connection, {"type": "error", "error": str(e)}
+                    )
+                    continue
+                if running is not None and not running.done():
+                    await self._send_event(
+                        connection,
+                        {
+                            "type": "error",
+                            "error": "A query is already running",
+                        },
+                    )
+                    continue
+                running = asyncio.create_task(
+                    self._answer(
+                        connection, event["query"], budget, history, closed
+                    )
+                )
+        finally:
+            closed.set()
+            if running is not None:
+                running.cancel()
+                await asyncio.gather(running, return_exceptions=True)
+            del self._live_sessions[session_id]
+            try:
+                await history.close()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to store session %s", session_id)
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    async def _answer(
+        self,
+        connection: Websocket,
+        query: str,
+        budget: InvokeBudget,
+        history: SessionHistory,
+        closed: asyncio.Event,
+    ) -> None:
+        """
+        Answer a query sent over a WebSocket, ending with a ``done`` event.
+        A query which fails is logged and answered with an ``error`` event
+        first.
+
+        :param connection: The WebSocket connection.
+        :type connection: Websocket
+        :param query: The query.
+        :type query: str
+        :param budget: The budget of the query.
+        :type budget: InvokeBudget
+        :param history: The history of the session held in memory.
+        :type history: SessionHistory
+        :param closed: Set once the connection has closed, after which no
+            more events are sent.
+        :type closed: asyncio.Event
+        :raises asyncio.CancelledError: If the query is cancelled.
+        """
+        session_id = history.session_id
+        usage = empty_usage()
+        try:
+            async with aclosing(
+                self._message_events(query, session_id, budget, usage, history)
+            ) as events:
+                async for event in events:
+                    await self._send_event(connection, event)
+        except asyncio.CancelledError:
+            if not closed.is_set():
+                await self._send_event(
+                    connection, self._done_event(session_id, budget, usage)
+                )
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Failed to answer query in %s", session_id)
+            await self._send_event(
+                connection,
+                {
+                    "type": "error",
+                    "error": "Failed to answer the query",
+                    "status": 500,
+                },
+            )
+        await self._send_event(
+            connection, self._done_event(session_id, budget, usage)
+        )
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    async def _message_events(
+        self,
+        query: str,
+        session_id: str,
+        budget: InvokeBudget,
+        usage: dict[str, int],
+        history: SessionHistory | None = None,
+    ) -> AsyncGenerator[dict[str, Any], None]:
+        """
+        Answer a query, yielding a ``message`` event for each message as soon
+        as it is produced and adding its token usage to the total.
 
-async def _start_async_api() -> None:
+        :param query: The query.
+        :type query: str
+        :param session_id: The session ID of the conversation.
+        :type session_id: str
+        :param budget: The budget of the query.
+        :type budget: InvokeBudget
+        :param usage: The total token usage, which is updated in place.
+        :type usage: dict[str, int]
+        :param history: The history of the session held in memory, if any.
+        :type history: SessionHistory | None
+        :yield: Each message event.
+        :ytype: dict[str, Any]
+        """
+        async with aclosing(
+            self._mcp_client.stream(
+                query=query,
+                session_id=session_id,
+                budget=budget,
+                history=history,
+            )
+        ) as messages:
+            async for message in messages:
+                entry = compact_message(message)
+                add_usage(usage, entry)
+                yield {"type": "message", "message": entry}
+
+    @staticmethod
+    def _done_event(
+        session_id: str, budget: InvokeBudget, usage: dict[str, int]
+    ) -> dict[str, Any]:
+        """
+        Build the event which ends the answer to a query.
+
+        :param session_id: The session ID of the conversation.
+        :type session_id: str
+        :param budget: The budget of the query.
+        :type budget: InvokeBudget
+        :param usage: The total token usage.
+        :type usage: dict[str, int]
+        :return: The event.
+        :rtype: dict[str, Any]
+        """
+        return {
+            "type": "done",
+            "session_id": session_id,
+            "usage": usage,
+            "stop_reason": (
+                budget.stop_reason.value if budget.stop_reason else None
+            ),
+        }
+
+    @staticmethod
+    async def _send_event(
+        connection: Websocket, event: dict[str, Any]
+    ) -> None:
+        """
+        Send an event over a WebSocket as a JSON text message.
+
+        :param connection: The WebSocket connection.
+        :type connection: Websocket
+        :param event: The event.
+        :type event: dict[str, Any]
+        """
+        await connection.send(encode_json(event).decode())
+
+    @staticmethod
+    def _parse_query(data: str) -> tuple[dict[str, Any], str, str]:
+        """
+        Parse the data of a query request.
+
+        :param data: The request data.
+        :type data: str
+        :raises ValueError: If the data is not valid JSON or is missing the
+            query or session ID.
+        :return: The parsed data, the query and the session ID.
+        :rtype: tuple[dict[str, Any], str, str]
+        """
+        try:
+            data_dict = orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise ValueError("Invalid JSON data") from e
+
+        try:
+            query = data_dict["query"]
+        except KeyError as e:
+            raise ValueError("Query is required") from e
+
+        try:
+            session_id = data_dict["session_id"]
+        except KeyError as e:
+            raise ValueError("Session ID is required") from e
+
+        return data_dict, query, session_id
+
+    @staticmethod
+    def _parse_event(data: str | bytes) -> dict[str, Any]:
+        """
+        Parse an event sent by the client of a WebSocket session.
+
+        :param data: The WebSocket message.
+        :type data: str | bytes
+        :raises ValueError: If the message is not a JSON object, is not a
+            known type of event, or is a query event without a query.
+        :return: The parsed event, with its type filled in if it was left out.
+        :rtype: dict[str, Any]
+        """
+        try:
+            event = orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise ValueError("Invalid JSON data") from e
+        if not isinstance(event, dict):
+            raise ValueError("Events must be JSON objects")
+
+        event.setdefault("type", "query")
+        if event["type"] not in ("query", "cancel"):
+            raise ValueError(f"Unknown event type: {event['type']}")
+        if event["type"] == "query" and "query" not in event:
+            raise ValueError("Query is required")
+        return event
+
+    @staticmethod
+    def _parse_budget(data_dict: dict[str, Any]) -> InvokeBudget:
+        """
+        Parse the limits on the work done to answer a query. The timeout and
+        number of tool call rounds are capped by the server's own limits,
+        which also apply when they are not given.
+
+        :param data_dict: The parsed request data.
+        :type data_dict: dict[str, Any]
+        :return: The budget for the query.
+        :rtype: InvokeBudget
+        """
+        timeout = _positive(data_dict, "timeout", (int, float))
+        max_iterations = _positive(data_dict, "max_iterations", int)
+        max_tokens = _positive(data_dict, "max_tokens", int)
+        return InvokeBudget(
+            timeout=min(timeout or MAX_TIMEOUT, MAX_TIMEOUT),
+            max_iterations=int(
+                min(max_iterations or MAX_ITERATIONS, MAX_ITERATIONS)
+            ),
+            max_tokens=int(max_tokens) if max_tokens is not None else None,
+        )
+
+
+def _positive(
+    data_dict: dict[str, Any],
+    key: str,
+    kind: type[int] | tuple[type[int], type[float]],
+) -> float | None:
+    """
+    Get an optional positive number from the request data.
+
+    :param data_dict: The parsed request data.
+    :type data_dict: dict[str, Any]
+    :param key: The key of the number.
+    :type key: str
+    :param kind: The accepted types of the number.
+    :type kind: type[int] | tuple[type[int], type[float]]
+    :raises ValueError: If the value is not a positive number of the accepted
+        types.
+    :return: The number, or None if it is not given.
+    :rtype: float | None
+    """
+    value = data_dict.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, kind) or value <= 0:
+        raise ValueError(f"{key} must be a positive number")
+    return float(value) if kind is not int else int(value)
+
+
+async def _start_async_api(
+    cassette: Cassette | None,
+    chat_history: ChatHistory | None,
+    session_ttl: float | None,
+) -> None:
     """
     Function to start the Async Web API service. This is used to create an
     instance of the AsyncWebAPI and run it.
+
+    :param cassette: A cassette to record traffic to or replay it from.
+    :type cassette: Cassette | None
+    :param chat_history: The chat history store.
+    :type chat_history: ChatHistory | None
+    :param session_ttl: Time in seconds a session can be idle before it is
+        archived and removed, or None to keep sessions forever.
+    :type session_ttl: float | None
     """
-    async with AsyncWebAPI() as app:
+    tool_outputs = BlobStore(Path(TOOL_OUTPUT_PATH))
+    mcp_client = MCPClient(
+        chat_history=chat_history,
+        cassette=cassette,
+        tool_cache=ToolCache(Path(TOOL_CACHE_PATH)),
+        tool_output=ToolOutputPolicy(tool_outputs),
+        tool_selector=ToolSelector(),
+        tool_guard=GuardConfig(),
+    )
+    maintenance = HistoryMaintenance(
+        mcp_client.chat_history,
+        MaintenanceConfig(
+            session_ttl=session_ttl,
+            archive_dir=Path(CHAT_ARCHIVE_PATH),
+            tool_outputs=tool_outputs,
+        ),
+    )
+    async with AsyncWebAPI(
+        mcp_client=mcp_client, maintenance=maintenance
+    ) as app:
         await app.run()
 
 
-def start_async_api() -> None:
+def start_async_api(
+    cassette: Cassette | None = None,
+    chat_history: ChatHistory | None = None,
+    session_ttl: float | None = None,
+) -> None:
     """
     Function to start the Async Web API service. This is used to create an
     instance of the AsyncWebAPI and run it.
+
+    :param cassette: A cassette to record model and tool traffic to, or to
+        replay it from.
+    :type cassette: Cassette | None
+    :param chat_history: The chat history store, defaults to the SQLite store
+        in the working directory.
+    :type chat_history: ChatHistory | None
+    :param session_ttl: Time in seconds a session can be idle before it is
+        archived to ``chat_archive/`` and removed, or None to keep sessions
+        forever.
+    :type session_ttl: float | None
     """
-    asyncio.run(_start_async_api())
+    asyncio.run(_start_async_api(cassette, chat_history, session_ttl))
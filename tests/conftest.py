@@ -0,0 +1,46 @@
+"""
+Shared fixtures for the tests.
+"""
+
+from pathlib import Path
+import sys
+
+import pytest
+from mcp.client.stdio import StdioServerParameters, get_default_environment
+
+from mcp_personal.clients.chat_history import ChatHistory
+
+
+@pytest.fixture
+def chat_history(tmp_path: Path) -> ChatHistory:
+    """
+    Chat history stored in a temporary SQLite database.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :return: The chat history.
+    :rtype: ChatHistory
+    """
+    return ChatHistory(url=f"sqlite:///{tmp_path / 'history.db'}")
+
+
+@pytest.fixture
+def stdio_params(tmp_path: Path) -> StdioServerParameters:
+    """
+    Parameters to start the stdio test server, recording its starts in the
+    temporary directory.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :return: The server parameters.
+    :rtype: StdioServerParameters
+    """
+    return StdioServerParameters(
+        command=sys.executable,
+        args=[str(Path(__file__).with_name("stdio_server.py"))],
+        env={
+            **get_default_environment(),
+            "STARTS_FILE": str(tmp_path / "starts"),
+            "BROKEN_FILE": str(tmp_path / "broken"),
+        },
+    )
@@ -0,0 +1,53 @@
+"""
+Stdio MCP server run as a subprocess by the server pool tests. Each start is
+appended to the file named by ``STARTS_FILE``, and the server exits straight
+away while the file named by ``BROKEN_FILE`` exists, so tests can make it fail
+to start.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+import sys
+import time
+
+
+def main() -> None:
+    """
+    Record the start, then serve the tools over stdio unless broken.
+    """
+    with Path(os.environ["STARTS_FILE"]).open("a", encoding="utf-8") as file:
+        file.write(f"{time.time()}\n")
+    if Path(os.environ["BROKEN_FILE"]).exists():
+        sys.exit(1)
+
+    # pylint: disable-next=import-outside-toplevel
+    from mcp.server.fastmcp import FastMCP
+
+    mcp = FastMCP(name="Pooled", log_level="WARNING")
+
+    @mcp.tool()
+    async def pid(delay: float = 0) -> int:
+        """
+        Get the process ID of the server after a delay.
+
+        :param delay: Time in seconds to wait first.
+        :type delay: float
+        :return: The process ID.
+        :rtype: int
+        """
+        await asyncio.sleep(delay)
+        return os.getpid()
+
+    @mcp.tool()
+    def crash() -> None:
+        """
+        Exit the server without answering.
+        """
+        os._exit(1)
+
+    mcp.run(transport="stdio")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Tests for the asynchronous API client's retries, concurrency and streaming.
+"""
+
+import asyncio
+from typing import Any, Callable
+
+import httpx
+import orjson
+import pytest
+
+from mcp_personal.api_client.client import (
+    APIError,
+    AsyncAPIClient,
+    RetryPolicy,
+)
+
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+def _client(
+    handler: Callable[[httpx.Request], httpx.Response],
+) -> AsyncAPIClient:
+    """
+    Create a client whose requests are answered by a handler.
+
+    :param handler: Function from each request to its response.
+    :type handler: Callable[[httpx.Request], httpx.Response]
+    :return: The client.
+    :rtype: AsyncAPIClient
+    """
+    return AsyncAPIClient(
+        retry=NO_WAIT, transport=httpx.MockTransport(handler)
+    )
+
+
+def _echo(request: httpx.Request) -> httpx.Response:
+    """
+    Answer a query with its own text.
+
+    :param request: The request.
+    :type request: httpx.Request
+    :return: The response.
+    :rtype: httpx.Response
+    """
+    payload = orjson.loads(request.content)
+    return httpx.Response(200, json={"echo": payload["query"]})
+
+
+def test_retry_delay_backs_off_and_honours_retry_after() -> None:
+    """
+    Delays grow with each attempt up to the maximum, and a Retry-After header
+    in seconds takes precedence.
+    """
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+    assert 0 <= policy.delay(1) <= 1
+    assert 0 <= policy.delay(10) <= 4
+    assert policy.delay(1, "2") == 2
+    assert policy.delay(1, "60") == 4
+    assert 0 <= policy.delay(1, "Wed, 21 Oct 2015 07:28:00 GMT") <= 1
+
+
+def test_overloaded_requests_are_retried() -> None:
+    """
+    Requests rejected as overloaded are retried until they succeed.
+    """
+    statuses = [503, 429, 200]
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        status = statuses.pop(0)
+        return _echo(request) if status == 200 else httpx.Response(status)
+
+    async def _invoke() -> dict[str, Any]:
+        async with _client(_handler) as client:
+            return await client.invoke("hello", "session")
+
+    assert asyncio.run(_invoke()) == {"echo": "hello"}
+    assert not statuses
+
+
+@pytest.mark.parametrize("statuses", [[400], [503, 503, 503]])
+def test_errors_are_raised(statuses: list[int]) -> None:
+    """
+    Errors which are not retried, or are retried too often, are raised.
+
+    :param statuses: The status of each response.
+    :type statuses: list[int]
+    """
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        _ = request
+        return httpx.Response(statuses.pop(0), text="nope")
+
+    async def _invoke() -> None:
+        async with _client(_handler) as client:
+            await client.invoke("hello", "session")
+
+    with pytest.raises(APIError) as error:
+        asyncio.run(_invoke())
+    assert error.value.body == "nope"
+    assert not statuses
+
+
+def test_invoke_many_keeps_order_within_sessions() -> None:
+    """
+    Responses come back in the order given, and the queries of a session
+    are sent one after another.
+    """
+    sent: list[str] = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        payload = orjson.loads(request.content)
+        sent.append(f"{payload['session_id']}:{payload['query']}")
+        return _echo(request)
+
+    queries = [("a1", "a"), ("b1", "b"), ("a2", "a"), ("b2", "b")]
+
+    async def _invoke() -> list[dict[str, Any] | BaseException]:
+        async with _client(_handler) as client:
+            return await client.invoke_many(queries, concurrency=2)
+
+    results = asyncio.run(_invoke())
+    assert results == [{"echo": query} for query, _ in queries]
+    assert sent.index("a:a1") < sent.index("a:a2")
+    assert sent.index("b:b1") < sent.index("b:b2")
+
+
+def test_stream_yields_message_events() -> None:
+    """
+    Streamed message events are yielded, and other events are skipped.
+    """
+    lines = [
+        {"type": "message", "message": {"role": "ai", "content": "hi"}},
+        {"type": "done", "stop_reason": "complete"},
+    ]
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/invoke/stream"
+        body = b"\n".join(orjson.dumps(line) for line in lines) + b"\n"
+        return httpx.Response(200, content=body)
+
+    async def _stream() -> list[dict[str, Any]]:
+        async with _client(_handler) as client:
+            return [m async for m in client.stream("hello", "session")]
+
+    assert asyncio.run(_stream()) == [{"role": "ai", "content": "hi"}]
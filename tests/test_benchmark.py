@@ -0,0 +1,91 @@
+"""
+Tests for the offline benchmark's fake model, fake server and statistics.
+"""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import create_fake_server
+from mcp_personal.benchmark.invoke_benchmark import percentile, summarise
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+
+
+def test_percentile_uses_nearest_rank() -> None:
+    """
+    Percentiles are taken from the values themselves.
+    """
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 95) == 0.0
+
+
+def test_summarise_reports_milliseconds() -> None:
+    """
+    Durations in seconds are summarised in milliseconds.
+    """
+    summary = summarise([0.1, 0.2, 0.3])
+    assert summary["mean"] == pytest.approx(200.0)
+    assert summary["max"] == pytest.approx(300.0)
+
+
+def test_fake_model_calls_tools_then_answers() -> None:
+    """
+    The fake model makes the configured rounds of tool calls before its
+    final answer.
+    """
+    model = FakeModel(
+        FakeModelConfig(latency=0, tool_rounds=2, response_chars=10)
+    )
+    messages: list[BaseMessage] = [HumanMessage(content="q")]
+    for _ in range(2):
+        response = model.chat(messages)
+        assert len(response.tool_calls) == 1
+        messages.append(response)
+    answer = model.chat(messages)
+    assert not answer.tool_calls
+    assert answer.content == "fake fake "
+
+
+def test_fake_model_truncates_to_max_tokens() -> None:
+    """
+    The final answer is cut to the token limit.
+    """
+    model = FakeModel(
+        FakeModelConfig(latency=0, tool_rounds=0, response_chars=100)
+    )
+    answer = asyncio.run(model.achat([HumanMessage(content="q")], 5))
+    assert len(answer.content) == 20
+
+
+def test_client_answers_with_fake_server(chat_history: ChatHistory) -> None:
+    """
+    The client connects to the fake server in-process and calls its tools.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+
+    async def _invoke() -> list[object]:
+        async with MCPClient(
+            model=FakeModel(FakeModelConfig(latency=0)),
+            servers={"fake": create_fake_server(latency=0)},
+            chat_history=chat_history,
+        ) as client:
+            return list(await client.invoke("add", "session"))
+
+    messages = asyncio.run(_invoke())
+    assert [type(m) for m in messages] == [AIMessage, ToolMessage, AIMessage]
+    tool_message = messages[1]
+    assert isinstance(tool_message, ToolMessage)
+    assert "3.0" in str(tool_message.content)
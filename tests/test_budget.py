@@ -0,0 +1,191 @@
+"""
+Tests for the budget of a query and its enforcement in the tool loop.
+"""
+
+import asyncio
+from datetime import timedelta
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from mcp import McpError
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import create_fake_server
+from mcp_personal.clients.budget import (
+    BudgetExceededError,
+    InvokeBudget,
+    StopReason,
+    estimate_tokens,
+)
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+from mcp_personal.clients.tool_session import start_call
+
+
+def _client(
+    chat_history: ChatHistory, tool_latency: float = 0, tool_rounds: int = 1
+) -> MCPClient:
+    """
+    Create a client for the fake model and server.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    :param tool_latency: Seconds each tool call takes.
+    :type tool_latency: float
+    :param tool_rounds: Rounds of tool calls the model makes.
+    :type tool_rounds: int
+    :return: The client.
+    :rtype: MCPClient
+    """
+    return MCPClient(
+        model=FakeModel(FakeModelConfig(latency=0, tool_rounds=tool_rounds)),
+        servers={"fake": create_fake_server(latency=tool_latency)},
+        chat_history=chat_history,
+    )
+
+
+def test_estimate_counts_content_and_tool_calls() -> None:
+    """
+    Tokens are estimated at four characters each, including tool calls.
+    """
+    assert estimate_tokens([HumanMessage(content="a" * 40)]) == 10
+    call = {"name": "add", "args": {"a": 1}, "id": "1"}
+    with_call = AIMessage(content="", tool_calls=[call])
+    assert estimate_tokens([with_call]) > 0
+
+
+def test_output_tokens_leaves_room_for_input() -> None:
+    """
+    A call's output is limited to what its input leaves, and a call whose
+    input would use up the budget is refused.
+    """
+    budget = InvokeBudget(max_tokens=100)
+    assert budget.output_tokens(30) == 70
+    with pytest.raises(BudgetExceededError) as error:
+        budget.output_tokens(100)
+    assert error.value.reason is StopReason.MAX_TOKENS
+    assert InvokeBudget().output_tokens(10**6) is None
+
+
+def test_iterations_are_limited() -> None:
+    """
+    Rounds of tool calls past the maximum are refused.
+    """
+    budget = InvokeBudget(max_iterations=1)
+    budget.next_iteration()
+    with pytest.raises(BudgetExceededError):
+        budget.next_iteration()
+
+
+def test_large_prompt_is_not_sent(chat_history: ChatHistory) -> None:
+    """
+    A query whose prompt does not fit in the token budget stops before the
+    model is called.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+
+    async def _invoke() -> tuple[InvokeBudget, int]:
+        budget = InvokeBudget(max_tokens=50)
+        async with _client(chat_history) as client:
+            messages = await client.invoke("x" * 400, "session", budget)
+        return budget, len(messages)
+
+    budget, count = asyncio.run(_invoke())
+    assert budget.stop_reason is StopReason.MAX_TOKENS
+    assert count == 0
+
+
+def test_unanswered_tool_calls_are_closed(chat_history: ChatHistory) -> None:
+    """
+    Tool calls left when the iterations run out are answered with an error,
+    so the session can carry on.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+
+    async def _invoke() -> tuple[InvokeBudget, list[str]]:
+        budget = InvokeBudget(max_iterations=0)
+        async with _client(chat_history) as client:
+            messages = await client.invoke("add", "session", budget)
+            await client.invoke("add", "session")
+        return budget, [m.type for m in messages]
+
+    budget, types = asyncio.run(_invoke())
+    assert budget.stop_reason is StopReason.MAX_ITERATIONS
+    assert types == ["ai", "tool"]
+
+
+def test_failed_tool_call_is_closed(chat_history: ChatHistory) -> None:
+    """
+    A tool call which raises is answered with an error before the messages
+    are stored, so the session can carry on.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+    budget = InvokeBudget()
+
+    async def _invoke() -> None:
+        async with MCPClient(
+            model=FakeModel(FakeModelConfig(latency=0, tool_name="missing")),
+            servers={"fake": create_fake_server(latency=0)},
+            chat_history=chat_history,
+        ) as client:
+            await client.invoke("add", "session", budget)
+
+    with pytest.raises(KeyError):
+        asyncio.run(_invoke())
+    assert budget.stop_reason is StopReason.ERROR
+    stored = chat_history.get_messages("session")
+    assert [m.type for m in stored] == ["ai", "tool"]
+    assert isinstance(stored[-1], ToolMessage)
+    assert stored[-1].status == "error"
+    assert isinstance(stored[0], AIMessage)
+    assert stored[-1].tool_call_id == stored[0].tool_calls[0]["id"]
+
+
+def test_deadline_stops_slow_tool(chat_history: ChatHistory) -> None:
+    """
+    A query stops at its deadline while a tool call is running, and the
+    server still answers the next query.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+
+    async def _invoke() -> tuple[InvokeBudget, float, InvokeBudget]:
+        async with _client(chat_history, tool_latency=1.0) as client:
+            budget = InvokeBudget(timeout=0.2)
+            start = time.perf_counter()
+            messages = await client.invoke("add", "session", budget)
+            elapsed = time.perf_counter() - start
+            tool = messages[-1]
+            assert isinstance(tool, ToolMessage) and tool.status == "error"
+            after = InvokeBudget()
+            await client.invoke("add", "session", after)
+        return budget, elapsed, after
+
+    budget, elapsed, after = asyncio.run(_invoke())
+    assert budget.stop_reason is StopReason.DEADLINE
+    assert elapsed < 0.8
+    assert after.stop_reason is StopReason.COMPLETE
+
+
+def test_abandoned_call_has_a_ceiling() -> None:
+    """
+    A call which nothing waits for still ends at its timeout.
+    """
+
+    async def _call() -> BaseException | None:
+        async with create_fake_server(latency=5).connect() as session:
+            call = start_call(
+                session, "add", {"a": 1, "b": 2}, timedelta(seconds=0.1)
+            )
+            await asyncio.wait({call}, timeout=2)
+            return call.exception()
+
+    assert isinstance(asyncio.run(_call()), McpError)
@@ -0,0 +1,97 @@
+"""
+Tests for recording model and tool traffic to a cassette and replaying it.
+"""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import create_fake_server
+from mcp_personal.clients.cassette import (
+    Cassette,
+    CassetteError,
+    CassetteMode,
+    ReplayModel,
+)
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+
+
+def _contents(messages: list[BaseMessage]) -> list[str]:
+    """
+    Get the contents of messages as strings.
+
+    :param messages: The messages.
+    :type messages: list[BaseMessage]
+    :return: The content of each message.
+    :rtype: list[str]
+    """
+    return [str(message.content) for message in messages]
+
+
+async def _invoke(client: MCPClient, query: str) -> list[BaseMessage]:
+    """
+    Answer a single query with a client.
+
+    :param client: The client, which is opened and closed.
+    :type client: MCPClient
+    :param query: The query.
+    :type query: str
+    :return: The new messages of the query.
+    :rtype: list[BaseMessage]
+    """
+    async with client:
+        return await client.invoke(query, "session")
+
+
+def test_replay_matches_recording(tmp_path: Path) -> None:
+    """
+    Replaying a recorded query gives the same messages without the model or
+    servers.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    path = tmp_path / "test.cassette"
+    recorded = asyncio.run(
+        _invoke(
+            MCPClient(
+                model=FakeModel(FakeModelConfig(latency=0)),
+                servers={"fake": create_fake_server(latency=0)},
+                chat_history=ChatHistory(f"sqlite:///{tmp_path / 'r.db'}"),
+                cassette=Cassette(path, CassetteMode.RECORD),
+            ),
+            "add",
+        )
+    )
+
+    replay = Cassette(path, CassetteMode.REPLAY)
+    assert replay.queries == [{"session_id": "session", "query": "add"}]
+    replayed = asyncio.run(
+        _invoke(
+            MCPClient(
+                servers={},
+                chat_history=ChatHistory(f"sqlite:///{tmp_path / 'p.db'}"),
+                cassette=replay,
+            ),
+            "add",
+        )
+    )
+    assert _contents(replayed) == _contents(recorded)
+
+
+def test_strict_replay_rejects_unknown_request(tmp_path: Path) -> None:
+    """
+    A strict cassette raises when no recorded interaction matches.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    path = tmp_path / "empty.cassette"
+    Cassette(path, CassetteMode.RECORD).save()
+    model = ReplayModel(Cassette(path, CassetteMode.REPLAY, strict=True))
+    with pytest.raises(CassetteError):
+        model.chat([HumanMessage(content="unrecorded")])
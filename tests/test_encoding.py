@@ -0,0 +1,162 @@
+"""
+Tests for the compact response format and response compression.
+"""
+
+import asyncio
+import gzip
+
+import orjson
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from mcp_personal.benchmark.fake_model import FakeModelConfig
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.web_api.encoding import (
+    available_encodings,
+    compact_message,
+    compact_response,
+    compress,
+    encode_json,
+)
+from tests.web import serve_api
+
+
+def _turn() -> list[AIMessage | ToolMessage]:
+    """
+    Build the messages of a turn with one tool call.
+
+    :return: The messages.
+    :rtype: list[AIMessage | ToolMessage]
+    """
+    call = {"name": "add", "args": {"a": 1, "b": 2}, "id": "call_1"}
+    return [
+        AIMessage(
+            content=[{"type": "text", "text": "Adding"}],
+            tool_calls=[call],
+            usage_metadata={
+                "input_tokens": 10,
+                "output_tokens": 5,
+                "total_tokens": 15,
+            },
+        ),
+        ToolMessage(
+            content="[TextContent(type='text', text='3')]",
+            name="add",
+            tool_call_id="call_1",
+            artifact={"call": call, "result": "3"},
+        ),
+        AIMessage(
+            content="It is 3",
+            usage_metadata={
+                "input_tokens": 20,
+                "output_tokens": 3,
+                "total_tokens": 23,
+            },
+        ),
+    ]
+
+
+def test_compact_messages_flatten_content() -> None:
+    """
+    Content blocks are flattened to text, and tool messages carry their
+    arguments and plain result.
+    """
+    ai, tool, _ = _turn()
+    assert compact_message(ai) == {
+        "role": "ai",
+        "content": "Adding",
+        "tool_calls": [
+            {"id": "call_1", "name": "add", "args": {"a": 1, "b": 2}}
+        ],
+        "usage": {"input_tokens": 10, "output_tokens": 5},
+    }
+    assert compact_message(tool) == {
+        "role": "tool",
+        "name": "add",
+        "tool_call_id": "call_1",
+        "args": {"a": 1, "b": 2},
+        "result": "3",
+    }
+    assert compact_message(HumanMessage(content="hi")) == {
+        "role": "human",
+        "content": "hi",
+    }
+
+
+def test_compact_response_totals_usage() -> None:
+    """
+    The response sums the token usage of the turn.
+    """
+    response = compact_response(list(_turn()), "session")
+    assert response["session_id"] == "session"
+    assert len(response["messages"]) == 3
+    assert response["usage"] == {"input_tokens": 30, "output_tokens": 8}
+
+
+def test_error_tool_result_is_flagged() -> None:
+    """
+    Failed tool calls are marked as errors.
+    """
+    message = ToolMessage(
+        content="boom", name="add", tool_call_id="call_1", status="error"
+    )
+    entry = compact_message(message)
+    assert entry["error"] is True
+    assert entry["result"] == "boom"
+
+
+@pytest.mark.parametrize("encoding", available_encodings())
+def test_compression_round_trip(encoding: str) -> None:
+    """
+    Compressed bodies decompress to the original JSON.
+
+    :param encoding: The content encoding.
+    :type encoding: str
+    """
+    body = encode_json(compact_response(list(_turn()), "session"))
+    compressed = compress(body * 20, encoding)
+    if encoding == "gzip":
+        assert gzip.decompress(compressed) == body * 20
+    assert len(compressed) < len(body * 20)
+    assert orjson.loads(body)["format"] == "compact"
+
+
+def test_unknown_encoding_is_rejected() -> None:
+    """
+    Unsupported encodings raise an error.
+    """
+    with pytest.raises(ValueError):
+        compress(b"{}", "deflate")
+
+
+def test_invoke_compact_response_is_compressed(
+    chat_history: ChatHistory,
+) -> None:
+    """
+    The compact ``/invoke`` response is compressed for clients which accept
+    it, and decodes to the compact schema.
+
+    :param chat_history: Chat history for the web API.
+    :type chat_history: ChatHistory
+    """
+
+    async def _post() -> tuple[str | None, bytes]:
+        config = FakeModelConfig(latency=0, response_chars=4000)
+        async with serve_api(chat_history, config) as (_, client):
+            response = await client.post(
+                "/invoke",
+                json={"query": "add", "session_id": "s", "format": "compact"},
+                headers={"Accept-Encoding": "gzip"},
+            )
+            assert response.status_code == 200
+            return (
+                response.headers.get("Content-Encoding"),
+                await response.get_data(as_text=False),
+            )
+
+    encoding, body = asyncio.run(_post())
+    assert encoding == "gzip"
+    response = orjson.loads(gzip.decompress(body))
+    assert response["format"] == "compact"
+    assert [m["role"] for m in response["messages"]] == ["ai", "tool", "ai"]
+    assert response["stop_reason"] == "complete"
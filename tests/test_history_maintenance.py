@@ -0,0 +1,138 @@
+"""
+Tests for expiring, archiving and reporting on the chat history.
+"""
+
+import gzip
+import json
+from pathlib import Path
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy import text
+
+from mcp_personal.clients.chat_history import ACTIVITY_TABLE, ChatHistory
+from mcp_personal.clients.history_maintenance import (
+    DAY,
+    HistoryMaintenance,
+    MaintenanceConfig,
+)
+
+
+def _add_session(
+    chat_history: ChatHistory, session_id: str, idle: float = 0
+) -> None:
+    """
+    Add a short conversation to a session, which was last active some time
+    ago.
+
+    :param chat_history: The chat history to add to.
+    :type chat_history: ChatHistory
+    :param session_id: The ID of the session.
+    :type session_id: str
+    :param idle: How long ago in seconds the session was last active.
+    :type idle: float
+    """
+    chat_history.add_messages(
+        session_id,
+        [HumanMessage(content="What is 2 + 2?"), AIMessage(content="4")],
+    )
+    with chat_history.engine.begin() as connection:
+        connection.execute(
+            text(
+                f"UPDATE {ACTIVITY_TABLE} SET last_active = :last_active "
+                "WHERE session_id = :session_id"
+            ),
+            {"session_id": session_id, "last_active": time.time() - idle},
+        )
+
+
+def test_sessions_are_kept_by_default(chat_history: ChatHistory) -> None:
+    """
+    Without a time to live, no session is expired however long it is idle.
+
+    :param chat_history: Chat history to maintain.
+    :type chat_history: ChatHistory
+    """
+    _add_session(chat_history, "old", idle=365 * DAY)
+    report = HistoryMaintenance(chat_history).run_once()
+    assert report.expired_sessions == 0
+    assert len(chat_history.get_messages("old")) == 2
+
+
+def test_idle_sessions_are_archived_and_removed(
+    tmp_path: Path, chat_history: ChatHistory
+) -> None:
+    """
+    Sessions idle for longer than the time to live are written to their
+    archive and removed, and active sessions are left alone.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :param chat_history: Chat history to maintain.
+    :type chat_history: ChatHistory
+    """
+    _add_session(chat_history, "old", idle=2 * DAY)
+    _add_session(chat_history, "active")
+    archive_dir = tmp_path / "archive"
+    maintenance = HistoryMaintenance(
+        chat_history,
+        MaintenanceConfig(session_ttl=DAY, archive_dir=archive_dir),
+    )
+
+    report = maintenance.run_once()
+    assert report.expired_sessions == 1
+    assert report.archived_messages == 2
+    assert not chat_history.get_messages("old")
+    assert len(chat_history.get_messages("active")) == 2
+
+    (archive,) = archive_dir.iterdir()
+    with gzip.open(archive, "rt", encoding="utf-8") as file:
+        lines = [json.loads(line) for line in file]
+    assert lines[0]["session_id"] == "old"
+    assert [line["data"]["content"] for line in lines[1:]] == [
+        "What is 2 + 2?",
+        "4",
+    ]
+    assert maintenance.run_once().expired_sessions == 0
+
+
+def test_untracked_sessions_start_their_ttl(
+    chat_history: ChatHistory,
+) -> None:
+    """
+    A session with no recorded activity is tracked from the first pass
+    rather than expired straight away.
+
+    :param chat_history: Chat history to maintain.
+    :type chat_history: ChatHistory
+    """
+    _add_session(chat_history, "untracked")
+    with chat_history.engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {ACTIVITY_TABLE}"))
+
+    maintenance = HistoryMaintenance(
+        chat_history, MaintenanceConfig(session_ttl=DAY)
+    )
+    assert maintenance.run_once().expired_sessions == 0
+    assert len(chat_history.get_messages("untracked")) == 2
+
+
+def test_stats_report_largest_sessions(chat_history: ChatHistory) -> None:
+    """
+    Statistics count every session and message, and list the largest
+    sessions first.
+
+    :param chat_history: Chat history to report on.
+    :type chat_history: ChatHistory
+    """
+    _add_session(chat_history, "small")
+    _add_session(chat_history, "large")
+    _add_session(chat_history, "large")
+
+    stats = HistoryMaintenance(chat_history).stats(limit=1)
+    assert (stats.sessions, stats.messages) == (2, 6)
+    assert stats.size_bytes is not None and stats.size_bytes > 0
+    assert len(stats.largest_sessions) == 1
+    largest = stats.largest_sessions[0]
+    assert (largest.session_id, largest.messages) == ("large", 4)
+    assert largest.last_active is not None
@@ -0,0 +1,133 @@
+"""
+Tests for the compact binary storage format and migrating the chat history to
+it.
+"""
+
+from pathlib import Path
+
+import pytest
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.message_codec import (
+    MIN_TRAINING_SAMPLES,
+    MessageCodec,
+    train_dictionary,
+)
+from mcp_personal.utils.migrate_history import migrate
+
+
+def _conversation(turn: int) -> list[BaseMessage]:
+    """
+    Create a conversation turn with a tool call.
+
+    :param turn: The number of the turn, which varies its content.
+    :type turn: int
+    :return: The messages of the turn.
+    :rtype: list[BaseMessage]
+    """
+    call_id = f"call_{turn}"
+    return [
+        HumanMessage(content=f"What is {turn} + 2?"),
+        AIMessage(
+            content="",
+            tool_calls=[
+                {"name": "add", "args": {"a": turn, "b": 2}, "id": call_id}
+            ],
+        ),
+        ToolMessage(content=str(turn + 2), tool_call_id=call_id),
+        AIMessage(content=f"{turn} + 2 is {turn + 2}."),
+    ]
+
+
+_SAMPLES = [
+    message
+    for turn in range(MIN_TRAINING_SAMPLES // 2)
+    for message in _conversation(turn)
+]
+
+
+@pytest.mark.parametrize("trained", [False, True])
+def test_round_trip(trained: bool) -> None:
+    """
+    Messages decode to what was encoded, with or without a dictionary.
+
+    :param trained: Whether the codec has a trained dictionary.
+    :type trained: bool
+    """
+    codec = MessageCodec([train_dictionary(_SAMPLES)] if trained else [])
+    assert (codec.dictionary_id is not None) == trained
+    messages = [SystemMessage(content="Be brief."), *_conversation(7)]
+    for message in messages:
+        assert codec.decode(codec.encode(message)) == message
+
+
+def test_old_dictionaries_still_decode() -> None:
+    """
+    Messages compressed with an older dictionary can be read after a new one
+    is added, but not by a codec which does not know the dictionary.
+    """
+    codec = MessageCodec([train_dictionary(_SAMPLES)])
+    message = _conversation(3)[1]
+    encoded = codec.encode(message)
+    codec.add_dictionary(train_dictionary(reversed(_SAMPLES)))
+    assert codec.decode(encoded) == message
+    with pytest.raises(ValueError):
+        MessageCodec().decode(encoded)
+
+
+def test_migration_copies_and_resumes(tmp_path: Path) -> None:
+    """
+    Migrated messages read back the same from binary storage, and a second
+    run only copies the messages added since.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    url = f"sqlite:///{tmp_path / 'history.db'}"
+    source = ChatHistory(url=url)
+    for turn in range(MIN_TRAINING_SAMPLES // 4 + 1):
+        source.add_messages(f"session {turn % 3}", _conversation(turn))
+
+    report = migrate(url, batch_size=7)
+    assert report.trained
+    assert report.messages == 4 * (MIN_TRAINING_SAMPLES // 4 + 1)
+    source.add_messages("session 0", _conversation(100))
+    report = migrate(url)
+    assert (report.messages, report.trained) == (4, False)
+    assert migrate(url).messages == 0
+
+    target = ChatHistory(url=url, storage="binary")
+    for session_id in ["session 0", "session 1", "session 2"]:
+        assert target.get_messages(session_id) == source.get_messages(
+            session_id
+        )
+
+
+def test_migration_refuses_after_binary_writes(tmp_path: Path) -> None:
+    """
+    The migration does not carry on once the binary table has messages of
+    its own, as they may have taken the IDs of messages left to copy. Once
+    everything is copied, running it again is harmless.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    url = f"sqlite:///{tmp_path / 'history.db'}"
+    source = ChatHistory(url=url)
+    target = ChatHistory(url=url, storage="binary")
+    source.add_messages("old", _conversation(1))
+    assert migrate(url).messages == 4
+
+    target.add_messages("new", _conversation(2))
+    assert migrate(url).messages == 0
+    source.add_messages("old", _conversation(3))
+    with pytest.raises(RuntimeError):
+        migrate(url)
+    assert target.get_messages("old") == _conversation(1)
@@ -0,0 +1,223 @@
+"""
+Tests for the warm pool of stdio servers, run against real server processes.
+"""
+
+import asyncio
+from pathlib import Path
+import time
+
+import pytest
+from mcp.client.stdio import StdioServerParameters
+from mcp.types import TextContent
+
+from mcp_personal.clients.server_pool import (
+    PoolConfig,
+    PooledServer,
+    ServerUnavailableError,
+    StdioServerPool,
+)
+
+
+async def _pid(pool: StdioServerPool, delay: float = 0) -> int:
+    """
+    Get the process ID of the server which answers a call.
+
+    :param pool: The pool to call.
+    :type pool: StdioServerPool
+    :param delay: Time in seconds the server waits before answering.
+    :type delay: float
+    :return: The process ID.
+    :rtype: int
+    """
+    result = await pool.call_tool("pid", {"delay": delay})
+    content = result.content[0]
+    assert isinstance(content, TextContent)
+    return int(content.text)
+
+
+async def _eventually_pid(pool: StdioServerPool, timeout: float = 10) -> int:
+    """
+    Keep calling the pool until a server answers.
+
+    :param pool: The pool to call.
+    :type pool: StdioServerPool
+    :param timeout: Time in seconds to keep trying.
+    :type timeout: float
+    :raises TimeoutError: If no server answers in time.
+    :return: The process ID of the server which answered.
+    :rtype: int
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return await _pid(pool)
+        except ServerUnavailableError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError("No server answered")
+
+
+def _starts(tmp_path: Path) -> list[float]:
+    """
+    Read when the test server was started.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :return: The Unix times of each start.
+    :rtype: list[float]
+    """
+    lines = (tmp_path / "starts").read_text(encoding="utf-8").split()
+    return [float(line) for line in lines]
+
+
+def test_calls_are_spread_round_robin(
+    stdio_params: StdioServerParameters,
+) -> None:
+    """
+    Calls alternate between the warm servers.
+
+    :param stdio_params: Parameters to start the test server.
+    :type stdio_params: StdioServerParameters
+    """
+
+    async def inner() -> list[int]:
+        config = PoolConfig(size=2, max_size=2)
+        async with StdioServerPool(PooledServer(stdio_params, config)) as pool:
+            await _eventually_pid(pool)
+            while pool.size < 2 or len({await _pid(pool) for _ in "ab"}) < 2:
+                await asyncio.sleep(0.1)
+            return [await _pid(pool) for _ in range(4)]
+
+    pids = asyncio.run(inner())
+    assert pids[0] != pids[1]
+    assert pids[:2] == pids[2:]
+
+
+def test_pool_grows_when_busy_and_shrinks_when_idle(
+    stdio_params: StdioServerParameters,
+) -> None:
+    """
+    A server is added while every server is busy, and stopped again once it
+    has been idle for the idle timeout.
+
+    :param stdio_params: Parameters to start the test server.
+    :type stdio_params: StdioServerParameters
+    """
+
+    async def inner() -> None:
+        config = PoolConfig(
+            size=1, max_size=2, idle_timeout=0.5, health_interval=0.1
+        )
+        async with StdioServerPool(PooledServer(stdio_params, config)) as pool:
+            assert pool.size == 1
+            busy = asyncio.create_task(_pid(pool, delay=2))
+            await asyncio.sleep(0.1)
+            await _pid(pool)
+            assert pool.size == 2
+            await busy
+
+            deadline = time.monotonic() + 5
+            while pool.size > 1 and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            assert pool.size == 1
+
+    asyncio.run(inner())
+
+
+def test_crashed_server_fails_calls_and_is_replaced(
+    stdio_params: StdioServerParameters,
+) -> None:
+    """
+    A call to a server which crashes fails instead of hanging, and the
+    server is replaced.
+
+    :param stdio_params: Parameters to start the test server.
+    :type stdio_params: StdioServerParameters
+    """
+
+    async def inner() -> None:
+        config = PoolConfig(size=1, max_size=1)
+        async with StdioServerPool(PooledServer(stdio_params, config)) as pool:
+            before = await _pid(pool)
+            with pytest.raises(ServerUnavailableError):
+                await asyncio.wait_for(pool.call_tool("crash"), 5)
+            assert await _eventually_pid(pool) != before
+
+    asyncio.run(inner())
+
+
+def test_failing_restarts_back_off(
+    stdio_params: StdioServerParameters, tmp_path: Path
+) -> None:
+    """
+    A server which keeps failing to start is retried with growing delays,
+    capped at the maximum, and the pool recovers once it starts again.
+
+    :param stdio_params: Parameters to start the test server.
+    :type stdio_params: StdioServerParameters
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+
+    async def inner() -> None:
+        config = PoolConfig(size=1, max_size=1, max_restart_delay=2)
+        async with StdioServerPool(PooledServer(stdio_params, config)) as pool:
+            await _pid(pool)
+            (tmp_path / "broken").touch()
+            with pytest.raises(ServerUnavailableError):
+                await asyncio.wait_for(pool.call_tool("crash"), 5)
+            await asyncio.sleep(2.5)
+            restarts = _starts(tmp_path)[1:]
+            # Without a back off, a server which exits straight away would be
+            # restarted dozens of times.
+            assert 1 <= len(restarts) <= 3
+            (tmp_path / "broken").unlink()
+            await _eventually_pid(pool)
+
+    asyncio.run(inner())
+
+
+def test_pool_fails_if_no_server_starts(
+    stdio_params: StdioServerParameters, tmp_path: Path
+) -> None:
+    """
+    Entering the pool fails if none of its servers start.
+
+    :param stdio_params: Parameters to start the test server.
+    :type stdio_params: StdioServerParameters
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    (tmp_path / "broken").touch()
+
+    async def inner() -> None:
+        pool = StdioServerPool(PooledServer(stdio_params, PoolConfig(size=2)))
+        async with pool:
+            pass
+
+    with pytest.raises(ServerUnavailableError):
+        asyncio.run(inner())
+    assert len(_starts(tmp_path)) == 2
+
+
+def test_call_waits_again_if_ready_server_is_gone(
+    stdio_params: StdioServerParameters,
+) -> None:
+    """
+    A call woken by a server becoming ready, which finds it gone by the time
+    it resumes, keeps waiting until the start timeout and then fails.
+
+    :param stdio_params: Parameters to start the test server.
+    :type stdio_params: StdioServerParameters
+    """
+    config = PoolConfig(size=1, start_timeout=0.2)
+
+    async def inner() -> float:
+        pool = StdioServerPool(PooledServer(stdio_params, config))
+        # pylint: disable-next=protected-access
+        pool._available.set()
+        start = time.monotonic()
+        with pytest.raises(ServerUnavailableError):
+            await pool.call_tool("pid")
+        return time.monotonic() - start
+
+    assert asyncio.run(inner()) >= 0.15
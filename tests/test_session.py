@@ -0,0 +1,285 @@
+"""
+Tests for sessions held open over a WebSocket and their in-memory history.
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from quart.testing.connections import WebsocketDisconnectError
+from quart.typing import TestClientProtocol
+
+from mcp_personal.benchmark.fake_model import FakeModelConfig
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.session_history import SessionHistory
+from tests.web import serve_api
+
+HEADERS = {"Origin": "http://localhost"}
+
+
+class _SlowChatHistory(ChatHistory):
+    """
+    Chat history which is slow to read, and which fails to read or write a
+    given number of times first.
+
+    :param url: The database URL.
+    :type url: str
+    """
+
+    def __init__(self, url: str) -> None:
+        super().__init__(url=url)
+        self.read_delay = 0.0
+        self.read_failures = 0
+        self.write_failures = 0
+
+    def get_messages(self, session_id: str) -> list[BaseMessage]:
+        """
+        Read the messages of a session, after the delay.
+
+        :param session_id: The ID of the session.
+        :type session_id: str
+        :raises ConnectionError: While there are read failures left.
+        :return: The messages.
+        :rtype: list[BaseMessage]
+        """
+        time.sleep(self.read_delay)
+        if self.read_failures:
+            self.read_failures -= 1
+            raise ConnectionError("Database is unavailable")
+        return super().get_messages(session_id)
+
+    def add_messages(
+        self, session_id: str, messages: list[BaseMessage]
+    ) -> None:
+        """
+        Store messages of a session.
+
+        :param session_id: The ID of the session.
+        :type session_id: str
+        :param messages: The messages to store.
+        :type messages: list[BaseMessage]
+        :raises ConnectionError: While there are write failures left.
+        """
+        if self.write_failures:
+            self.write_failures -= 1
+            raise ConnectionError("Database is unavailable")
+        super().add_messages(session_id, messages)
+
+
+@pytest.fixture(name="slow_history")
+def fixture_slow_history(tmp_path: Path) -> _SlowChatHistory:
+    """
+    Slow chat history stored in a temporary SQLite database.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :return: The chat history.
+    :rtype: _SlowChatHistory
+    """
+    return _SlowChatHistory(url=f"sqlite:///{tmp_path / 'history.db'}")
+
+
+async def _first_event(client: TestClientProtocol, session_id: str) -> str:
+    """
+    Open a session and get the type of the first event sent.
+
+    :param client: The test client.
+    :type client: TestClientProtocol
+    :param session_id: The ID of the session.
+    :type session_id: str
+    :return: The type of the event, or ``closed`` if the connection closed
+        without one.
+    :rtype: str
+    """
+    path = f"/session?session_id={session_id}"
+    async with client.websocket(path, headers=HEADERS) as connection:
+        try:
+            event: dict[str, Any] = json.loads(await connection.receive())
+        except WebsocketDisconnectError:
+            return "closed"
+        return str(event["type"])
+
+
+def test_session_history_stores_in_background(
+    slow_history: _SlowChatHistory,
+) -> None:
+    """
+    Messages are held in memory straight away and stored in the background,
+    and messages which failed to store are stored with the next ones.
+
+    :param slow_history: Chat history to store in.
+    :type slow_history: _SlowChatHistory
+    """
+    first = [HumanMessage(content="What is 1 + 2?"), AIMessage(content="3")]
+    second = [HumanMessage(content="And 2 + 2?"), AIMessage(content="4")]
+
+    async def inner() -> None:
+        history = await SessionHistory.load(slow_history, "s")
+        slow_history.write_failures = 1
+        history.add_messages(first)
+        assert history.get_messages() == first
+        await asyncio.sleep(0.1)
+        assert not slow_history.get_messages("s")
+
+        history.add_messages(second)
+        await history.close()
+
+    asyncio.run(inner())
+    assert slow_history.get_messages("s") == first + second
+
+
+def test_close_raises_if_messages_cannot_be_stored(
+    slow_history: _SlowChatHistory,
+) -> None:
+    """
+    Closing the history raises if its messages still cannot be stored.
+
+    :param slow_history: Chat history to store in.
+    :type slow_history: _SlowChatHistory
+    """
+
+    async def inner() -> None:
+        history = await SessionHistory.load(slow_history, "s")
+        slow_history.write_failures = 2
+        history.add_messages([HumanMessage(content="hi")])
+        with pytest.raises(ConnectionError):
+            await history.close()
+
+    asyncio.run(inner())
+
+
+def test_session_answers_queries(chat_history: ChatHistory) -> None:
+    """
+    A query over a session is answered with message events and a done
+    event, and the messages answering it are stored once the session closes.
+
+    :param chat_history: Chat history of the web API.
+    :type chat_history: ChatHistory
+    """
+
+    async def inner() -> list[str]:
+        async with serve_api(chat_history) as (_, client):
+            path = "/session?session_id=s"
+            async with client.websocket(path, headers=HEADERS) as connection:
+                events = [json.loads(await connection.receive())]
+                query = {"type": "query", "query": "What is 1 + 2?"}
+                await connection.send(json.dumps(query))
+                while events[-1]["type"] != "done":
+                    events.append(json.loads(await connection.receive()))
+        assert events[-1]["stop_reason"] == "complete"
+        return [event["type"] for event in events]
+
+    types = asyncio.run(inner())
+    assert types[0] == "session"
+    assert set(types[1:-1]) == {"message"}
+    assert len(chat_history.get_messages("s")) == types.count("message")
+
+
+def test_open_session_cannot_be_joined(
+    slow_history: _SlowChatHistory,
+) -> None:
+    """
+    Only one connection gets a session, even if the second connects while
+    the history of the first is still loading.
+
+    :param slow_history: Chat history of the web API.
+    :type slow_history: _SlowChatHistory
+    """
+    slow_history.read_delay = 0.3
+
+    async def inner() -> list[str]:
+        async with serve_api(slow_history) as (_, client):
+            events = await asyncio.gather(
+                _first_event(client, "s"), _first_event(client, "s")
+            )
+        return list(events)
+
+    assert sorted(asyncio.run(inner())) == ["error", "session"]
+
+
+def test_failed_load_frees_the_session(
+    slow_history: _SlowChatHistory,
+) -> None:
+    """
+    A session whose history fails to load can be opened again.
+
+    :param slow_history: Chat history of the web API.
+    :type slow_history: _SlowChatHistory
+    """
+    slow_history.read_failures = 1
+
+    async def inner() -> list[str]:
+        async with serve_api(slow_history) as (_, client):
+            return [
+                await _first_event(client, "s"),
+                await _first_event(client, "s"),
+            ]
+
+    assert asyncio.run(inner()) == ["closed", "session"]
+
+
+def test_failed_query_ends_with_error_and_done(
+    chat_history: ChatHistory,
+) -> None:
+    """
+    A query which fails is answered with an error event and then its done
+    event, and the session stays open.
+
+    :param chat_history: Chat history of the web API.
+    :type chat_history: ChatHistory
+    """
+    model = FakeModelConfig(latency=0, tool_name="missing")
+
+    async def inner() -> list[dict[str, Any]]:
+        async with serve_api(chat_history, model) as (_, client):
+            path = "/session?session_id=s"
+            async with client.websocket(path, headers=HEADERS) as connection:
+                events = [json.loads(await connection.receive())]
+                for _ in range(2):
+                    query = {"type": "query", "query": "What is 1 + 2?"}
+                    await connection.send(json.dumps(query))
+                    while events[-1]["type"] != "done":
+                        events.append(json.loads(await connection.receive()))
+                    events.append({"type": "next"})
+        return events
+
+    events = asyncio.run(inner())
+    end = events.index({"type": "next"})
+    answer = events[1:end]
+    assert [event["type"] for event in answer] == ["message", "error", "done"]
+    assert answer[1]["status"] == 500
+    assert answer[2]["stop_reason"] == "error"
+    assert events.count({"type": "next"}) == 2
+
+
+def test_open_session_refuses_requests(chat_history: ChatHistory) -> None:
+    """
+    Requests to a session which is open over a WebSocket are refused, since
+    the socket holds its history.
+
+    :param chat_history: Chat history of the web API.
+    :type chat_history: ChatHistory
+    """
+
+    async def inner() -> list[int]:
+        async with serve_api(chat_history) as (_, client):
+            statuses = []
+            path = "/session?session_id=s"
+            async with client.websocket(path, headers=HEADERS) as connection:
+                await connection.receive()
+                for endpoint in ("/invoke", "/invoke/stream"):
+                    response = await client.post(
+                        endpoint, json={"query": "add", "session_id": "s"}
+                    )
+                    statuses.append(response.status_code)
+            response = await client.post(
+                "/invoke", json={"query": "add", "session_id": "s"}
+            )
+            statuses.append(response.status_code)
+        return statuses
+
+    assert asyncio.run(inner()) == [409, 409, 200]
@@ -0,0 +1,210 @@
+"""
+Tests for binding tools from the tool snapshot and warming up the client.
+"""
+
+import asyncio
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+import logging
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+from mcp import ClientSession
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import (
+    InMemoryServer,
+    create_fake_server,
+)
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+from mcp_personal.clients.tool_cache import ToolCache, server_fingerprint
+from mcp_personal.clients.tool_session import DeferredToolSession
+from mcp_personal.utils.startup_profile import startup_report
+
+TOOLS = {"fake": [{"name": "add", "description": "", "input_schema": {}}]}
+
+
+class _BrokenModel(FakeModel):
+    """
+    Fake model which fails to warm up.
+    """
+
+    def warm_up(self) -> None:
+        """
+        Fail to warm up.
+
+        :raises RuntimeError: Always.
+        """
+        raise RuntimeError("no credentials")
+
+
+class _WarmUpModel(FakeModel):
+    """
+    Fake model which records the tools bound at each warm up.
+    """
+
+    warmed: list[list[str]] = []
+
+    def warm_up(self) -> None:
+        """
+        Record the names of the bound tools.
+        """
+        self.warmed.append([tool["name"] for tool in self._tools])
+
+
+class _GatedServer:  # pylint: disable=too-few-public-methods
+    """
+    Fake server which only accepts connections once its gate is opened.
+
+    :param server: The server to connect to.
+    :type server: InMemoryServer
+    """
+
+    def __init__(self, server: InMemoryServer) -> None:
+        self.name = server.name
+        self.gate = asyncio.Event()
+        self._server = server
+
+    def connect(self) -> AbstractAsyncContextManager[ClientSession]:
+        """
+        Open a session with the server once the gate is opened.
+
+        :return: A context manager which yields the session.
+        :rtype: AbstractAsyncContextManager[ClientSession]
+        """
+
+        @asynccontextmanager
+        async def _connect() -> AsyncIterator[ClientSession]:
+            await self.gate.wait()
+            async with self._server.connect() as session:
+                yield session
+
+        return _connect()
+
+
+def test_snapshot_round_trip(tmp_path: Path) -> None:
+    """
+    A snapshot is only used for the same servers with the same
+    configurations.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    cache = ToolCache(tmp_path / "tools.json")
+    assert cache.load({"fake": "a"}) is None
+    cache.save({"fake": "a"}, TOOLS)
+    assert cache.load({"fake": "a"}) == TOOLS
+    assert cache.load({"fake": "b"}) is None
+    assert cache.load({"fake": "a", "other": "c"}) is None
+
+
+def test_fingerprint_hides_configuration() -> None:
+    """
+    Fingerprints differ by configuration and do not contain it.
+    """
+    first = server_fingerprint("http://localhost:1/sse")
+    assert first != server_fingerprint("http://localhost:2/sse")
+    assert "localhost" not in first
+
+
+def test_client_binds_tools_from_snapshot(
+    tmp_path: Path, chat_history: ChatHistory
+) -> None:
+    """
+    The first start saves a snapshot, and the next binds tools from it
+    before the server connects, with calls waiting for the server.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+    cache = ToolCache(tmp_path / "tools.json")
+
+    async def _start() -> tuple[bool, int]:
+        async with MCPClient(
+            model=FakeModel(FakeModelConfig(latency=0)),
+            servers={"fake": create_fake_server(latency=0)},
+            chat_history=chat_history,
+            tool_cache=cache,
+        ) as client:
+            deferred = isinstance(
+                client.tool_sessions["add"], DeferredToolSession
+            )
+            messages = await client.invoke("add", "session")
+            return deferred, len(messages)
+
+    assert asyncio.run(_start()) == (False, 3)
+    assert cache.path.exists()
+    assert asyncio.run(_start()) == (True, 3)
+
+
+def test_failed_warm_up_is_logged(
+    chat_history: ChatHistory, caplog: pytest.LogCaptureFixture
+) -> None:
+    """
+    A warm up which fails in the background is logged rather than lost.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    :param caplog: Captured log records.
+    :type caplog: pytest.LogCaptureFixture
+    """
+
+    async def _warm_up() -> None:
+        async with MCPClient(
+            model=_BrokenModel(FakeModelConfig(latency=0)),
+            servers={},
+            chat_history=chat_history,
+        ) as client:
+            client.start_warm_up()
+
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(_warm_up())
+    assert "Warm up failed" in caplog.text
+
+
+def test_refreshed_tools_are_warmed_up(
+    tmp_path: Path, chat_history: ChatHistory
+) -> None:
+    """
+    Tools rebound after the server connects are warmed up again, even if
+    the first warm up finished long before.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+    server = _GatedServer(create_fake_server(latency=0))
+    cache = ToolCache(tmp_path / "tools.json")
+    cache.save({"fake": server_fingerprint(server)}, TOOLS)
+    model = _WarmUpModel(FakeModelConfig(latency=0))
+    model.warmed = []
+
+    async def _start() -> None:
+        async with MCPClient(
+            model=model,
+            servers={"fake": server},
+            chat_history=chat_history,
+            tool_cache=cache,
+        ) as client:
+            client.start_warm_up()
+            while not model.warmed:
+                await asyncio.sleep(0.01)
+            server.gate.set()
+            while len(model.warmed) < 2:
+                await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(_start(), 10))
+    assert model.warmed[0] == ["add"]
+    assert "lookup" in model.warmed[1]
+
+
+def test_startup_report_lists_imports() -> None:
+    """
+    The startup report gives the import time of the module.
+    """
+    report = startup_report("mcp_personal.clients.tool_cache", top=3)
+    assert report.startswith("Import time for mcp_personal.clients.tool_cache")
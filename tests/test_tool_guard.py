@@ -0,0 +1,260 @@
+"""
+Tests for the timeouts, circuit breakers and hedging which guard tool calls.
+"""
+
+import asyncio
+from datetime import timedelta
+import json
+from pathlib import Path
+from typing import Any
+
+from mcp.types import CallToolResult, TextContent
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import create_fake_server
+from mcp_personal.clients.cassette import (
+    Cassette,
+    CassetteMode,
+    RecordingToolSession,
+    ReplayToolSession,
+)
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+from mcp_personal.clients.tool_guard import (
+    BreakerState,
+    CallPolicy,
+    GuardConfig,
+    ToolGuard,
+)
+
+
+class _FakeSession:  # pylint: disable=too-few-public-methods
+    """
+    Tool session which answers after a delay for each call in turn, failing
+    the calls whose delay is None.
+
+    :param *delays: The delay of each call in seconds, with the last delay
+        used for any further calls.
+    :type *delays: float | None
+    """
+
+    def __init__(self, *delays: float | None) -> None:
+        self._delays = list(delays)
+        self.calls = 0
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        read_timeout_seconds: timedelta | None = None,
+    ) -> CallToolResult:
+        """
+        Answer a call with its number, after its delay.
+
+        :param name: The name of the tool, unused.
+        :type name: str
+        :param arguments: The arguments of the call, unused.
+        :type arguments: dict[str, Any] | None
+        :param read_timeout_seconds: The longest to wait, unused.
+        :type read_timeout_seconds: timedelta | None
+        :raises ConnectionError: If the call fails.
+        :return: A result with the number of the call.
+        :rtype: CallToolResult
+        """
+        _ = name, arguments, read_timeout_seconds
+        self.calls += 1
+        number = self.calls
+        delay = self._delays[min(number, len(self._delays)) - 1]
+        if delay is None:
+            raise ConnectionError("Server is down")
+        await asyncio.sleep(delay)
+        return CallToolResult(
+            content=[TextContent(type="text", text=str(number))]
+        )
+
+
+def _text(result: CallToolResult) -> str:
+    """
+    Get the text of a tool result.
+
+    :param result: The tool result.
+    :type result: CallToolResult
+    :return: The text of its first content.
+    :rtype: str
+    """
+    content = result.content[0]
+    assert isinstance(content, TextContent)
+    return content.text
+
+
+def _error(result: CallToolResult) -> str:
+    """
+    Get the kind of failure of an error result.
+
+    :param result: The tool result, which must be an error.
+    :type result: CallToolResult
+    :return: The ``error`` field of the result.
+    :rtype: str
+    """
+    assert result.isError
+    return str(json.loads(_text(result))["error"])
+
+
+def _state(guard: ToolGuard) -> BreakerState:
+    """
+    Get the state of the circuit breaker of a guard.
+
+    :param guard: The guard.
+    :type guard: ToolGuard
+    :return: The state of its breaker.
+    :rtype: BreakerState
+    """
+    return guard.breaker.state
+
+
+def test_breaker_opens_and_recovers() -> None:
+    """
+    The breaker opens after the failure threshold, lets a trial call through
+    after the reset timeout, reopens if it fails and closes if it succeeds.
+    """
+    config = GuardConfig(failure_threshold=2, reset_timeout=0.1)
+    guard = ToolGuard("server", config)
+    session = _FakeSession(None, None, None, 0)
+
+    async def inner() -> None:
+        for _ in range(2):
+            assert _error(await guard.call(session, "tool", {})) == (
+                "server_error"
+            )
+        assert _state(guard) is BreakerState.OPEN
+        skipped = json.loads(_text(await guard.call(session, "tool", {})))
+        assert skipped["error"] == "server_unavailable"
+        assert skipped["server"] == "server"
+        assert 0 < skipped["retry_after"] <= 0.1
+        assert session.calls == 2
+
+        await asyncio.sleep(0.15)
+        assert _error(await guard.call(session, "tool", {})) == "server_error"
+        assert _state(guard) is BreakerState.OPEN
+
+        await asyncio.sleep(0.15)
+        assert _text(await guard.call(session, "tool", {})) == "4"
+        assert _state(guard) is BreakerState.CLOSED
+
+    asyncio.run(inner())
+
+
+def test_trial_call_is_limited_to_reset_timeout() -> None:
+    """
+    A trial call which hangs times out after the reset timeout and reopens
+    the breaker, even if the tool has no timeout of its own.
+    """
+    config = GuardConfig(
+        default=CallPolicy(timeout=None),
+        failure_threshold=1,
+        reset_timeout=0.1,
+    )
+    guard = ToolGuard("server", config)
+    session = _FakeSession(None, 60)
+
+    async def inner() -> None:
+        await guard.call(session, "tool", {})
+        await asyncio.sleep(0.15)
+        trial = await asyncio.wait_for(guard.call(session, "tool", {}), 1)
+        assert _error(trial) == "timeout"
+        assert _state(guard) is BreakerState.OPEN
+
+    asyncio.run(inner())
+
+
+def test_slow_call_is_hedged() -> None:
+    """
+    Once enough calls have been timed, a call slower than most is hedged,
+    and the faster of the two calls is used.
+    """
+    config = GuardConfig(
+        default=CallPolicy(hedge=True), hedge_min_samples=3, min_hedge_delay=0
+    )
+    guard = ToolGuard("server", config)
+    session = _FakeSession(0.01, 0.01, 0.01, 1, 0.01)
+
+    async def inner() -> None:
+        for _ in range(3):
+            await guard.call(session, "tool", {})
+        assert _text(await guard.call(session, "tool", {})) == "5"
+
+    asyncio.run(inner())
+    assert session.calls == 5
+
+
+def test_timeouts_raise_hedge_delay() -> None:
+    """
+    Calls which time out are timed as taking the whole timeout, so hedging
+    backs off while a tool is slow.
+    """
+    config = GuardConfig(
+        default=CallPolicy(timeout=0.05, hedge=True),
+        failure_threshold=10,
+        hedge_min_samples=3,
+        hedge_quantile=0.5,
+    )
+    guard = ToolGuard("server", config)
+    session = _FakeSession(0.01, 1)
+
+    async def inner() -> None:
+        assert guard.hedge_delay("tool") is None
+        await guard.call(session, "tool", {})
+        for _ in range(2):
+            assert _error(await guard.call(session, "tool", {})) == "timeout"
+
+    asyncio.run(inner())
+    assert guard.hedge_delay("tool") == 0.05
+
+
+def test_replay_is_not_guarded(
+    tmp_path: Path, chat_history: ChatHistory
+) -> None:
+    """
+    Tool calls are recorded once through the guards, and replayed without
+    them.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :param chat_history: Chat history of the recording.
+    :type chat_history: ChatHistory
+    """
+    path = tmp_path / "test.cassette"
+    guard = GuardConfig(default=CallPolicy(hedge=True))
+
+    async def run(client: MCPClient) -> list[str]:
+        async with client:
+            await client.invoke("add", "session")
+            return [
+                type(session).__name__
+                for session in client.tool_sessions.values()
+            ]
+
+    recorded = asyncio.run(
+        run(
+            MCPClient(
+                model=FakeModel(FakeModelConfig(latency=0)),
+                servers={"fake": create_fake_server(latency=0)},
+                chat_history=chat_history,
+                cassette=Cassette(path, CassetteMode.RECORD),
+                tool_guard=guard,
+            )
+        )
+    )
+    assert set(recorded) == {RecordingToolSession.__name__}
+
+    replayed = asyncio.run(
+        run(
+            MCPClient(
+                servers={},
+                chat_history=ChatHistory(f"sqlite:///{tmp_path / 'p.db'}"),
+                cassette=Cassette(path, CassetteMode.REPLAY),
+                tool_guard=guard,
+            )
+        )
+    )
+    assert set(replayed) == {ReplayToolSession.__name__}
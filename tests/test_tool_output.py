@@ -0,0 +1,189 @@
+"""
+Tests for storing large tool outputs and paging through them.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+import time
+
+import pytest
+from mcp.types import TextContent
+
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.history_maintenance import (
+    DAY,
+    HistoryMaintenance,
+    MaintenanceConfig,
+)
+from mcp_personal.clients.tool_output import (
+    READ_TOOL_NAME,
+    BlobStore,
+    ToolOutputPolicy,
+    ToolOutputSession,
+)
+
+
+def _age(path: Path, seconds: float) -> None:
+    """
+    Set when a file was last modified to some time ago.
+
+    :param path: The file.
+    :type path: Path
+    :param seconds: How long ago it was modified.
+    :type seconds: float
+    """
+    when = time.time() - seconds
+    os.utime(path, (when, when))
+
+
+def test_small_output_is_sent_inline(tmp_path: Path) -> None:
+    """
+    An output within the inline limit is sent in full and not stored.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    policy = ToolOutputPolicy(BlobStore(tmp_path), max_inline_chars=10)
+    assert policy.apply("short") == ("short", None)
+    assert not list(tmp_path.iterdir())
+
+
+def test_large_output_is_stored_and_paged(tmp_path: Path) -> None:
+    """
+    A large output is replaced with a preview, and the rest can be read page
+    by page from the store.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    policy = ToolOutputPolicy(
+        BlobStore(tmp_path),
+        max_inline_chars=10,
+        preview_chars=4,
+        page_chars=5,
+    )
+    text = "abcdefghijklmnopqrstuvwxyz"
+    preview, handle = policy.apply(text)
+    assert handle is not None
+    assert preview.startswith("abcd\n")
+    assert handle in preview
+
+    page = policy.read(handle, offset=4)
+    assert page.startswith("efghi\n")
+    assert "offset 9" in page
+    assert policy.read(handle, offset=24) == "yz"
+    assert policy.read(handle, offset=0, length=100) == text[:10] + (
+        "\n\n[Showing characters 0 to 10 of 26. Call "
+        f"{READ_TOOL_NAME} with offset 10 to read more.]"
+    )
+
+
+def test_same_output_is_stored_once(tmp_path: Path) -> None:
+    """
+    Storing the same output twice gives the same handle and one file.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    store = BlobStore(tmp_path)
+    assert store.put("output") == store.put("output")
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_session_reports_invalid_reads(tmp_path: Path) -> None:
+    """
+    The ``read_tool_output`` tool returns errors for unknown handles and
+    invalid arguments rather than raising.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    policy = ToolOutputPolicy(BlobStore(tmp_path), max_inline_chars=10)
+    session = ToolOutputSession(policy)
+    _, handle = policy.apply("x" * 20)
+
+    async def call(arguments: dict[str, object]) -> tuple[bool, str]:
+        result = await session.call_tool(READ_TOOL_NAME, arguments)
+        (content,) = result.content
+        assert isinstance(content, TextContent)
+        return result.isError, content.text
+
+    first_page = "x" * 10 + (
+        f"\n\n[Showing characters 0 to 10 of 20. Call {READ_TOOL_NAME} "
+        "with offset 10 to read more.]"
+    )
+    assert asyncio.run(call({"handle": handle})) == (False, first_page)
+    assert asyncio.run(call({"handle": "../history.db"}))[0]
+    assert asyncio.run(call({"handle": "0" * 16}))[0]
+    assert asyncio.run(call({"handle": handle, "offset": "x"}))[0]
+
+
+def test_remove_older_than(tmp_path: Path) -> None:
+    """
+    Outputs last stored before the cutoff are removed, up to the limit, and
+    storing an output again keeps it.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    store = BlobStore(tmp_path)
+    old = [store.put(f"old {i}") for i in range(3)]
+    reused = store.put("reused")
+    for handle in [*old, reused]:
+        _age(tmp_path / handle, 2 * DAY)
+    store.put("reused")
+    recent = store.put("recent")
+    (tmp_path / "notes.txt").write_text("not an output")
+    _age(tmp_path / "notes.txt", 2 * DAY)
+
+    cutoff = time.time() - DAY
+    assert store.remove_older_than(cutoff, limit=2) == 2
+    assert store.remove_older_than(cutoff, limit=10) == 1
+    assert store.remove_older_than(cutoff, limit=10) == 0
+    assert store.get(reused) == "reused"
+    assert store.get(recent) == "recent"
+    assert (tmp_path / "notes.txt").exists()
+    with pytest.raises(KeyError):
+        store.get(old[0])
+
+
+def test_reading_an_output_keeps_it(tmp_path: Path) -> None:
+    """
+    An output which is still being read is not removed as old.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    """
+    store = BlobStore(tmp_path)
+    handle = store.put("output")
+    _age(tmp_path / handle, 2 * DAY)
+    assert store.get(handle) == "output"
+    assert store.remove_older_than(time.time() - DAY, limit=10) == 0
+    assert store.get(handle) == "output"
+
+
+def test_maintenance_removes_old_outputs(
+    tmp_path: Path, chat_history: ChatHistory
+) -> None:
+    """
+    A maintenance pass deletes tool outputs older than their time to live.
+
+    :param tmp_path: Temporary directory for the test.
+    :type tmp_path: Path
+    :param chat_history: Chat history to maintain.
+    :type chat_history: ChatHistory
+    """
+    store = BlobStore(tmp_path / "outputs")
+    old = store.put("old")
+    _age(tmp_path / "outputs" / old, 8 * DAY)
+    recent = store.put("recent")
+
+    maintenance = HistoryMaintenance(
+        chat_history,
+        MaintenanceConfig(tool_outputs=store, tool_output_ttl=7 * DAY),
+    )
+    assert maintenance.run_once().removed_tool_outputs == 1
+    assert store.get(recent) == "recent"
+    with pytest.raises(KeyError):
+        store.get(old)
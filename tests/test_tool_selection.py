@@ -0,0 +1,228 @@
+"""
+Tests for selecting the tools offered for each query, and for keeping the
+model with each selection bound.
+"""
+
+import asyncio
+from typing import Any, Callable, Sequence
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import create_fake_server
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+from mcp_personal.clients.model.base import BaseModel
+from mcp_personal.clients.tool_selection import ToolSelector, tokenize
+
+
+def _tool(name: str, description: str, *parameters: str) -> dict[str, Any]:
+    """
+    Create a tool definition.
+
+    :param name: The name of the tool.
+    :type name: str
+    :param description: The description of the tool.
+    :type description: str
+    :param *parameters: The names of its parameters.
+    :type *parameters: str
+    :return: The tool definition.
+    :rtype: dict[str, Any]
+    """
+    return {
+        "name": name,
+        "description": description,
+        "input_schema": {
+            "type": "object",
+            "properties": {p: {"type": "string"} for p in parameters},
+        },
+    }
+
+
+TOOLS = [
+    _tool("add", "Adds two numbers together.", "a", "b"),
+    _tool("subtract", "Subtracts the second number from the first.", "a"),
+    _tool("searchPages", "Search Notion pages by title.", "query"),
+    _tool("create_page", "Create a new Notion page.", "title", "content"),
+    _tool("get_weather", "Get the weather forecast for a city.", "city"),
+    _tool("send_email", "Send an email to a recipient.", "to", "body"),
+    _tool("list_events", "List calendar events for a day.", "date"),
+    _tool("read_tool_output", "Read a stored tool output.", "handle"),
+]
+
+
+def test_tokenize_splits_identifiers() -> None:
+    """
+    Identifiers are split on case changes and underscores, stop words are
+    dropped and plurals are reduced to the singular.
+    """
+    assert tokenize("searchPages") == ["search", "page"]
+    assert tokenize("search_pages") == ["search", "page"]
+    assert tokenize("What is the HTTPResponse of my pages?") == [
+        "http",
+        "response",
+        "page",
+    ]
+    assert tokenize("class address") == ["class", "address"]
+
+
+def test_select_ranks_matching_tools() -> None:
+    """
+    The tools which match the query are selected, and the pinned tools are
+    always selected.
+    """
+    selector = ToolSelector(max_tools=2)
+    selector.index(TOOLS, pinned=["read_tool_output"])
+    assert selector.select("What's the weather in Paris?") == [
+        "get_weather",
+        "read_tool_output",
+    ]
+    scores = selector.scores("search my notion pages")
+    assert max(scores, key=lambda name: scores[name]) == "searchPages"
+    assert scores["add"] == 0
+
+
+def test_query_without_matches_gets_pinned_tools() -> None:
+    """
+    A query which matches no tool is only offered the pinned tools.
+    """
+    selector = ToolSelector(max_tools=2)
+    selector.index(TOOLS, pinned=["read_tool_output"])
+    assert selector.select("hello") == ["read_tool_output"]
+
+
+def test_recent_tools_are_kept() -> None:
+    """
+    Tools the conversation called recently are kept for follow up questions,
+    using up to half of the places.
+    """
+    selector = ToolSelector(max_tools=2)
+    selector.index(TOOLS)
+    selected = selector.select("now subtract 3", recent=["add", "send_email"])
+    assert selected == ["add", "subtract"]
+
+
+def test_small_index_selects_every_tool() -> None:
+    """
+    Every tool is selected when there are no more than the maximum.
+    """
+    selector = ToolSelector(max_tools=8)
+    selector.index(TOOLS[:3])
+    assert selector.select("hello") == ["add", "subtract", "searchPages"]
+
+
+class _BindingChatModel(FakeListChatModel):
+    """
+    Fake chat model which records the tools bound to it.
+    """
+
+    # Pydantic copies the default for each instance.
+    bound: list[list[str]] = []
+
+    def bind_tools(
+        self,
+        tools: Sequence[dict[str, Any] | type | Callable[..., Any] | BaseTool],
+        *,
+        tool_choice: str | None = None,
+        **kwargs: Any,
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """
+        Record the names of the tools bound.
+
+        :param tools: The tools to bind.
+        :type tools: Sequence[dict[str, Any] | type | Callable[..., Any] |
+            BaseTool]
+        :param tool_choice: Which tool the model must call, unused.
+        :type tool_choice: str | None
+        :param **kwargs: Other options, unused.
+        :type **kwargs: Any
+        :return: The model itself.
+        :rtype: Runnable[LanguageModelInput, BaseMessage]
+        """
+        _ = tool_choice, kwargs
+        self.bound.append(
+            [tool["name"] for tool in tools if isinstance(tool, dict)]
+        )
+        return self
+
+
+class _Model(BaseModel):
+    """
+    Model for the fake chat model which records bound tools.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._model = _BindingChatModel(responses=["ok"])
+
+
+def test_bound_selections_are_kept() -> None:
+    """
+    The model with each selection bound is kept and reused, up to the limit,
+    and the least recently used selection is dropped first.
+    """
+    model = _Model()
+    model.max_tool_models = 2
+    model.bind_tools(TOOLS[:3])
+    chat_model = model._model  # pylint: disable=protected-access
+    assert isinstance(chat_model, _BindingChatModel)
+
+    async def chat(*tools: str) -> None:
+        await model.achat([HumanMessage(content="hi")], tools=tools)
+
+    for tools in [("add",), ("add",), ("subtract",), ("add",)]:
+        asyncio.run(chat(*tools))
+    assert chat_model.bound == [["add"], ["subtract"]]
+
+    asyncio.run(chat("searchPages"))
+    asyncio.run(chat("add"))
+    asyncio.run(chat("subtract"))
+    assert chat_model.bound[2:] == [["searchPages"], ["subtract"]]
+
+    asyncio.run(chat())
+    assert len(chat_model.bound) == 4
+
+
+def test_history_with_tool_calls_keeps_tools(
+    chat_history: ChatHistory,
+) -> None:
+    """
+    A conversation which has called tools is offered every tool if none are
+    selected, since the API rejects tool calls without tools. One which has
+    not is offered none.
+
+    :param chat_history: Chat history for the client.
+    :type chat_history: ChatHistory
+    """
+    call = {"name": "removed", "args": {}, "id": "1"}
+    history: list[BaseMessage] = [
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content="done", tool_call_id="1"),
+    ]
+
+    async def select() -> tuple[list[str], list[str]]:
+        async with MCPClient(
+            model=FakeModel(FakeModelConfig(latency=0)),
+            servers={"fake": create_fake_server(latency=0)},
+            chat_history=chat_history,
+            tool_selector=ToolSelector(max_tools=1),
+        ) as client:
+            selected = [
+                # pylint: disable-next=protected-access
+                [tool["name"] for tool in client._select_tools("hello", h)]
+                for h in ([], history)
+            ]
+            return selected[0], selected[1]
+
+    without_calls, with_calls = asyncio.run(select())
+    assert not without_calls
+    assert "add" in with_calls
@@ -0,0 +1,42 @@
+"""
+Helpers for testing the web API through the Quart test client, against the
+fake model and an in-process fake MCP server.
+"""
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from quart.typing import TestClientProtocol
+
+from mcp_personal.benchmark.fake_model import FakeModel, FakeModelConfig
+from mcp_personal.benchmark.fake_server import create_fake_server
+from mcp_personal.clients.chat_history import ChatHistory
+from mcp_personal.clients.mcp import MCPClient
+from mcp_personal.web_api.main import AsyncWebAPI
+
+
+@asynccontextmanager
+async def serve_api(
+    chat_history: ChatHistory, model: FakeModelConfig | None = None
+) -> AsyncIterator[tuple[AsyncWebAPI, TestClientProtocol]]:
+    """
+    Open the web API with its endpoints registered, and a test client for it.
+
+    :param chat_history: The chat history of the client.
+    :type chat_history: ChatHistory
+    :param model: The configuration of the fake model.
+    :type model: FakeModelConfig | None
+    :yield: The web API and the test client.
+    :ytype: tuple[AsyncWebAPI, TestClientProtocol]
+    """
+    mcp_client = MCPClient(
+        model=FakeModel(model or FakeModelConfig(latency=0)),
+        servers={"fake": create_fake_server(latency=0)},
+        chat_history=chat_history,
+    )
+    async with AsyncWebAPI(mcp_client=mcp_client) as api:
+        # pylint: disable=protected-access
+        handlers = api._endpoint_handlers
+        for name, (methods, endpoint, handler) in handlers.items():
+            api._app.add_endpoint(endpoint, name, handler, methods)
+        yield api, api._app._app.test_client()